@@ -6,6 +6,7 @@
 import os
 import sys
 import json
+import hashlib
 from pathlib import Path
 from typing import Optional, List, Tuple
 import subprocess
@@ -15,9 +16,9 @@ class EnhancedAutoStartManager:
 
     def __init__(self, app_name: str = "USBBackup"):
         self.app_name = app_name
-        self.startup_folder = self._get_startup_folder()
         self.config_file = Path("autostart_config.json")
         self._load_config()
+        self.startup_folder = self._get_startup_folder()
 
     def _load_config(self):
         """加载配置"""
@@ -51,6 +52,11 @@ class EnhancedAutoStartManager:
     def _get_startup_folder(self) -> Optional[Path]:
         """获取启动文件夹"""
         try:
+            # 方法0: 使用上次解析并缓存的路径（避免启动PowerShell）
+            cached = self.config.get("startup_folder", "")
+            if cached and Path(cached).is_dir():
+                return Path(cached)
+
             # 方法1: 使用环境变量
             appdata = os.environ.get('APPDATA', '')
             if appdata:
@@ -86,37 +92,36 @@ class EnhancedAutoStartManager:
             print(f"获取启动文件夹失败: {e}")
             return None
 
-    def setup_autostart(self, exe_path: str = "", args: str = "") -> Tuple[bool, str]:
-        """设置开机自启动"""
-        try:
-            if not self.startup_folder:
-                return False, "无法找到启动文件夹"
+    def _resolve_exe_path(self, exe_path: str = "") -> str:
+        """获取要自启动的程序路径（未提供时使用当前程序）"""
+        if not exe_path:
+            if getattr(sys, 'frozen', False):
+                exe_path = sys.executable
+            else:
+                exe_path = os.path.abspath(sys.argv[0])
 
-            # 如果没有提供exe_path，使用当前程序
-            if not exe_path:
-                if getattr(sys, 'frozen', False):
-                    exe_path = sys.executable
-                else:
-                    exe_path = os.path.abspath(sys.argv[0])
+        # 确保路径是绝对路径
+        return os.path.abspath(exe_path)
 
-            # 确保路径是绝对路径
-            exe_path = os.path.abspath(exe_path)
+    def _build_launcher(self, exe_path: str, args: str = "") -> bytes:
+        """生成批处理文件内容（内容只取决于参数，便于与磁盘上的文件比较）"""
+        return self._launcher_text(exe_path, args).replace('\n', '\r\n').encode('utf-8')
 
-            # 创建批处理文件内容
-            if exe_path.endswith('.py'):
-                python_exe = sys.executable
-                command = f'"{python_exe}" "{exe_path}"'
-            else:
-                command = f'"{exe_path}"'
+    def _launcher_text(self, exe_path: str, args: str) -> str:
+        """批处理文件文本"""
+        if exe_path.endswith('.py'):
+            python_exe = sys.executable
+            command = f'"{python_exe}" "{exe_path}"'
+        else:
+            command = f'"{exe_path}"'
 
-            if args:
-                command += f' {args}'
+        if args:
+            command += f' {args}'
 
-            # 如果启用隐藏模式，使用start /B
-            if self.config.get("hidden_mode", True):
-                bat_content = f'''@echo off
+        # 如果启用隐藏模式，使用start /B
+        if self.config.get("hidden_mode", True):
+            return f'''@echo off
 REM USB文件备份系统 - 自启动脚本
-REM 创建时间: {self._get_current_time()}
 
 chcp 65001 >nul
 title USB备份系统
@@ -124,10 +129,8 @@ echo 正在启动USB文件备份系统...
 start "" /B {command}
 exit
 '''
-            else:
-                bat_content = f'''@echo off
+        return f'''@echo off
 REM USB文件备份系统 - 自启动脚本
-REM 创建时间: {self._get_current_time()}
 
 chcp 65001 >nul
 title USB备份系统
@@ -136,10 +139,88 @@ echo 正在启动USB文件备份系统...
 pause
 '''
 
-            # 保存批处理文件
+    @staticmethod
+    def _digest(content: bytes) -> str:
+        """计算内容摘要"""
+        return hashlib.sha256(content).hexdigest()
+
+    def _file_digest(self, path: Path) -> str:
+        """计算磁盘上文件的摘要，文件不存在时返回空字符串"""
+        try:
+            return self._digest(path.read_bytes())
+        except OSError:
+            return ""
+
+    def _check_drift(self, exe_path: str, args: str) -> List[str]:
+        """比较预期的自启动设置与磁盘上的实际状态，返回差异列表"""
+        drift = []
+        bat_path = self.startup_folder / f"{self.app_name}.bat"
+        expected = self._digest(self._build_launcher(exe_path, args))
+
+        actual = self._file_digest(bat_path)
+        if not actual:
+            drift.append(f"启动脚本不存在: {bat_path}")
+        elif actual != expected:
+            drift.append(f"启动脚本内容与预期不一致: {bat_path}")
+
+        if not os.path.exists(exe_path):
+            drift.append(f"程序文件不存在: {exe_path}")
+
+        recorded = {
+            "exe_path": exe_path,
+            "args": args,
+            "bat_path": str(bat_path),
+            "launcher_digest": expected,
+            "startup_folder": str(self.startup_folder)
+        }
+        for key, value in recorded.items():
+            if self.config.get(key) != value:
+                drift.append(f"配置项 {key} 与预期不一致: {self.config.get(key)!r} -> {value!r}")
+
+        return drift
+
+    def verify_autostart(self, exe_path: str = "", args: Optional[str] = None) -> Tuple[bool, List[str]]:
+        """检查自启动设置是否与预期一致（只读，不修改任何文件）"""
+        if not self.startup_folder:
+            return False, ["无法找到启动文件夹"]
+
+        # 未指定时按已记录的设置检查
+        exe_path = exe_path or self.config.get("exe_path", "")
+        if not exe_path:
+            return False, ["尚未设置自启动"]
+        if args is None:
+            args = self.config.get("args", "")
+
+        drift = self._check_drift(os.path.abspath(exe_path), args)
+        return not drift, drift
+
+    def setup_autostart(self, exe_path: str = "", args: str = "") -> Tuple[bool, str]:
+        """设置开机自启动（设置未变化时不写入任何文件）"""
+        try:
+            if not self.startup_folder:
+                return False, "无法找到启动文件夹"
+
+            exe_path = self._resolve_exe_path(exe_path)
+            args = args or ""
             bat_path = self.startup_folder / f"{self.app_name}.bat"
 
-            with open(bat_path, 'w', encoding='utf-8') as f:
+            # 快速路径：启动脚本和配置都与预期一致
+            if not self._check_drift(exe_path, args):
+                return True, f"自启动已是最新: {bat_path}"
+
+            bat_content = self._build_launcher(exe_path, args)
+
+            # 已隐藏的文件无法直接覆盖，先恢复普通属性
+            if bat_path.exists():
+                try:
+                    import ctypes
+                    FILE_ATTRIBUTE_NORMAL = 0x80
+                    ctypes.windll.kernel32.SetFileAttributesW(str(bat_path), FILE_ATTRIBUTE_NORMAL)
+                except:
+                    pass
+
+            # 保存批处理文件
+            with open(bat_path, 'wb') as f:
                 f.write(bat_content)
 
             # 隐藏批处理文件
@@ -156,9 +237,11 @@ pause
                 "exe_path": exe_path,
                 "args": args,
                 "hidden_mode": self.config.get("hidden_mode", True),
-                "created_time": self._get_current_time(),
+                "created_time": self.config.get("created_time") or self._get_current_time(),
                 "last_modified": self._get_current_time(),
-                "bat_path": str(bat_path)
+                "bat_path": str(bat_path),
+                "launcher_digest": self._digest(bat_content),
+                "startup_folder": str(self.startup_folder)
             })
             self._save_config()
 
@@ -252,13 +335,14 @@ pause
 
     def create_manual_guide(self):
         """创建手动设置指南"""
+        default_folder = "C:\\Users\\[用户名]\\AppData\\Roaming\\Microsoft\\Windows\\Start Menu\\Programs\\Startup"
         guide = f"""
         ========================================
         USB文件备份系统 - 手动自启动设置指南
         ========================================
         
         启动文件夹位置:
-        {self.startup_folder or "C:\\Users\\[用户名]\\AppData\\Roaming\\Microsoft\\Windows\\Start Menu\\Programs\\Startup"}
+        {self.startup_folder or default_folder}
         
         手动设置步骤:
         1. 打开启动文件夹（按 Win+R，输入: shell:startup）
@@ -293,6 +377,7 @@ def main():
   python autostart_manager.py --setup
   python autostart_manager.py --remove
   python autostart_manager.py --check
+  python autostart_manager.py --verify
   python autostart_manager.py --open
         """
     )
@@ -300,6 +385,7 @@ def main():
     parser.add_argument("--setup", action="store_true", help="设置开机自启动")
     parser.add_argument("--remove", action="store_true", help="移除开机自启动")
     parser.add_argument("--check", action="store_true", help="检查自启动状态")
+    parser.add_argument("--verify", action="store_true", help="检查自启动设置是否被改动（只报告，不修改）")
     parser.add_argument("--open", action="store_true", help="打开启动文件夹")
     parser.add_argument("--guide", action="store_true", help="显示手动设置指南")
     parser.add_argument("--exe", type=str, help="指定可执行文件路径")
@@ -348,6 +434,16 @@ def main():
         else:
             print("[信息] 未设置自启动")
 
+    elif args.verify:
+        print("[信息] 正在核对自启动设置...")
+        ok, drift = manager.verify_autostart(args.exe or "", args.args if args.exe else None)
+        if ok:
+            print("[成功] 自启动设置与预期一致")
+        else:
+            print("[警告] 发现以下差异:")
+            for item in drift:
+                print(f"  - {item}")
+
     elif args.open:
         print("[信息] 正在打开启动文件夹...")
         if manager.open_startup_folder():
@@ -0,0 +1,63 @@
+"""
+协作式取消模块
+扫描、复制和清理在文件与数据块之间检查取消令牌，等待也基于事件以便立即唤醒
+"""
+
+import threading
+import weakref
+from typing import Optional
+
+
+class OperationCancelled(Exception):
+    """操作已被取消"""
+
+
+class CancelToken:
+    """取消令牌（取消父令牌时同时取消所有子令牌）"""
+
+    def __init__(self, parent: Optional["CancelToken"] = None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._children = weakref.WeakSet()
+        self.reason = ""
+
+        if parent is not None:
+            parent._add_child(self)
+
+    def _add_child(self, child: "CancelToken"):
+        """登记子令牌"""
+        with self._lock:
+            self._children.add(child)
+            cancelled = self._event.is_set()
+        if cancelled:
+            child.cancel(self.reason)
+
+    def child(self) -> "CancelToken":
+        """创建子令牌"""
+        return CancelToken(self)
+
+    def cancel(self, reason: str = ""):
+        """取消令牌"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            children = list(self._children)
+
+        for child in children:
+            child.cancel(reason)
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已取消"""
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """已取消时抛出 OperationCancelled"""
+        if self._event.is_set():
+            raise OperationCancelled(self.reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待指定时间，被取消时立即返回True"""
+        return self._event.wait(timeout)
@@ -0,0 +1,154 @@
+"""
+备份目录模块
+按设备记录每个备份文件的位置、大小和内容哈希（JSON Lines追加写入），
+文件被清理、归档或隔离后压缩目录，移除对应记录
+"""
+
+import os
+import json
+import random
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class StoreCatalog:
+    """备份文件目录"""
+
+    def __init__(self, state_dir: Path, flush_every: int = 100):
+        self.catalog_dir = Path(state_dir) / "catalog"
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        # 追加写入和压缩重写互斥
+        self._file_lock = threading.Lock()
+        # 设备ID -> 待写入的记录
+        self._pending: Dict[str, List[Dict]] = {}
+
+    def _path_for(self, device_id: str) -> Path:
+        """获取设备对应的目录文件"""
+        return self.catalog_dir / f"{device_id}.jsonl"
+
+    def record(self, device_id: str, path: str, size: int, digest: str, source: str = "", target: str = ""):
+        """记录一个已备份文件（path为相对备份目标根目录的路径，target为备份目标）"""
+        entry = {
+            "path": path,
+            "target": target,
+            "size": size,
+            "sha256": digest,
+            "source": source,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        with self._lock:
+            pending = self._pending.setdefault(device_id, [])
+            pending.append(entry)
+            should_flush = len(pending) >= self.flush_every
+
+        if should_flush:
+            self.flush(device_id)
+
+    def flush(self, device_id: Optional[str] = None) -> bool:
+        """将缓冲的记录追加写入磁盘"""
+        with self._lock:
+            if device_id is None:
+                batches = self._pending
+                self._pending = {}
+            else:
+                batches = {device_id: self._pending.pop(device_id, [])}
+
+        try:
+            self.catalog_dir.mkdir(parents=True, exist_ok=True)
+            with self._file_lock:
+                for dev_id, entries in batches.items():
+                    if not entries:
+                        continue
+                    with open(self._path_for(dev_id), 'a', encoding='utf-8') as f:
+                        for entry in entries:
+                            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            return True
+        except Exception:
+            return False
+
+    def compact(self, removed: Iterable[Tuple[str, str]], default_target: str = "") -> int:
+        """移除已不在备份目标上的文件记录，同一文件只保留最新记录，返回移除的记录数
+
+        removed: (备份目标, 相对路径)；记录中备份目标为空时视为default_target。
+        逐个设备两遍读取，内存占用只与单个设备的文件数有关。
+        """
+        removed_keys: Set[Tuple[str, str]] = {(target or default_target, path) for target, path in removed}
+        if not removed_keys or not self.catalog_dir.is_dir():
+            return 0
+
+        dropped = 0
+        with self._file_lock:
+            for path in sorted(self.catalog_dir.glob("*.jsonl")):
+                try:
+                    dropped += self._compact_file(path, removed_keys, default_target)
+                except OSError:
+                    continue
+        return dropped
+
+    def _compact_file(self, path: Path, removed_keys: Set[Tuple[str, str]], default_target: str) -> int:
+        """压缩单个设备的目录文件（调用方持有文件锁）"""
+        # 第一遍：每个文件最新记录所在的行
+        latest: Dict[Tuple[str, str], int] = {}
+        affected = False
+        with open(path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                key = (entry.get("target") or default_target, entry.get("path", ""))
+                if key in latest or key in removed_keys:
+                    affected = True
+                latest[key] = number
+        if not affected:
+            return 0
+
+        # 第二遍：写入保留的行（先写临时文件再替换）
+        keep = {number for key, number in latest.items() if key not in removed_keys}
+        dropped = 0
+        tmp_path = path.with_suffix(".tmp")
+        with open(path, 'r', encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+            for number, line in enumerate(src):
+                if number in keep:
+                    dst.write(line)
+                else:
+                    dropped += 1
+        os.replace(tmp_path, path)
+        return dropped
+
+    def iter_device(self, device_id: str) -> Iterator[Dict]:
+        """遍历单个设备的记录"""
+        try:
+            with open(self._path_for(device_id), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    entry["device_id"] = device_id
+                    yield entry
+        except OSError:
+            return
+
+    def iter_entries(self) -> Iterator[Dict]:
+        """遍历所有设备的记录"""
+        if not self.catalog_dir.is_dir():
+            return
+        for path in sorted(self.catalog_dir.glob("*.jsonl")):
+            yield from self.iter_device(path.stem)
+
+    def sample(self, count: int, rng: Optional[random.Random] = None) -> List[Dict]:
+        """蓄水池抽样（内存占用只与抽样数量有关）"""
+        rng = rng or random.Random()
+        reservoir: List[Dict] = []
+        for i, entry in enumerate(self.iter_entries()):
+            if i < count:
+                reservoir.append(entry)
+            else:
+                j = rng.randint(0, i)
+                if j < count:
+                    reservoir[j] = entry
+        return reservoir
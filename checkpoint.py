@@ -0,0 +1,225 @@
+"""
+扫描断点续传模块
+持久化USB备份会话进度，设备重新插入或程序重启后从中断处继续
+"""
+
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# 状态目录名（位于备份文件夹内，清理和统计时跳过）
+STATE_DIR_NAME = ".state"
+
+
+class SessionCheckpoint:
+    """单个设备的备份会话进度"""
+
+    def __init__(self, device_key: str, date_folder: str):
+        self.device_key = device_key
+        self.date_folder = date_folder
+        self.started_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 当前写入的备份目标
+        self.target = ""
+        # 待扫描目录栈（相对设备根目录，"" 表示根目录），末尾为下一个处理的目录。
+        # 深度优先遍历不会回到已完成的目录，断点只需保存待扫描的栈（大小与目录深度相关，与目录总数无关）
+        self.pending_dirs: List[str] = [""]
+        self._pending_set: Set[str] = {""}
+        # 已完成扫描的目录数（目录列表和修改时间追加写入单独的日志，断点本身不保存）
+        self.dirs_completed = 0
+        # 续传会话中断前已完成的目录及其修改时间（从日志加载，新会话为None，不在内存中累积）
+        self.completed: Optional[Dict[str, Optional[int]]] = None
+        # 上次保存后完成的目录，保存时追加到日志
+        self._completed_log: List[Tuple[str, Optional[int]]] = []
+        # 新会话第一次保存时清空上次遗留的日志
+        self._log_fresh = True
+        # 当前目录中已处理完成的文件（目录完成后清空）
+        self.done_files: Set[str] = set()
+        # 累计统计
+        self.stats = {
+            "files_copied": 0, "files_skipped": 0, "files_unchanged": 0,
+            "dirs_unchanged": 0, "total_size": 0
+        }
+
+    @property
+    def finished(self) -> bool:
+        """会话是否已完成"""
+        return not self.pending_dirs
+
+    def mark_file_done(self, rel_file: str):
+        """记录文件已处理"""
+        self.done_files.add(rel_file)
+
+    def complete_dir(self, rel_dir: str, subdirs: List[str], mtime: Optional[int] = None):
+        """记录目录扫描完成（mtime为扫描时目录的修改时间），并将子目录加入待扫描队列"""
+        if rel_dir in self._pending_set:
+            self._pending_set.discard(rel_dir)
+            if self.pending_dirs[-1] == rel_dir:
+                self.pending_dirs.pop()
+            else:
+                self.pending_dirs.remove(rel_dir)
+
+        self.dirs_completed += 1
+        self.done_files.clear()
+        self._completed_log.append((rel_dir, mtime))
+        if self.completed is not None:
+            self.completed[rel_dir] = mtime
+
+        # 逆序入栈，保证按名称顺序处理
+        for sub in reversed(subdirs):
+            if sub not in self._pending_set:
+                self.pending_dirs.append(sub)
+                self._pending_set.add(sub)
+
+    def recheck(self, dirs: Set[str]):
+        """将中断后有变化的已完成目录放到待扫描栈底（待扫描的目录处理完后再按名称顺序检查）"""
+        dirs = [d for d in sorted(dirs) if d not in self._pending_set]
+        self.pending_dirs[:0] = reversed(dirs)
+        self._pending_set.update(dirs)
+
+    def changed_dirs(self, root: Path) -> Set[str]:
+        """中断前已完成、之后修改时间变化的目录（已删除的目录由父目录的变化发现）"""
+        changed = set()
+        for rel_dir, mtime in (self.completed or {}).items():
+            try:
+                current = os.stat(root / rel_dir).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            except OSError:
+                current = None
+            if mtime is None or current != mtime:
+                changed.add(rel_dir)
+        return changed
+
+    def to_dict(self) -> Dict:
+        """转换为可序列化字典"""
+        return {
+            "device_key": self.device_key,
+            "date_folder": self.date_folder,
+            "started_time": self.started_time,
+            "target": self.target,
+            "updated_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "pending_dirs": self.pending_dirs,
+            "dirs_completed": self.dirs_completed,
+            "done_files": sorted(self.done_files),
+            "stats": self.stats
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SessionCheckpoint":
+        """从字典恢复"""
+        checkpoint = cls(data["device_key"], data["date_folder"])
+        checkpoint.started_time = data.get("started_time", checkpoint.started_time)
+        checkpoint.target = data.get("target", "")
+        checkpoint.pending_dirs = list(data.get("pending_dirs", []))
+        checkpoint._pending_set = set(checkpoint.pending_dirs)
+        checkpoint.dirs_completed = int(data.get("dirs_completed", len(data.get("completed_dirs", []))))
+        checkpoint.done_files = set(data.get("done_files", []))
+        checkpoint.stats.update(data.get("stats", {}))
+        checkpoint.completed = {}
+        checkpoint._log_fresh = False
+        return checkpoint
+
+
+class CheckpointStore:
+    """会话断点存储"""
+
+    def __init__(self, state_dir: Path, save_interval: float = 5.0, save_every_files: int = 50):
+        self.sessions_dir = Path(state_dir) / "sessions"
+        self.save_interval = save_interval
+        self.save_every_files = save_every_files
+        self._last_save: Dict[str, float] = {}
+        self._unsaved: Dict[str, int] = {}
+
+    def _path_for(self, device_key: str) -> Path:
+        """获取设备对应的断点文件路径"""
+        digest = hashlib.sha1(device_key.encode("utf-8")).hexdigest()[:16]
+        return self.sessions_dir / f"{digest}.json"
+
+    def _log_path_for(self, device_key: str) -> Path:
+        """获取设备对应的已完成目录日志路径"""
+        return self._path_for(device_key).with_suffix(".dirs.jsonl")
+
+    def load(self, device_key: str) -> Optional[SessionCheckpoint]:
+        """加载未完成的会话"""
+        path = self._path_for(device_key)
+        if not path.exists():
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                checkpoint = SessionCheckpoint.from_dict(json.load(f))
+            if checkpoint.device_key != device_key or checkpoint.finished:
+                return None
+        except Exception:
+            # 断点文件损坏时重新开始
+            return None
+
+        # 已完成目录日志缺失或末行不完整时忽略相应记录（这些目录续传时不再检查）
+        try:
+            with open(self._log_path_for(device_key), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        checkpoint.completed[entry["dir"]] = entry.get("mtime")
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError:
+            pass
+        return checkpoint
+
+    def save(self, checkpoint: SessionCheckpoint) -> bool:
+        """保存会话进度（先写临时文件再替换，避免写入中断导致损坏）
+
+        新完成的目录先追加到日志，再写入断点：断点中不再出现的目录一定已在日志中。
+        """
+        path = self._path_for(checkpoint.device_key)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            self.sessions_dir.mkdir(parents=True, exist_ok=True)
+            if checkpoint._completed_log or checkpoint._log_fresh:
+                mode = 'w' if checkpoint._log_fresh else 'a'
+                with open(self._log_path_for(checkpoint.device_key), mode, encoding='utf-8') as f:
+                    for rel_dir, mtime in checkpoint._completed_log:
+                        f.write(json.dumps({"dir": rel_dir, "mtime": mtime}, ensure_ascii=False) + "\n")
+                checkpoint._completed_log = []
+                checkpoint._log_fresh = False
+
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+            self._last_save[checkpoint.device_key] = time.monotonic()
+            self._unsaved[checkpoint.device_key] = 0
+            return True
+        except Exception:
+            return False
+
+    def maybe_save(self, checkpoint: SessionCheckpoint, before_save: Optional[Callable[[], None]] = None) -> bool:
+        """按时间间隔或文件数量节流保存
+
+        before_save在写入断点前调用，用于先保存断点所依赖的状态（设备清单、备份目录）：
+        断点记为已完成的目录中的文件必须已记录在清单中，否则续传时会被当作新文件重复复制。
+        """
+        key = checkpoint.device_key
+        self._unsaved[key] = self._unsaved.get(key, 0) + 1
+
+        elapsed = time.monotonic() - self._last_save.get(key, 0)
+        if elapsed >= self.save_interval or self._unsaved[key] >= self.save_every_files:
+            if before_save is not None:
+                before_save()
+            return self.save(checkpoint)
+        return False
+
+    def discard(self, device_key: str):
+        """会话完成后删除断点"""
+        self._last_save.pop(device_key, None)
+        self._unsaved.pop(device_key, None)
+        for path in (self._path_for(device_key), self._log_path_for(device_key)):
+            try:
+                path.unlink()
+            except Exception:
+                pass
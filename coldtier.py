@@ -0,0 +1,439 @@
+"""
+冷存储模块
+超过保留期限的备份按日期文件夹重新压缩为ZIP归档（可放在其他目标路径），
+归档内容记录在索引中，可单独提取文件；只有冷存储超出预算时才删除最旧的归档。
+每批文件写入新的归档（不在原归档上追加），归档和索引落盘后才删除原文件
+"""
+
+import os
+import re
+import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cancel import CancelToken
+from checkpoint import STATE_DIR_NAME
+from durability import fsync_file, fsync_dir
+
+# 冷存储目录名（位于备份文件夹内时，清理和统计时跳过）
+COLD_DIR_NAME = ".cold"
+
+GB = 1024 ** 3
+
+# 压缩方式对应的zipfile常量名（zipfile会连带导入lzma和bz2，首次归档或提取时才导入）
+_COMPRESSION = {
+    "lzma": "ZIP_LZMA",
+    "bzip2": "ZIP_BZIP2",
+    "deflate": "ZIP_DEFLATED",
+}
+
+# 已压缩的格式直接存储，避免浪费CPU
+_STORED_SUFFIXES = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".mp4", ".mkv", ".avi", ".mov",
+    ".zip", ".rar", ".7z", ".gz", ".xz", ".bz2",
+    ".docx", ".xlsx", ".pptx", ".pdf",
+}
+
+_DATE_FOLDER = re.compile(r"^\d{8}$")
+
+# 每批归档的文件数
+_BATCH_FILES = 1000
+
+# 归档任务中的文件：(原文件, 备份相对路径, 归档内名称, 大小, 修改时间)
+_ArchiveFile = Tuple[Path, str, str, int, float]
+
+
+def write_archive(archive_path: Path, archive: str, files: List[_ArchiveFile], compression: str,
+                  target: str = "", cancel_token: Optional[CancelToken] = None
+                  ) -> Tuple[List[Tuple[Path, str, int]], List[Dict]]:
+    """将文件写入新的归档，返回已写入的文件和索引条目（可在工作进程中执行）
+
+    target: 文件所在的备份目标，记录在索引中（多个备份目标上可能有相同的备份路径）。
+    先写临时文件并落盘，再重命名为归档；中途崩溃只会留下临时文件，原文件和已有归档不受影响。
+    """
+    import zipfile
+
+    method = getattr(zipfile, _COMPRESSION.get(compression, "ZIP_LZMA"))
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+
+    archived = []
+    entries = []
+    names = set()
+    try:
+        with zipfile.ZipFile(tmp_path, "w", strict_timestamps=False) as zf:
+            for path, rel_path, member, size, mtime in files:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+
+                # 多个备份目标上可能有同名文件
+                name, counter = member, 1
+                while name in names:
+                    name = f"{member}~{counter}"
+                    counter += 1
+                names.add(name)
+
+                member_compression = zipfile.ZIP_STORED if path.suffix.lower() in _STORED_SUFFIXES else method
+                try:
+                    zf.write(path, name, compress_type=member_compression)
+                except FileNotFoundError:
+                    continue
+
+                archived.append((path, rel_path, size))
+                entries.append({
+                    "archive": archive, "member": name,
+                    "target": target, "path": rel_path,
+                    "size": size, "mtime": mtime,
+                    "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                })
+
+        if not archived:
+            os.remove(tmp_path)
+            return [], []
+        fsync_file(tmp_path)
+        os.replace(tmp_path, archive_path)
+        fsync_dir(archive_path.parent)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return archived, entries
+
+
+class ColdTier:
+    """冷存储归档"""
+
+    def __init__(self, cold_root: Path, state_dir: Path, logger, max_bytes: int = 0,
+                 compression: str = "lzma", offload=None):
+        self.cold_root = Path(cold_root)
+        self.index_path = Path(state_dir) / "cold_index.jsonl"
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.compression = compression if compression in _COMPRESSION else "lzma"
+        # 多进程卸载（OffloadPool）：较大的归档分组在工作进程中并行压缩
+        self.offload = offload
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, logger, offload=None) -> "ColdTier":
+        """根据配置创建"""
+        backup_folder = Path(config.get("backup_folder", "USB_Backup"))
+        cold_path = config.get("cold_tier_path", "")
+        return cls(
+            Path(cold_path) if cold_path else backup_folder / COLD_DIR_NAME,
+            backup_folder / STATE_DIR_NAME,
+            logger,
+            max_bytes=int(config.get("cold_tier_max_gb", 20) * GB),
+            compression=config.get("cold_tier_compression", "lzma"),
+            offload=offload
+        )
+
+    @staticmethod
+    def archive_for(rel_path: str, mtime: float) -> Tuple[str, str]:
+        """文件所属的归档和归档内名称（设备/日期文件夹 -> 设备/日期.zip）"""
+        parts = rel_path.replace("\\", "/").split("/")
+        if len(parts) >= 3 and _DATE_FOLDER.match(parts[1]):
+            return f"{parts[0]}/{parts[1]}.zip", "/".join(parts[2:])
+        if len(parts) >= 2:
+            # 未按日期分文件夹时按修改月份归档
+            month = datetime.fromtimestamp(mtime).strftime("%Y%m")
+            return f"{parts[0]}/{month}.zip", "/".join(parts[1:])
+        return f"_root/{datetime.fromtimestamp(mtime).strftime('%Y%m')}.zip", parts[0]
+
+    def contains(self, path: Path) -> bool:
+        """冷存储是否位于该目录内（默认的 .cold 在备份文件夹内）"""
+        try:
+            self.cold_root.resolve().relative_to(Path(path).resolve())
+            return True
+        except ValueError:
+            return False
+
+    def same_volume(self, path: Path) -> bool:
+        """冷存储是否与该路径位于同一卷（此时归档只能节省压缩掉的部分）"""
+        cold = self.cold_root
+        while not cold.exists() and cold.parent != cold:
+            cold = cold.parent
+        try:
+            return os.stat(cold).st_dev == os.stat(path).st_dev
+        except OSError:
+            return True
+
+    def _new_archive(self, archive: str) -> str:
+        """未使用的归档名（同一日期文件夹的后续批次写入 日期_1.zip、日期_2.zip ...）"""
+        stem = archive[:-len(".zip")]
+        name, counter = archive, 1
+        while (self.cold_root / name).exists():
+            name = f"{stem}_{counter}.zip"
+            counter += 1
+        return name
+
+    def compact(self, root: Path, records: Iterable, cancel_token: Optional[CancelToken] = None) -> Dict:
+        """将文件压缩进冷存储归档，归档落盘后删除原文件
+
+        bytes_freed 为实际释放的空间：冷存储与原文件在同一卷时减去新归档的大小。
+        """
+        result = {"files_archived": 0, "bytes_freed": 0, "bytes_archived": 0, "errors": 0, "removed": []}
+        root = Path(root)
+        same_volume = self.same_volume(root)
+        target = str(root)
+
+        # 按归档分组，每批写入一次，内存占用与文件总数无关
+        groups: Dict[str, List[_ArchiveFile]] = {}
+        pending = 0
+        for record in records:
+            rel_path = record.path.relative_to(root).as_posix()
+            archive, member = self.archive_for(rel_path, record.mtime)
+            groups.setdefault(archive, []).append((record.path, rel_path, member, record.size, record.mtime))
+            pending += 1
+            if pending >= _BATCH_FILES:
+                self._write_groups(groups, target, result, same_volume, cancel_token)
+                groups, pending = {}, 0
+
+        self._write_groups(groups, target, result, same_volume, cancel_token)
+        return result
+
+    def _write_groups(self, groups: Dict[str, List[_ArchiveFile]], target: str, result: Dict,
+                      same_volume: bool, cancel_token: Optional[CancelToken]):
+        """写入一批分组好的文件"""
+        with self._lock:
+            for archive, files, written in self._run_groups(groups, target, cancel_token):
+                if isinstance(written, OSError):
+                    result["errors"] += len(files)
+                    self.logger.error(f"写入冷存储归档失败 {archive}", written)
+                    continue
+
+                archived, entries = written
+                if not archived:
+                    continue
+                try:
+                    self._append_index(entries)
+                except OSError as e:
+                    # 索引未落盘时保留原文件，归档在预算清理时删除
+                    result["errors"] += len(archived)
+                    self.logger.error(f"写入冷存储索引失败 {archive}", e)
+                    continue
+
+                # 归档和索引落盘后再删除原文件
+                freed = 0
+                for path, rel_path, size in archived:
+                    try:
+                        path.unlink()
+                        result["files_archived"] += 1
+                        freed += size
+                        result["removed"].append(rel_path)
+                    except OSError as e:
+                        result["errors"] += 1
+                        self.logger.error(f"删除已归档文件失败 {path}", e)
+
+                archive_size = (self.cold_root / archive).stat().st_size
+                result["bytes_archived"] += archive_size
+                result["bytes_freed"] += freed - archive_size if same_volume else freed
+                self.logger.info(f"已归档到冷存储: {archive} ({len(archived)}个文件)")
+
+    def _run_groups(self, groups: Dict[str, List[_ArchiveFile]], target: str,
+                    cancel_token: Optional[CancelToken]):
+        """按分组顺序写入归档并逐个返回结果（出错时返回OSError）
+
+        启用多进程卸载时，总大小达到阈值的分组提交到工作进程并行压缩，只传递文件路径。
+        """
+        offload = self.offload if self.offload is not None and self.offload.enabled else None
+        futures = {}
+        executor = None
+        # 每个分组写入新的归档（分组的归档键互不相同，并行写入时名称不会冲突）
+        names = {archive: self._new_archive(archive) for archive in groups}
+        if offload is not None:
+            large = [archive for archive, files in groups.items()
+                     if sum(f[3] for f in files) >= offload.min_size]
+            if large:
+                executor = ThreadPoolExecutor(max_workers=offload.workers, thread_name_prefix="ColdTier")
+                for archive in large:
+                    futures[archive] = executor.submit(
+                        offload.call, write_archive, self.cold_root / names[archive], names[archive],
+                        groups[archive], self.compression, target, cancel_token=cancel_token
+                    )
+
+        try:
+            for archive, files in groups.items():
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                name = names[archive]
+                try:
+                    if archive in futures:
+                        written = futures[archive].result()
+                    else:
+                        written = write_archive(self.cold_root / name, name, files, self.compression,
+                                                target, cancel_token)
+                except OSError as e:
+                    written = e
+                yield name, files, written
+        finally:
+            if executor is not None:
+                for future in futures.values():
+                    future.cancel()
+                executor.shutdown(wait=True)
+
+    def _append_index(self, entries: List[Dict]):
+        """追加索引条目并落盘（删除原文件前索引必须已持久化）"""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def iter_index(self) -> Iterator[Dict]:
+        """遍历归档索引"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            return
+
+    def find(self, rel_path: str, target: Optional[str] = None) -> List[Dict]:
+        """查找文件（按备份路径或归档内名称匹配，后缀匹配也可）
+
+        target: 只查找该备份目标上的文件（旧索引条目没有记录备份目标，始终匹配）
+        """
+        rel_path = rel_path.replace("\\", "/").strip("/")
+        target = _normalize_target(target) if target else None
+        return [
+            entry for entry in self.iter_index()
+            if (entry["path"] == rel_path or entry["path"].endswith("/" + rel_path)
+                or entry["member"] == rel_path)
+            and (target is None or not entry.get("target") or _normalize_target(entry["target"]) == target)
+        ]
+
+    def extract(self, entry: Dict, dest_dir: Path) -> Path:
+        """从归档中单独提取一个文件（通过ZIP中央目录定位，无需解压整个归档）"""
+        import zipfile
+
+        dest = Path(dest_dir) / Path(entry["path"]).name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        with zipfile.ZipFile(self.cold_root / entry["archive"]) as zf:
+            with zf.open(entry["member"]) as src, open(dest, "wb") as out:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+        os.utime(dest, (entry["mtime"], entry["mtime"]))
+        return dest
+
+    def total_size(self) -> int:
+        """冷存储总大小"""
+        return sum(path.stat().st_size for path in self.cold_root.rglob("*.zip"))
+
+    def enforce_budget(self, max_bytes: Optional[int] = None) -> Dict:
+        """冷存储超出预算（默认为cold_tier_max_gb）时删除最旧的归档"""
+        result = {"archives_deleted": 0, "bytes_freed": 0}
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if (not limit and max_bytes is None) or not self.cold_root.is_dir():
+            return result
+
+        with self._lock:
+            archives = sorted(self.cold_root.rglob("*.zip"), key=lambda p: p.stat().st_mtime)
+            total = sum(path.stat().st_size for path in archives)
+            deleted = set()
+
+            for path in archives:
+                if total <= limit:
+                    break
+                size = path.stat().st_size
+                try:
+                    path.unlink()
+                except OSError as e:
+                    self.logger.error(f"删除冷存储归档失败 {path}", e)
+                    continue
+                total -= size
+                deleted.add(path.relative_to(self.cold_root).as_posix())
+                result["archives_deleted"] += 1
+                result["bytes_freed"] += size
+                self.logger.info(f"冷存储超出预算，删除归档: {path.name} ({size / GB:.3f}GB)")
+
+            if deleted:
+                self._rewrite_index(deleted)
+
+        return result
+
+    def _rewrite_index(self, deleted_archives: set):
+        """从索引中移除已删除的归档（临时文件落盘后替换，再同步目录，与write_archive相同）"""
+        tmp_path = self.index_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self.iter_index():
+                    if entry["archive"] not in deleted_archives:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.index_path)
+            fsync_dir(self.index_path.parent)
+        except OSError as e:
+            self.logger.error("更新冷存储索引失败", e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _normalize_target(path: str) -> str:
+    """用于比较的备份目标路径"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行工具：查找并提取冷存储中的文件"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="冷存储归档工具")
+    parser.add_argument("--config", default="config.json", help="配置文件路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    find_parser = sub.add_parser("find", help="查找归档中的文件")
+    find_parser.add_argument("path", help="备份路径或文件名")
+    find_parser.add_argument("--target", help="只查找该备份目标上的文件")
+    extract_parser = sub.add_parser("extract", help="提取归档中的文件")
+    extract_parser.add_argument("path", help="备份路径或文件名")
+    extract_parser.add_argument("--to", default=".", help="提取到的目录")
+    extract_parser.add_argument("--target", help="只提取该备份目标上的文件")
+    args = parser.parse_args(argv)
+
+    from main import ConfigManager
+
+    class _PrintLogger:
+        def info(self, message):
+            print(f"[INFO] {message}")
+
+        def error(self, message, exc=None):
+            print(f"[ERROR] {message}: {exc}" if exc else f"[ERROR] {message}")
+
+    cold = ColdTier.from_config(ConfigManager(args.config), _PrintLogger())
+    matches = cold.find(args.path, args.target)
+    if not matches:
+        print("[信息] 冷存储中未找到该文件")
+        return 1
+
+    # 多个备份目标上有同名文件时按备份目标分文件夹提取，互不覆盖
+    by_target = len({entry.get("target", "") for entry in matches}) > 1
+    for entry in matches:
+        dest_dir = Path(args.to)
+        if by_target and entry.get("target"):
+            dest_dir = dest_dir / (Path(entry["target"]).name or "_root")
+        if args.command == "find":
+            target = f", 备份目标 {entry['target']}" if entry.get("target") else ""
+            print(f"{entry['path']}  ({entry['size']}字节, 归档 {entry['archive']}{target})")
+        else:
+            print(f"[成功] 已提取: {cold.extract(entry, dest_dir)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
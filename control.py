@@ -0,0 +1,264 @@
+"""
+控制接口模块
+本地控制端点（POSIX上为Unix域套接字，Windows上为命名管道），
+用于查询运行状态，以及在不重启监控的情况下暂停/恢复、调整并发数和I/O限速、重新加载配置、触发维护任务
+"""
+
+import os
+import sys
+import hashlib
+import secrets
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# 控制请求等待超时（秒），避免异常客户端长时间占用连接线程
+_REQUEST_TIMEOUT = 5
+
+
+def control_address(state_dir: Path) -> str:
+    """控制端点地址（按备份目录区分，同一台机器可运行多个实例）"""
+    state_dir = Path(state_dir)
+    if sys.platform == "win32":
+        digest = hashlib.sha1(str(state_dir.resolve()).lower().encode("utf-8")).hexdigest()[:12]
+        return rf"\\.\pipe\USBBackup-{digest}"
+    return str(state_dir / "control.sock")
+
+
+def _key_path(state_dir: Path) -> Path:
+    """认证密钥文件"""
+    return Path(state_dir) / "control.key"
+
+
+def load_authkey(state_dir: Path, create: bool = False) -> Optional[bytes]:
+    """读取认证密钥（只有能读取备份状态目录的用户才能连接）"""
+    path = _key_path(state_dir)
+    try:
+        return bytes.fromhex(path.read_text(encoding="utf-8").strip())
+    except (OSError, ValueError):
+        if not create:
+            return None
+
+    key = secrets.token_bytes(32)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(key.hex())
+    return key
+
+
+class ControlServer:
+    """控制端点服务线程"""
+
+    def __init__(self, state_dir: Path, handler: Callable[[str, Dict], Dict], logger):
+        self.state_dir = Path(state_dir)
+        self.address = control_address(self.state_dir)
+        self.handler = handler
+        self.logger = logger
+        self._authkey: Optional[bytes] = None
+        self._listener = None
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        # 各连接在单独的线程中处理，命令仍逐个执行
+        self._handler_lock = threading.Lock()
+
+    def start(self) -> bool:
+        """创建控制端点并启动服务线程"""
+        from multiprocessing.connection import Listener
+
+        try:
+            self._authkey = load_authkey(self.state_dir, create=True)
+            if sys.platform != "win32" and os.path.exists(self.address):
+                # 上次异常退出残留的套接字文件
+                os.unlink(self.address)
+            # 认证在连接线程中进行（Listener带authkey时accept会等待客户端完成认证）
+            self._listener = Listener(self.address)
+        except Exception as e:
+            self.logger.error("创建控制端点失败", e)
+            return False
+
+        self._stopping = False
+        self._thread = threading.Thread(target=self._serve, name="ControlServer", daemon=True)
+        self._thread.start()
+        self.logger.info(f"控制端点: {self.address}")
+        return True
+
+    def _serve(self):
+        """接受连接，每个连接在单独的线程中认证并处理请求（不响应的客户端不会阻塞其他连接和停止）"""
+        while not self._stopping:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._stopping:
+                    return
+                self.logger.warning(f"接受控制连接失败: {e}")
+                continue
+
+            if self._stopping:
+                conn.close()
+                return
+            threading.Thread(target=self._handle, args=(conn,), name="ControlConnection", daemon=True).start()
+
+    def _handle(self, conn):
+        """认证客户端并处理一个请求"""
+        from multiprocessing.connection import answer_challenge, deliver_challenge
+
+        with conn:
+            try:
+                deliver_challenge(conn, self._authkey)
+                answer_challenge(conn, self._authkey)
+            except Exception as e:
+                # 认证失败等单个连接的错误不影响服务
+                self.logger.warning(f"控制连接被拒绝: {e}")
+                return
+
+            try:
+                if not conn.poll(_REQUEST_TIMEOUT):
+                    return
+                request = conn.recv()
+                command = request.get("command", "")
+                args = request.get("args") or {}
+                with self._handler_lock:
+                    if self._stopping:
+                        return
+                    try:
+                        reply = self.handler(command, args)
+                    except Exception as e:
+                        self.logger.error(f"处理控制命令失败 {command}", e)
+                        reply = {"ok": False, "error": str(e)}
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+
+    def stop(self):
+        """停止服务线程并删除控制端点"""
+        if self._listener is None:
+            return
+        self._stopping = True
+
+        # 连接一次以唤醒阻塞在accept上的服务线程（不进行认证，服务线程直接关闭该连接）
+        try:
+            from multiprocessing.connection import Client
+            Client(self.address).close()
+        except Exception:
+            pass
+
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+        self._listener = None
+
+
+def send_command(state_dir: Path, command: str, **args) -> Dict:
+    """向运行中的实例发送控制命令"""
+    from multiprocessing.connection import Client
+
+    authkey = load_authkey(state_dir)
+    if authkey is None:
+        return {"ok": False, "error": "未找到控制密钥，备份程序可能未运行"}
+
+    try:
+        with Client(control_address(state_dir), authkey=authkey) as conn:
+            conn.send({"command": command, "args": args})
+            return conn.recv()
+    except (OSError, EOFError) as e:
+        return {"ok": False, "error": f"无法连接备份程序: {e}"}
+
+
+def format_status(status: Dict) -> str:
+    """格式化状态输出"""
+    lines = [
+        f"运行时间: {status.get('uptime', 0) / 60:.1f}分钟  "
+        f"状态: {'已暂停' if status.get('paused') else '运行中'}",
+        f"复制并发: {status.get('active_copies', 0)}/{status.get('copy_workers', 0)}  "
+        f"自适应限速: {'开' if status.get('adaptive') else '关'}",
+        f"读限速: {status.get('read_limit_mbps', 0):.1f}MB/s  "
+        f"写限速: {status.get('write_limit_mbps', 0):.1f}MB/s (0为不限)",
+        f"累计写入: {status.get('bytes_written', 0) / (1024 * 1024):.1f}MB  "
+        f"平均吞吐: {status.get('throughput_mbps', 0):.2f}MB/s",
+        f"维护任务: {status.get('maintenance') or '无'}",
+    ]
+
+    for target in status.get("targets", []):
+        lines.append(
+            f"备份目标 {target['path']}: 可用{target['free_gb']:.1f}GB "
+            f"(保留{target['min_free_space_gb']:.1f}GB), 权重{target['weight']}, "
+            f"写入会话{target['active_sessions']}个"
+        )
+
+    for watch in status.get("watching", []):
+        lines.append(f"监视设备 {watch['mount']}: 方式{watch['mode']}, 等待稳定的文件{watch['pending']}个")
+
+    sessions: List[Dict] = status.get("sessions", [])
+    if not sessions:
+        lines.append("活动会话: 无")
+    for session in sessions:
+        lines.append(
+            f"会话 {session['mount']} ({session['label']}, {session['device_id'][:16]}) -> {session['target']}: "
+            f"已复制{session['files_copied']}个 {session['total_size'] / (1024 * 1024):.1f}MB, "
+            f"待复制{session['queued']}个, 待扫描目录{session['pending_dirs']}个, "
+            f"{session['throughput_mbps']:.2f}MB/s, 已运行{session['elapsed']:.0f}秒"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行控制工具"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="USB备份系统控制工具")
+    parser.add_argument("--config", default="config.json", help="配置文件路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="查看活动会话、队列和吞吐量")
+    sub.add_parser("pause", help="暂停所有会话")
+    sub.add_parser("resume", help="恢复所有会话")
+    sub.add_parser("reload", help="重新加载配置文件")
+    sub.add_parser("stop", help="停止备份程序")
+    workers = sub.add_parser("workers", help="修改复制并发数")
+    workers.add_argument("count", type=int)
+    limits = sub.add_parser("limits", help="修改I/O限速（MB/s，0为不限）")
+    limits.add_argument("--read", type=float)
+    limits.add_argument("--write", type=float)
+    limits.add_argument("--adaptive", choices=["on", "off"])
+    maintenance = sub.add_parser("maintenance", help="立即执行维护任务")
+    maintenance.add_argument("task", choices=["cleanup", "scrub", "rescan"])
+    profile = sub.add_parser("profile", help="开关会话性能分析")
+    profile.add_argument("state", choices=["on", "off"])
+    profile.add_argument("--rate", type=float, help="cProfile/tracemalloc采样率（0-1）")
+    args = parser.parse_args(argv)
+
+    from main import ConfigManager
+    from checkpoint import STATE_DIR_NAME
+
+    config = ConfigManager(args.config)
+    state_dir = Path(config.get("backup_folder", "USB_Backup")) / STATE_DIR_NAME
+
+    params = {}
+    if args.command == "workers":
+        params["count"] = args.count
+    elif args.command == "limits":
+        params = {"read_mbps": args.read, "write_mbps": args.write}
+        if args.adaptive:
+            params["adaptive"] = args.adaptive == "on"
+    elif args.command == "maintenance":
+        params["task"] = args.task
+    elif args.command == "profile":
+        params = {"enabled": args.state == "on", "sample_rate": args.rate}
+
+    reply = send_command(state_dir, args.command, **params)
+    if not reply.get("ok"):
+        print(f"[错误] {reply.get('error', '未知错误')}")
+        return 1
+
+    if args.command == "status":
+        print(format_status(reply["status"]))
+    else:
+        print(f"[成功] {reply.get('message', '')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+文件复制模块
+分块复制文件，便于在块之间做限速、取消等处理，并在复制的同时计算内容哈希
+"""
+
+import os
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Optional, Tuple
+
+from cancel import CancelToken
+from throttle import IOLimiter
+from journal import part_path
+from durability import fsync_file, fsync_dir
+
+# 默认复制块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 内容哈希算法
+HASH_ALGORITHM = "sha256"
+
+
+def copy_file(src: Path, dest: Path, io_limiter: Optional[IOLimiter] = None,
+              cancel_token: Optional[CancelToken] = None,
+              chunk_size: int = CHUNK_SIZE, offload=None, journal=None,
+              durability: str = "none") -> Tuple[int, str]:
+    """分块复制文件并保留时间戳等元数据，返回复制的字节数和内容哈希
+
+    哈希在数据流经时计算（一次读取、一次写入），无需复制后再读回校验。
+    传入 offload（OffloadPool）时，大文件的哈希交给工作进程计算。
+    数据先写入临时文件，完成后重命名为目标文件；传入 journal（CopyJournal）时记录预写日志。
+    复制失败或被取消时删除临时文件。
+    durability 为 "per-file" 时重命名前后分别同步文件和目录；
+    为 "batched" 时保留临时文件，由 SyncBatch 成批同步后重命名并结束日志记录。
+    """
+    tmp = part_path(dest)
+    entry_id = journal.begin(tmp, dest) if journal is not None else None
+    worker = offload.lease(src) if offload is not None else None
+    try:
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+            if worker is not None:
+                copied, digest = _copy_offloaded(fsrc, fdst, worker, io_limiter, cancel_token)
+            else:
+                copied, digest = _copy_local(fsrc, fdst, io_limiter, cancel_token, chunk_size)
+
+        shutil.copystat(src, tmp)
+        if durability == "batched":
+            return copied, digest
+        if durability == "per-file":
+            fsync_file(tmp)
+        os.replace(tmp, dest)
+        if durability == "per-file":
+            fsync_dir(dest.parent)
+        if journal is not None:
+            journal.end(entry_id, True)
+        return copied, digest
+
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        if journal is not None:
+            journal.end(entry_id, False)
+        raise
+    finally:
+        if worker is not None:
+            offload.release(worker)
+
+
+def _copy_local(fsrc, fdst, io_limiter: Optional[IOLimiter], cancel_token: Optional[CancelToken],
+                chunk_size: int) -> Tuple[int, str]:
+    """在当前线程中复制并计算哈希"""
+    copied = 0
+    hasher = hashlib.new(HASH_ALGORITHM)
+    while True:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        chunk = fsrc.read(chunk_size)
+        if not chunk:
+            break
+        if io_limiter:
+            io_limiter.on_read(len(chunk), cancel_token)
+            io_limiter.on_write(len(chunk), cancel_token)
+        hasher.update(chunk)
+        fdst.write(chunk)
+        copied += len(chunk)
+    return copied, hasher.hexdigest()
+
+
+def _copy_offloaded(fsrc, fdst, worker, io_limiter: Optional[IOLimiter],
+                    cancel_token: Optional[CancelToken]) -> Tuple[int, str]:
+    """直接读入共享内存块并写出，同时由工作进程计算哈希（读写与哈希流水线并行）"""
+    copied = 0
+    worker.begin()
+    while True:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        slot = worker.next_slot()
+        with worker.buffer(slot) as view:
+            length = fsrc.readinto(view)
+            if not length:
+                worker.release_slot(slot)
+                break
+            if io_limiter:
+                io_limiter.on_read(length, cancel_token)
+                io_limiter.on_write(length, cancel_token)
+            with view[:length] as chunk:
+                fdst.write(chunk)
+        worker.update(slot, length)
+        copied += length
+    return copied, worker.digest()
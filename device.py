@@ -0,0 +1,297 @@
+"""
+USB设备标识模块
+根据卷序列号/UUID、文件系统和容量生成稳定的设备指纹，并保存每个设备的状态
+"""
+
+import os
+import sys
+import json
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class DeviceFingerprint:
+    """设备指纹"""
+
+    def __init__(self, mount: str, label: str, serial: str = "", fstype: str = "", capacity: int = 0):
+        self.mount = mount
+        self.label = label
+        self.serial = serial
+        self.fstype = fstype
+        self.capacity = capacity
+
+        # 优先使用卷序列号/UUID，获取失败时退回到卷标
+        identity = serial if serial else f"label:{label}"
+        source = f"{identity}|{fstype.lower()}|{capacity}"
+        self.device_id = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def short_id(self) -> str:
+        """短标识，用于文件夹名"""
+        return self.device_id[:8]
+
+    def to_dict(self) -> Dict:
+        """转换为可序列化字典"""
+        return {
+            "device_id": self.device_id,
+            "label": self.label,
+            "serial": self.serial,
+            "fstype": self.fstype,
+            "capacity": self.capacity
+        }
+
+    def __repr__(self) -> str:
+        return f"DeviceFingerprint({self.label!r}, id={self.device_id})"
+
+
+def _read_volume_serial(mount: str) -> Tuple[str, str]:
+    """读取卷序列号和文件系统类型"""
+    if sys.platform == "win32":
+        try:
+            import win32api
+            info = win32api.GetVolumeInformation(mount)
+            return f"{info[1] & 0xFFFFFFFF:08X}", info[4] or ""
+        except Exception:
+            return "", ""
+
+    # Linux: 通过 /dev/disk/by-uuid 查找挂载设备的UUID
+    try:
+        import psutil
+        device = ""
+        for partition in psutil.disk_partitions(all=False):
+            if os.path.normpath(partition.mountpoint) == os.path.normpath(mount):
+                device = os.path.realpath(partition.device)
+                fstype = partition.fstype
+                break
+        else:
+            return "", ""
+
+        by_uuid = Path("/dev/disk/by-uuid")
+        if by_uuid.is_dir():
+            for link in by_uuid.iterdir():
+                if os.path.realpath(link) == device:
+                    return link.name, fstype
+        return "", fstype
+    except Exception:
+        return "", ""
+
+
+def read_fingerprint(mount: str, label: str) -> DeviceFingerprint:
+    """读取设备指纹"""
+    import psutil
+
+    serial, fstype = _read_volume_serial(mount)
+
+    if not fstype:
+        try:
+            for partition in psutil.disk_partitions(all=False):
+                if os.path.normpath(partition.mountpoint) == os.path.normpath(mount):
+                    fstype = partition.fstype
+                    break
+        except Exception:
+            pass
+
+    try:
+        capacity = psutil.disk_usage(mount).total
+    except Exception:
+        capacity = 0
+
+    return DeviceFingerprint(mount, label, serial, fstype, capacity)
+
+
+class DeviceRegistry:
+    """按挂载点缓存设备指纹，避免每次轮询都重新读取卷信息"""
+
+    def __init__(self, label_provider: Callable[[str], str]):
+        self.label_provider = label_provider
+        # 挂载点 -> (校验值, 指纹)
+        self._cache: Dict[str, Tuple[Optional[int], DeviceFingerprint]] = {}
+
+    def _mount_token(self, mount: str) -> Optional[int]:
+        """廉价的挂载校验值（Windows上为卷序列号），用于发现同一挂载点换了设备"""
+        try:
+            return os.stat(mount).st_dev
+        except OSError:
+            return None
+
+    def identify(self, mount: str) -> DeviceFingerprint:
+        """获取挂载点上设备的指纹"""
+        token = self._mount_token(mount)
+        cached = self._cache.get(mount)
+        if cached and cached[0] == token:
+            return cached[1]
+
+        fingerprint = read_fingerprint(mount, self.label_provider(mount))
+        self._cache[mount] = (token, fingerprint)
+        return fingerprint
+
+    def prune(self, current_mounts):
+        """移除已拔出设备的缓存"""
+        for mount in list(self._cache):
+            if mount not in current_mounts:
+                del self._cache[mount]
+
+
+class DeviceState:
+    """单个设备的持久状态：备份文件夹、统计和文件清单"""
+
+    def __init__(self, fingerprint: DeviceFingerprint, folder: str):
+        self.fingerprint = fingerprint
+        self.folder = folder
+        self.stats = {
+            "sessions": 0,
+            "files_copied": 0,
+            "total_size": 0,
+            "first_seen": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "last_seen": ""
+        }
+        # 相对路径 -> [大小, 修改时间(ns), 内容哈希]，用于增量跳过
+        self.manifest: Dict[str, list] = {}
+        # 上次保存后记录的文件（会话中途只追加这些记录，不重写整个清单）
+        self.unsaved: List[str] = []
+
+    def is_unchanged(self, rel_path: str, stat: os.stat_result) -> bool:
+        """文件自上次备份后是否未修改"""
+        entry = self.manifest.get(rel_path)
+        return bool(entry) and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns
+
+    def record(self, rel_path: str, stat: os.stat_result, digest: str = ""):
+        """记录已备份文件"""
+        self.manifest[rel_path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.unsaved.append(rel_path)
+
+    def forget(self, rel_path: str):
+        """从清单中移除文件，下次插入时重新备份"""
+        if self.manifest.pop(rel_path, None) is not None:
+            self.unsaved.append(rel_path)
+
+    def to_dict(self) -> Dict:
+        """转换为可序列化字典"""
+        return {
+            "fingerprint": self.fingerprint.to_dict(),
+            "folder": self.folder,
+            "stats": self.stats,
+            "manifest": self.manifest
+        }
+
+
+class DeviceStateStore:
+    """设备状态存储（按设备指纹保存）"""
+
+    def __init__(self, state_dir: Path):
+        self.devices_dir = Path(state_dir) / "devices"
+
+    def _path_for(self, device_id: str) -> Path:
+        """获取设备状态文件路径"""
+        return self.devices_dir / f"{device_id}.json"
+
+    def _log_path_for(self, device_id: str) -> Path:
+        """获取清单追加记录的路径（会话中途保存的进度，完整保存后删除）"""
+        return self.devices_dir / f"{device_id}.log.jsonl"
+
+    def _replay(self, device_id: str, manifest: Dict[str, list]):
+        """将追加记录应用到清单（末行不完整时忽略）"""
+        try:
+            with open(self._log_path_for(device_id), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rel_path, entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry is None:
+                        manifest.pop(rel_path, None)
+                    else:
+                        manifest[rel_path] = entry
+        except OSError:
+            pass
+
+    def load(self, fingerprint: DeviceFingerprint, label_as_folder: bool = True) -> DeviceState:
+        """加载设备状态，不存在时创建"""
+        path = self._path_for(fingerprint.device_id)
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                state = DeviceState(fingerprint, data["folder"])
+                state.stats.update(data.get("stats", {}))
+                state.manifest = data.get("manifest", {})
+                self._replay(fingerprint.device_id, state.manifest)
+                return state
+            except Exception:
+                pass
+
+        if label_as_folder:
+            folder = f"{_safe_name(fingerprint.label)}_{fingerprint.short_id}"
+        else:
+            folder = fingerprint.device_id
+        return DeviceState(fingerprint, folder)
+
+    def save(self, state: DeviceState) -> bool:
+        """保存设备状态（先写临时文件再替换），并删除已并入的追加记录"""
+        device_id = state.fingerprint.device_id
+        if not self._write(device_id, state.to_dict()):
+            return False
+        state.unsaved = []
+        try:
+            self._log_path_for(device_id).unlink()
+        except OSError:
+            pass
+        return True
+
+    def append(self, state: DeviceState) -> bool:
+        """追加上次保存后记录的文件（会话进度，开销与新记录数相关，与清单大小无关）"""
+        if not state.unsaved:
+            return True
+        if not self._path_for(state.fingerprint.device_id).exists():
+            # 新设备还没有状态文件（备份文件夹等信息只在完整保存时写入）
+            return self.save(state)
+        try:
+            with open(self._log_path_for(state.fingerprint.device_id), 'a', encoding='utf-8') as f:
+                for rel_path in state.unsaved:
+                    # 已移除的文件记录为null
+                    f.write(json.dumps([rel_path, state.manifest.get(rel_path)], ensure_ascii=False) + "\n")
+            state.unsaved = []
+            return True
+        except OSError:
+            return False
+
+    def forget(self, device_id: str, rel_path: str) -> bool:
+        """从清单中移除文件，下次插入时重新备份"""
+        path = self._path_for(device_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            manifest = data.setdefault("manifest", {})
+            self._replay(device_id, manifest)
+            if manifest.pop(rel_path, None) is None:
+                return False
+            if not self._write(device_id, data):
+                return False
+            try:
+                self._log_path_for(device_id).unlink()
+            except OSError:
+                pass
+            return True
+        except Exception:
+            return False
+
+    def _write(self, device_id: str, data: Dict) -> bool:
+        """写入状态文件"""
+        path = self._path_for(device_id)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            self.devices_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            return True
+        except Exception:
+            return False
+
+
+def _safe_name(name: str) -> str:
+    """将卷标转换为可用的文件夹名"""
+    cleaned = "".join("_" if c in '<>:"/\\|?*' else c for c in name).strip(" ._")
+    return cleaned or "UNLABELED"
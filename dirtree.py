@@ -0,0 +1,116 @@
+"""
+目录摘要树模块
+按设备保存上次会话的目录摘要（目录修改时间、子项数量、子目录摘要哈希），
+再次插入时跳过修改时间未变化的目录，只重新检查变化的分支。
+这是启发式优化（默认关闭）：原地修改文件不会改变所在目录的修改时间，
+只适合文件只增不改的可移动存储（如相机存储卡）
+"""
+
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 修改时间距扫描时刻太近的目录不可信（FAT文件系统时间精度为2秒）
+_MTIME_SETTLE_NS = 2 * 1_000_000_000
+
+
+class DirSummaryTree:
+    """单个设备的目录摘要树"""
+
+    def __init__(self, selection_digest: str = ""):
+        # 影响文件选择的配置摘要，配置变化后旧摘要失效
+        self.selection_digest = selection_digest
+        # 相对目录 -> [目录修改时间(ns)或None, 子项数量, 摘要哈希, 子目录名列表]
+        self.entries: Dict[str, list] = {}
+        self.root_hash = ""
+
+    def lookup(self, rel_dir: str, mtime_ns: int) -> Optional[List[str]]:
+        """目录未变化时返回上次记录的子目录名，否则返回None"""
+        entry = self.entries.get(rel_dir)
+        if entry is None or entry[0] is None or entry[0] != mtime_ns:
+            return None
+        return entry[3]
+
+    def record(self, rel_dir: str, mtime_ns: Optional[int], child_count: int, subdir_names: List[str]):
+        """记录目录摘要（mtime_ns为None表示下次必须重新列出）"""
+        if mtime_ns is not None and time.time_ns() - mtime_ns < _MTIME_SETTLE_NS:
+            mtime_ns = None
+        self.entries[rel_dir] = [mtime_ns, child_count, "", subdir_names]
+
+    def invalidate(self, rel_dir: str):
+        """标记目录下次必须重新列出（如其中的文件在目录记录之后才同步失败）"""
+        entry = self.entries.get(rel_dir)
+        if entry is not None:
+            entry[0] = None
+
+    def copy_entry(self, rel_dir: str, previous: "DirSummaryTree"):
+        """沿用上次会话的目录摘要"""
+        self.entries[rel_dir] = list(previous.entries[rel_dir])
+
+    def compute_hashes(self) -> str:
+        """自底向上计算各目录的摘要哈希，返回根目录哈希"""
+        # 按深度从深到浅处理，保证子目录先于父目录
+        for rel_dir in sorted(self.entries, key=lambda d: d.count("/") + (1 if d else 0), reverse=True):
+            mtime_ns, child_count, _, subdir_names = self.entries[rel_dir]
+            hasher = hashlib.sha1(f"{mtime_ns}|{child_count}".encode("utf-8"))
+            for name in subdir_names:
+                child = f"{rel_dir}/{name}" if rel_dir else name
+                child_entry = self.entries.get(child)
+                hasher.update(f"|{name}:{child_entry[2] if child_entry else '-'}".encode("utf-8"))
+            self.entries[rel_dir][2] = hasher.hexdigest()
+
+        root = self.entries.get("")
+        self.root_hash = root[2] if root else ""
+        return self.root_hash
+
+    def to_dict(self) -> Dict:
+        """转换为可序列化字典"""
+        return {
+            "selection_digest": self.selection_digest,
+            "root_hash": self.root_hash,
+            "entries": self.entries
+        }
+
+
+class DirTreeStore:
+    """目录摘要树存储（按设备指纹保存）"""
+
+    def __init__(self, state_dir: Path):
+        self.trees_dir = Path(state_dir) / "trees"
+
+    def _path_for(self, device_id: str) -> Path:
+        """获取设备对应的摘要文件"""
+        return self.trees_dir / f"{device_id}.json"
+
+    def load(self, device_id: str, selection_digest: str) -> DirSummaryTree:
+        """加载上次会话的摘要树（不存在或配置已变化时返回空树）"""
+        tree = DirSummaryTree(selection_digest)
+        path = self._path_for(device_id)
+        if not path.exists():
+            return tree
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("selection_digest") == selection_digest:
+                tree.entries = data.get("entries", {})
+                tree.root_hash = data.get("root_hash", "")
+        except Exception:
+            pass
+        return tree
+
+    def save(self, device_id: str, tree: DirSummaryTree) -> bool:
+        """保存摘要树（先写临时文件再替换）"""
+        path = self._path_for(device_id)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            self.trees_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(tree.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            return True
+        except Exception:
+            return False
@@ -0,0 +1,246 @@
+"""
+持久化策略模块
+决定复制完成的文件何时落盘：none（交给操作系统缓存）、per-file（每个文件fsync）、
+batched（按文件数或时间成批同步）。文件落盘后才记录到日志、清单和统计中
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from journal import part_path
+
+MODES = ("none", "per-file", "batched")
+
+
+def fsync_file(path: Path):
+    """将文件数据写入磁盘（Windows上需要以可写方式打开）"""
+    flags = os.O_RDWR if sys.platform == "win32" else os.O_RDONLY
+    fd = os.open(path, flags | getattr(os, "O_BINARY", 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(path: Path):
+    """将目录项（重命名结果）写入磁盘（Windows不支持，由NTFS日志保证）"""
+    if sys.platform == "win32":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# libc的syncfs函数（首次使用时加载；None为未加载，False为不可用）
+_syncfs = None
+
+
+def _load_syncfs():
+    """加载syncfs（Linux 2.6.39+），其他平台返回None"""
+    global _syncfs
+    if _syncfs is None:
+        _syncfs = False
+        if sys.platform.startswith("linux"):
+            try:
+                import ctypes
+                func = ctypes.CDLL(None, use_errno=True).syncfs
+                func.argtypes = [ctypes.c_int]
+                func.restype = ctypes.c_int
+                _syncfs = func
+            except (OSError, AttributeError):
+                pass
+    return _syncfs or None
+
+
+def syncfs_available() -> bool:
+    """当前平台是否支持按文件系统同步"""
+    return _load_syncfs() is not None
+
+
+def sync_filesystem(path: Path):
+    """同步path所在的整个文件系统（所有脏数据和目录项只需一次日志提交）"""
+    func = _load_syncfs()
+    if func is None:
+        raise OSError("当前平台不支持syncfs")
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if func(fd) != 0:
+            import ctypes
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), str(path))
+    finally:
+        os.close(fd)
+
+
+class DurabilityPolicy:
+    """持久化策略
+
+    syncfs为True且平台支持时（Linux），batched模式每批按文件系统调用两次syncfs
+    （临时文件数据一次、重命名一次），而不是逐个fsync文件和目录；
+    其他平台逐个fsync临时文件，成批只节省目录同步。
+    """
+
+    def __init__(self, mode: str = "batched", batch_files: int = 64, batch_ms: int = 500, syncfs: bool = True):
+        self.mode = mode if mode in MODES else "batched"
+        self.batch_files = max(1, batch_files)
+        self.batch_ms = max(0, batch_ms)
+        self.syncfs = syncfs
+
+    @classmethod
+    def from_config(cls, config) -> "DurabilityPolicy":
+        """根据配置创建"""
+        return cls(
+            config.get("durability", "batched"),
+            batch_files=int(config.get("durability_batch_files", 64)),
+            batch_ms=int(config.get("durability_batch_ms", 500)),
+            syncfs=bool(config.get("durability_syncfs", True))
+        )
+
+    @property
+    def batched(self) -> bool:
+        return self.mode == "batched"
+
+    def batch(self, journal=None) -> Optional["SyncBatch"]:
+        """为一组复制任务创建同步批次（非batched模式返回None）"""
+        return SyncBatch(self, journal) if self.batched else None
+
+
+class SyncBatch:
+    """一批已写入临时文件、等待落盘的文件（可跨越多个目录，直到达到文件数或时间上限）
+
+    同步顺序：临时文件数据落盘 -> 重命名为正式文件 -> 目录落盘 -> 记录复制日志完成。
+    断电后正式文件要么不存在（临时文件由复制日志清理），要么内容完整。
+    支持syncfs时每个文件系统每批只同步两次（同时会写出该文件系统上其他程序的脏数据）；
+    否则只同步本批的文件和所在目录。
+    """
+
+    def __init__(self, policy: DurabilityPolicy, journal=None):
+        self.policy = policy
+        self.journal = journal
+        # (目标文件, 调用方数据)
+        self._items: List[Tuple[Path, object]] = []
+        self._first_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, dest: Path, item):
+        """加入已写完临时文件的目标文件"""
+        if not self._items:
+            self._first_at = time.monotonic()
+        self._items.append((Path(dest), item))
+
+    @property
+    def due(self) -> bool:
+        """达到文件数或等待时间上限"""
+        if not self._items:
+            return False
+        return (len(self._items) >= self.policy.batch_files
+                or (time.monotonic() - self._first_at) * 1000 >= self.policy.batch_ms)
+
+    def sync(self) -> List[Tuple[object, Optional[Exception]]]:
+        """同步并提交整批文件，返回每个文件的(调用方数据, 错误)"""
+        items, self._items = self._items, []
+        if not items:
+            return []
+
+        results: List[Tuple[object, Optional[Exception]]] = []
+        committed: List[Tuple[Path, object]] = []
+
+        # 数据落盘
+        if self.policy.syncfs and syncfs_available():
+            synced = self._sync_filesystems(items, results)
+        else:
+            synced = []
+            for dest, item in items:
+                try:
+                    fsync_file(part_path(dest))
+                    synced.append((dest, item))
+                except OSError as e:
+                    self._abort(dest)
+                    results.append((item, e))
+
+        for dest, item in synced:
+            try:
+                os.replace(part_path(dest), dest)
+                committed.append((dest, item))
+            except OSError as e:
+                self._abort(dest)
+                results.append((item, e))
+
+        # 重命名落盘（同一目录或同一文件系统只同步一次）
+        dir_errors = {}
+        if self.policy.syncfs and syncfs_available():
+            for parents, error in self._each_filesystem({dest.parent for dest, _ in committed}):
+                if error is not None:
+                    dir_errors.update((parent, error) for parent in parents)
+        else:
+            for parent in {dest.parent for dest, _ in committed}:
+                try:
+                    fsync_dir(parent)
+                except OSError as e:
+                    dir_errors[parent] = e
+
+        for dest, item in committed:
+            error = dir_errors.get(dest.parent)
+            if self.journal is not None:
+                self.journal.finish(dest, error is None)
+            results.append((item, error))
+        return results
+
+    def _sync_filesystems(self, items: List[Tuple[Path, object]],
+                          results: List[Tuple[object, Optional[Exception]]]) -> List[Tuple[Path, object]]:
+        """按文件系统同步临时文件数据，返回成功的文件（失败的文件放弃并加入results）"""
+        failed = {}
+        for parents, error in self._each_filesystem({dest.parent for dest, _ in items}):
+            if error is not None:
+                failed.update((parent, error) for parent in parents)
+
+        synced = []
+        for dest, item in items:
+            error = failed.get(dest.parent)
+            if error is None:
+                synced.append((dest, item))
+            else:
+                self._abort(dest)
+                results.append((item, error))
+        return synced
+
+    @staticmethod
+    def _each_filesystem(parents):
+        """按所在文件系统分组目录，每组调用一次syncfs，逐组返回(目录列表, 错误)"""
+        groups = {}
+        for parent in parents:
+            try:
+                device = os.stat(parent).st_dev
+            except OSError as e:
+                yield [parent], e
+                continue
+            groups.setdefault(device, []).append(parent)
+
+        for group in groups.values():
+            try:
+                sync_filesystem(group[0])
+                yield group, None
+            except OSError as e:
+                yield group, e
+
+    def discard(self):
+        """放弃未同步的文件（会话中止时），删除临时文件"""
+        items, self._items = self._items, []
+        for dest, _ in items:
+            self._abort(dest)
+
+    def _abort(self, dest: Path):
+        """删除临时文件并记录复制日志放弃"""
+        try:
+            os.remove(part_path(dest))
+        except OSError:
+            pass
+        if self.journal is not None:
+            self.journal.finish(dest, False)
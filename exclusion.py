@@ -0,0 +1,137 @@
+"""
+排除规则模块
+编译目录/文件排除规则（名称、通配符、锚定路径前缀、隐藏/系统属性、最大深度），
+在列出目录之前剪除整棵子树，并统计每条规则剪除的数量
+"""
+
+import re
+import sys
+import stat
+import fnmatch
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Windows文件名不区分大小写
+_CASE_INSENSITIVE = sys.platform == "win32"
+
+FILE_ATTRIBUTE_HIDDEN = getattr(stat, "FILE_ATTRIBUTE_HIDDEN", 0x02)
+FILE_ATTRIBUTE_SYSTEM = getattr(stat, "FILE_ATTRIBUTE_SYSTEM", 0x04)
+
+
+class _Rule:
+    """单条编译后的规则"""
+
+    __slots__ = ("text", "regex", "anchored", "dir_only")
+
+    def __init__(self, text: str):
+        self.text = text
+        pattern = text.replace("\\", "/")
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # 以"/"开头或包含"/"的规则按相对设备根目录的完整路径匹配，否则按名称匹配任意层级
+        self.anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        flags = re.IGNORECASE if _CASE_INSENSITIVE else 0
+        self.regex = re.compile(fnmatch.translate(pattern), flags)
+
+    def matches(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        """是否匹配"""
+        if self.dir_only and not is_dir:
+            return False
+        return bool(self.regex.match(rel_path if self.anchored else name))
+
+
+class ExclusionEngine:
+    """排除规则引擎"""
+
+    def __init__(self, folders: Iterable[str] = (), patterns: Iterable[str] = (),
+                 exclude_hidden: bool = False, exclude_system: bool = False, max_depth: int = 0):
+        # 不含通配符的名称放入集合，O(1)匹配
+        self._dir_names = {self._norm(n) for n in folders if n}
+        self._names = set()
+        self._rules: List[_Rule] = []
+        for pattern in patterns:
+            if not pattern:
+                continue
+            plain = pattern.replace("\\", "/")
+            if "/" not in plain.rstrip("/") and not any(c in plain for c in "*?["):
+                if plain.endswith("/"):
+                    self._dir_names.add(self._norm(plain.rstrip("/")))
+                else:
+                    self._names.add(self._norm(plain))
+            else:
+                self._rules.append(_Rule(pattern))
+
+        self.exclude_hidden = exclude_hidden
+        self.exclude_system = exclude_system
+        self.max_depth = max_depth
+        # 规则 -> [剪除目录数, 排除文件数]
+        self.counters: Dict[str, List[int]] = {}
+
+    @classmethod
+    def from_config(cls, config) -> "ExclusionEngine":
+        """根据配置创建"""
+        return cls(
+            folders=config.get("exclude_folders", []),
+            patterns=config.get("exclude_patterns", []),
+            exclude_hidden=config.get("exclude_hidden", False),
+            exclude_system=config.get("exclude_system", False),
+            max_depth=config.get("max_scan_depth", 0)
+        )
+
+    @staticmethod
+    def _norm(name: str) -> str:
+        """规范化名称大小写"""
+        return name.lower() if _CASE_INSENSITIVE else name
+
+    def _count(self, rule: str, is_dir: bool):
+        """累加规则计数"""
+        counter = self.counters.setdefault(rule, [0, 0])
+        counter[0 if is_dir else 1] += 1
+
+    def _attribute_rule(self, entry, name: str) -> Optional[str]:
+        """检查隐藏/系统属性"""
+        if not (self.exclude_hidden or self.exclude_system):
+            return None
+
+        attributes = 0
+        if sys.platform == "win32":
+            try:
+                attributes = entry.stat(follow_symlinks=False).st_file_attributes
+            except (OSError, AttributeError):
+                attributes = 0
+
+        if self.exclude_system and attributes & FILE_ATTRIBUTE_SYSTEM:
+            return "system"
+        if self.exclude_hidden and (attributes & FILE_ATTRIBUTE_HIDDEN or name.startswith(".")):
+            return "hidden"
+        return None
+
+    def match(self, rel_path: str, name: str, is_dir: bool, depth: int = 0, entry=None) -> Optional[str]:
+        """检查条目是否被排除，返回匹配的规则（未排除时返回None）
+
+        rel_path: 相对设备根目录的路径（"/"分隔）
+        depth: 目录层级（根目录下的条目为1）
+        """
+        rule = None
+        norm = self._norm(name)
+        if is_dir and self.max_depth and depth > self.max_depth:
+            rule = "max_depth"
+        elif (is_dir and norm in self._dir_names) or norm in self._names:
+            rule = f"name:{name}"
+        else:
+            for compiled in self._rules:
+                if compiled.matches(rel_path, name, is_dir):
+                    rule = compiled.text
+                    break
+            else:
+                if entry is not None:
+                    rule = self._attribute_rule(entry, name)
+
+        if rule is not None:
+            self._count(rule, is_dir)
+        return rule
+
+    def summary(self) -> List[Tuple[str, int, int]]:
+        """规则统计（规则, 剪除目录数, 排除文件数），按剪除数量降序"""
+        return sorted(((rule, d, f) for rule, (d, f) in self.counters.items()),
+                      key=lambda item: (item[1], item[2]), reverse=True)
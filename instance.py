@@ -0,0 +1,78 @@
+"""
+单实例模块
+在备份状态目录上加跨进程文件锁，保证同一备份目录只有一个监控实例
+（开机自启动和手动启动、快速注销再登录时不会出现两个实例同时备份）
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+# Windows上锁定的字节位置（进程ID写在文件开头，锁定区域之外，其他进程仍可读取）
+_LOCK_OFFSET = 64
+
+
+class InstanceLock:
+    """实例锁（进程退出时由操作系统自动释放，异常退出不会残留）"""
+
+    def __init__(self, state_dir: Path):
+        self.path = Path(state_dir) / "instance.lock"
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        """尝试获取锁（不等待），已被其他实例持有时返回False"""
+        if self._fd is not None:
+            return True
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                os.lseek(fd, _LOCK_OFFSET, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        # 记录持有者进程ID（仅用于提示）
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, f"{os.getpid():<{_LOCK_OFFSET - 1}}\n".encode("ascii"))
+        except OSError:
+            pass
+        self._fd = fd
+        return True
+
+    def owner_pid(self) -> Optional[int]:
+        """持有锁的进程ID（读取失败时返回None）"""
+        try:
+            with open(self.path, "r", encoding="ascii") as f:
+                return int(f.read(_LOCK_OFFSET).strip())
+        except (OSError, ValueError):
+            return None
+
+    def release(self):
+        """释放锁"""
+        if self._fd is None:
+            return
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+                os.lseek(self._fd, _LOCK_OFFSET, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        except OSError:
+            pass
+        os.close(self._fd)
+        self._fd = None
@@ -0,0 +1,144 @@
+"""
+完整性校验模块
+后台抽样复核已备份文件的内容哈希（内存映射读取并限速），报告或隔离损坏的文件
+"""
+
+import os
+import mmap
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from cancel import CancelToken, OperationCancelled
+from catalog import StoreCatalog
+from copier import CHUNK_SIZE, HASH_ALGORITHM
+from throttle import TokenBucket
+
+
+def hash_file_mmap(path: Path, bucket: Optional[TokenBucket] = None,
+                   cancel_token: Optional[CancelToken] = None) -> str:
+    """以内存映射方式读取文件并计算哈希"""
+    hasher = hashlib.new(HASH_ALGORITHM)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return hasher.hexdigest()
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, size, CHUNK_SIZE):
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    chunk = view[offset:offset + CHUNK_SIZE]
+                    if bucket is not None:
+                        bucket.consume(len(chunk), cancel_token)
+                    hasher.update(chunk)
+                    chunk.release()
+            finally:
+                view.release()
+
+    return hasher.hexdigest()
+
+
+class Scrubber:
+    """后台完整性校验"""
+
+    def __init__(self, backup_folder: Path, catalog: StoreCatalog, logger,
+                 sample_size: int = 200, rate_bps: float = 5 * 1024 * 1024,
+                 interval: float = 24 * 3600, quarantine: bool = False,
+                 cancel_token: Optional[CancelToken] = None,
+                 on_quarantine: Optional[Callable[[Dict], None]] = None,
+                 locate: Optional[Callable[[Dict], Optional[Path]]] = None):
+        self.backup_folder = Path(backup_folder)
+        self.catalog = catalog
+        self.logger = logger
+        self.sample_size = sample_size
+        self.bucket = TokenBucket(rate_bps)
+        self.interval = interval
+        self.quarantine = quarantine
+        self.quarantine_dir = catalog.catalog_dir.parent / "quarantine"
+        self.cancel_token = cancel_token or CancelToken()
+        self.on_quarantine = on_quarantine
+        self.locate = locate
+        self.last_result: Dict = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台校验线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="Scrubber", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """校验循环：启动后先等待一个周期，避免与开机时的备份争抢I/O"""
+        while not self.cancel_token.wait(self.interval):
+            try:
+                self.scrub_once()
+            except OperationCancelled:
+                return
+            except Exception as e:
+                self.logger.error("完整性校验失败", e)
+
+    def scrub_once(self) -> Dict:
+        """抽样校验一轮"""
+        result = {"checked": 0, "ok": 0, "corrupted": 0, "missing": 0, "quarantined": 0, "bytes": 0}
+
+        # 同一备份目标上的同一路径只校验最新记录（不同备份目标上的同名文件分别校验）
+        samples = {}
+        for entry in self.catalog.sample(self.sample_size):
+            samples[(entry.get("target"), entry["path"])] = entry
+
+        for entry in samples.values():
+            self.cancel_token.raise_if_cancelled()
+            path = self.locate(entry) if self.locate is not None else self.backup_folder / entry["path"]
+
+            try:
+                if path is None:
+                    raise FileNotFoundError(entry["path"])
+                digest = hash_file_mmap(path, self.bucket, self.cancel_token)
+            except FileNotFoundError:
+                # 已被清理的文件
+                result["missing"] += 1
+                continue
+            except OSError as e:
+                self.logger.warning(f"完整性校验读取失败 {entry['path']}: {e}")
+                continue
+
+            result["checked"] += 1
+            result["bytes"] += entry.get("size", 0)
+
+            if digest == entry.get("sha256"):
+                result["ok"] += 1
+                continue
+
+            result["corrupted"] += 1
+            self.logger.warning(f"备份文件已损坏: {entry['path']} (预期 {entry.get('sha256')}, 实际 {digest})")
+            if self.quarantine and self._quarantine(path, entry["path"]):
+                result["quarantined"] += 1
+                if self.on_quarantine is not None:
+                    self.on_quarantine(entry)
+
+        result["time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.last_result = result
+        self.logger.info(
+            f"完整性校验完成: 校验{result['checked']}个, 正常{result['ok']}个, "
+            f"损坏{result['corrupted']}个, 已清理{result['missing']}个, 隔离{result['quarantined']}个"
+        )
+        return result
+
+    def _quarantine(self, path: Path, rel_path: str) -> bool:
+        """将损坏文件移入隔离目录"""
+        target = self.quarantine_dir / rel_path
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(path), str(target))
+            self.logger.warning(f"已隔离损坏文件: {rel_path}")
+            return True
+        except Exception as e:
+            self.logger.error(f"隔离文件失败 {rel_path}", e)
+            return False
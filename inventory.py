@@ -0,0 +1,180 @@
+"""
+备份文件清单模块
+以列式数组紧凑保存文件信息（目录前缀去重），超出内存预算时在磁盘上做外部归并排序
+"""
+
+import os
+import sys
+import heapq
+import struct
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MB = 1024 * 1024
+
+# 每条记录除文件名字符串外的内存开销（大小、修改时间、目录编号数组列 + 文件名列表指针）
+_RECORD_OVERHEAD = 8 + 8 + 4 + 8
+
+# 按清理策略排序时每条记录的临时开销：排序结果、排序键和归并缓冲区各一个指针，
+# 加上索引整数对象和排序键浮点数对象（对象按8字节对齐分配）
+_SORT_OVERHEAD = 3 * 8 + (sys.getsizeof(1 << 20) + 7) // 8 * 8 + (sys.getsizeof(0.0) + 7) // 8 * 8
+
+# 磁盘归并段记录头：大小、修改时间、路径长度
+_RUN_HEADER = struct.Struct("<qdI")
+
+
+class InventoryRecord:
+    """清单中的一个文件"""
+
+    __slots__ = ("path", "size", "mtime")
+
+    def __init__(self, path: Path, size: int, mtime: float):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+
+def _sort_key(order: Optional[str]) -> Optional[Callable[[int, float], float]]:
+    """根据清理策略返回排序键（参数为大小和修改时间）"""
+    if order == "oldest_first":
+        return lambda size, mtime: mtime
+    if order == "largest_first":
+        return lambda size, mtime: -size
+    return None
+
+
+class FileInventory:
+    """紧凑的备份文件清单，按清理策略顺序迭代"""
+
+    def __init__(self, root: Path, order: Optional[str] = "oldest_first",
+                 memory_budget: int = 64 * MB, spill_dir: Optional[Path] = None):
+        self.root = Path(root)
+        self.order = order
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.count = 0
+        self.total_size = 0
+
+        self._key = _sort_key(order)
+        # 内存预算包含排序时的临时开销，数据块排序和写出时的峰值也不超出预算
+        self._per_record = _RECORD_OVERHEAD + (_SORT_OVERHEAD if self._key is not None else 0)
+        self._runs: List[Path] = []
+        self._reset_chunk()
+
+    def _reset_chunk(self):
+        """清空内存中的数据块"""
+        self._dirs: List[str] = []
+        self._dir_index: Dict[str, int] = {}
+        self._dir_ids = array('I')
+        self._names: List[str] = []
+        self._sizes = array('q')
+        self._mtimes = array('d')
+        self._memory = 0
+
+    @property
+    def spilled(self) -> bool:
+        """是否已溢出到磁盘"""
+        return bool(self._runs)
+
+    def add(self, directory: str, name: str, size: int, mtime: float):
+        """添加文件（directory为相对root的目录）"""
+        index = self._dir_index.get(directory)
+        if index is None:
+            index = len(self._dirs)
+            self._dir_index[directory] = index
+            self._dirs.append(directory)
+            self._memory += sys.getsizeof(directory) + 100
+
+        self._dir_ids.append(index)
+        self._names.append(name)
+        self._sizes.append(size)
+        self._mtimes.append(mtime)
+        self._memory += sys.getsizeof(name) + self._per_record
+
+        self.count += 1
+        self.total_size += size
+
+        if self._memory >= self.memory_budget:
+            self._spill()
+
+    def _chunk_order(self) -> Iterable[int]:
+        """内存数据块的排序索引（不排序时按添加顺序，不生成索引列表）"""
+        indices = range(len(self._names))
+        if self._key is None:
+            return indices
+        key, sizes, mtimes = self._key, self._sizes, self._mtimes
+        return sorted(indices, key=lambda i: key(sizes[i], mtimes[i]))
+
+    def _chunk_path(self, i: int) -> str:
+        """内存数据块中记录的相对路径"""
+        directory = self._dirs[self._dir_ids[i]]
+        return os.path.join(directory, self._names[i]) if directory else self._names[i]
+
+    def _spill(self):
+        """将当前数据块排序后写入磁盘归并段"""
+        if not self._names:
+            return
+
+        if self.spill_dir is not None:
+            Path(self.spill_dir).mkdir(parents=True, exist_ok=True)
+        fd, run_path = tempfile.mkstemp(prefix="inventory_", suffix=".run",
+                                        dir=str(self.spill_dir) if self.spill_dir else None)
+        self._runs.append(Path(run_path))
+
+        with os.fdopen(fd, 'wb', buffering=1024 * 1024) as f:
+            for i in self._chunk_order():
+                path_bytes = self._chunk_path(i).encode('utf-8', 'surrogateescape')
+                f.write(_RUN_HEADER.pack(self._sizes[i], self._mtimes[i], len(path_bytes)))
+                f.write(path_bytes)
+
+        self._reset_chunk()
+
+    def _read_run(self, run_path: Path) -> Iterator[Tuple[int, float, str]]:
+        """读取磁盘归并段"""
+        with open(run_path, 'rb', buffering=1024 * 1024) as f:
+            while True:
+                header = f.read(_RUN_HEADER.size)
+                if len(header) < _RUN_HEADER.size:
+                    return
+                size, mtime, length = _RUN_HEADER.unpack(header)
+                yield size, mtime, f.read(length).decode('utf-8', 'surrogateescape')
+
+    def _iter_chunk(self) -> Iterator[Tuple[int, float, str]]:
+        """按顺序迭代内存数据块"""
+        for i in self._chunk_order():
+            yield self._sizes[i], self._mtimes[i], self._chunk_path(i)
+
+    def __iter__(self) -> Iterator[InventoryRecord]:
+        """按清理策略顺序迭代所有文件"""
+        if self._runs:
+            # 剩余数据也写入磁盘，再做多路归并
+            self._spill()
+            streams = [self._read_run(run) for run in self._runs]
+            if self._key is None:
+                merged = (item for stream in streams for item in stream)
+            else:
+                key = self._key
+                merged = heapq.merge(*streams, key=lambda item: key(item[0], item[1]))
+        else:
+            merged = self._iter_chunk()
+
+        for size, mtime, rel_path in merged:
+            yield InventoryRecord(self.root / rel_path, size, mtime)
+
+    def close(self):
+        """删除磁盘归并段"""
+        for run in self._runs:
+            try:
+                run.unlink()
+            except OSError:
+                pass
+        self._runs = []
+        self._reset_chunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
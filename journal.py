@@ -0,0 +1,212 @@
+"""
+复制日志模块
+预写日志：复制前记录目标文件和临时文件，重命名为正式文件后记录完成。
+程序异常退出后启动时回放日志尾部，删除未完成的临时文件；
+日志记录没有落盘的临时文件（如none模式下断电）由启动时清扫备份目录删除
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable
+
+# 复制中的临时文件后缀（与正式文件位于同一目录，保证重命名是原子操作）
+PART_SUFFIX = ".part"
+
+# 日志超过此大小时只保留未完成的记录
+_MAX_JOURNAL_BYTES = 1024 * 1024
+
+
+def part_path(dest: Path) -> Path:
+    """目标文件对应的临时文件"""
+    return dest.with_name(dest.name + PART_SUFFIX)
+
+
+class CopyJournal:
+    """复制预写日志"""
+
+    def __init__(self, state_dir: Path, max_bytes: int = _MAX_JOURNAL_BYTES):
+        self.path = Path(state_dir) / "copy_journal.jsonl"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._next_id = 0
+        # 记录ID -> 未完成的开始记录
+        self._open: Dict[int, Dict] = {}
+        # 目标文件 -> 记录ID（成批同步时按目标文件结束记录）
+        self._ids: Dict[str, int] = {}
+        # 已预先写入并落盘、尚未开始复制的记录：目标文件 -> 记录ID
+        self._reserved: Dict[str, int] = {}
+
+    def _write(self, record: Dict):
+        """追加一条记录（调用方持有锁）"""
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            created = not self.path.exists()
+            self._file = open(self.path, "a", encoding="utf-8")
+            if created:
+                # 日志文件本身先落盘：启动时据此判断上次没有正常退出，需要清扫临时文件
+                from durability import fsync_dir
+                fsync_dir(self.path.parent)
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # 进程崩溃后记录仍在操作系统缓存中，不会丢失
+        self._file.flush()
+
+    def reserve(self, dests: Iterable[Path]):
+        """预先记录一组即将复制的文件并落盘（整组一次fsync）
+
+        断电后临时文件可能已经写入磁盘，开始记录必须先于临时文件落盘才能在启动时找到并删除它。
+        之后begin直接使用预先写入的记录。
+        """
+        with self._lock:
+            for dest in dests:
+                self._next_id += 1
+                record = {"op": "begin", "id": self._next_id, "tmp": str(part_path(dest)), "dest": str(dest)}
+                self._write(record)
+                self._open[self._next_id] = record
+                self._reserved[record["dest"]] = self._next_id
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+
+    def release(self, dests: Iterable[Path]):
+        """结束预先写入但没有开始复制的记录（任务被取消或未提交）"""
+        with self._lock:
+            entry_ids = [self._reserved.pop(str(dest), None) for dest in dests]
+        for entry_id in entry_ids:
+            if entry_id is not None:
+                self.end(entry_id, False)
+
+    def begin(self, tmp: Path, dest: Path) -> int:
+        """记录即将写入的文件，返回记录ID"""
+        with self._lock:
+            entry_id = self._reserved.pop(str(dest), None)
+            if entry_id is not None:
+                self._ids[str(dest)] = entry_id
+                return entry_id
+            self._next_id += 1
+            record = {"op": "begin", "id": self._next_id, "tmp": str(tmp), "dest": str(dest)}
+            self._write(record)
+            self._open[self._next_id] = record
+            self._ids[record["dest"]] = self._next_id
+            return self._next_id
+
+    def end(self, entry_id: int, completed: bool):
+        """记录文件已重命名为正式文件，或已放弃并删除临时文件"""
+        with self._lock:
+            record = self._open.pop(entry_id, None)
+            if record is not None:
+                self._ids.pop(record["dest"], None)
+            self._write({"op": "done" if completed else "abort", "id": entry_id})
+            if self._file.tell() > self.max_bytes:
+                self._compact()
+
+    def finish(self, dest: Path, completed: bool):
+        """按目标文件结束记录"""
+        with self._lock:
+            entry_id = self._ids.get(str(dest))
+        if entry_id is not None:
+            self.end(entry_id, completed)
+
+    def _compact(self):
+        """重写日志，只保留未完成的开始记录（日志大小与备份总量无关）"""
+        from durability import fsync_dir
+
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self._open.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            # 已落盘的开始记录不能因为重写而丢失
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        fsync_dir(self.path.parent)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def recover(self, logger=None, roots: Iterable[Path] = ()) -> Dict:
+        """启动时回放日志：删除未完成的临时文件，已重命名但未记录完成的文件视为完成
+
+        roots: 备份目录。日志存在说明上次没有正常退出，开始记录不一定已经落盘，
+        回放后再清扫这些目录下残留的临时文件
+        """
+        result = {"removed": 0, "finished": 0}
+        open_records: Dict[int, Dict] = {}
+        if not self.path.exists():
+            return result
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的最后一行
+                        continue
+                    if record.get("op") == "begin":
+                        open_records[record["id"]] = record
+                    else:
+                        open_records.pop(record.get("id"), None)
+        except OSError:
+            return result
+
+        for record in open_records.values():
+            tmp, dest = Path(record["tmp"]), Path(record["dest"])
+            try:
+                if tmp.exists():
+                    tmp.unlink()
+                    result["removed"] += 1
+                    if logger:
+                        logger.warning(f"删除未完成的复制文件: {tmp}")
+                elif dest.exists():
+                    result["finished"] += 1
+            except OSError as e:
+                if logger:
+                    logger.error(f"清理未完成的复制文件失败 {tmp}", e)
+
+        for root in roots:
+            result["removed"] += self._sweep(Path(root), logger)
+
+        # 回放完成后清空日志
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._open.clear()
+            self._ids.clear()
+            self._reserved.clear()
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+        return result
+
+    @staticmethod
+    def _sweep(root: Path, logger=None) -> int:
+        """删除目录下残留的临时文件，返回删除的数量"""
+        removed = 0
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if not name.endswith(PART_SUFFIX):
+                    continue
+                tmp = os.path.join(dirpath, name)
+                try:
+                    os.remove(tmp)
+                    removed += 1
+                    if logger:
+                        logger.warning(f"删除残留的复制文件: {tmp}")
+                except OSError as e:
+                    if logger:
+                        logger.error(f"清理残留的复制文件失败 {tmp}", e)
+        return removed
+
+    def close(self):
+        """关闭日志文件；没有未完成的记录时删除日志，表示正常退出"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not self._open:
+                try:
+                    self.path.unlink()
+                except OSError:
+                    pass
@@ -4,15 +4,19 @@ USB文件监控备份系统 - 完整稳定版
 支持开机自启动（无需管理员权限）
 """
 
+import time
+
+# 记录模块加载起点，用于启动耗时分析
+_IMPORT_START = time.perf_counter()
+
 import os
 import sys
-import time
 import json
-import shutil
-import psutil
+import hashlib
 import logging
 import threading
-import traceback
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple, Set
@@ -20,6 +24,43 @@ from typing import List, Dict, Optional, Tuple, Set
 # 添加当前目录到模块搜索路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from checkpoint import CheckpointStore, SessionCheckpoint, STATE_DIR_NAME
+from device import DeviceRegistry, DeviceState, DeviceStateStore
+from throttle import MB, IOLimiter, ConcurrencyLimiter, AdaptiveThrottle
+from copier import copy_file
+from cancel import CancelToken, OperationCancelled
+from inventory import FileInventory
+from catalog import StoreCatalog
+from integrity import Scrubber, hash_file_mmap
+from exclusion import ExclusionEngine
+from dirtree import DirSummaryTree, DirTreeStore
+from control import ControlServer, send_command, format_status
+from targets import BackupTarget, TargetSet
+from coldtier import ColdTier, COLD_DIR_NAME
+from profiling import SessionProfiler
+from durability import DurabilityPolicy, SyncBatch
+from instance import InstanceLock
+from watch import ChangeWatcher
+from offload import OffloadPool
+from journal import PART_SUFFIX, CopyJournal
+from scanner import ParallelScanner
+
+# 复制线程数上限
+MAX_COPY_WORKERS = 16
+
+# 备份根目录下清理和统计时跳过的内部目录
+INTERNAL_DIR_NAMES = {STATE_DIR_NAME, COLD_DIR_NAME}
+
+# 只在启动时读取的配置（重新加载配置不生效，需要重启）
+RESTART_REQUIRED_KEYS = ("backup_folder", "backup_targets", "cold_tier_enabled", "cold_tier_path",
+                         "offload_workers", "scrub_enabled", "control_enabled")
+
+class TargetFullError(Exception):
+    """所有备份目标空间不足"""
+
+class DeviceRemovedError(Exception):
+    """USB设备在处理过程中被移除"""
+
 class ConfigManager:
     """配置管理类"""
 
@@ -27,25 +68,65 @@ class ConfigManager:
         self.config_file = Path(config_file)
         self.data = self._load_config()
 
-    def _load_config(self) -> Dict:
-        """加载配置文件"""
-        default_config = {
+    def _default_config(self) -> Dict:
+        """默认配置"""
+        return {
             "keywords": [".doc", ".docx", ".pdf", ".xls", ".xlsx", ".ppt", ".pptx", ".jpg", ".png"],
             "backup_folder": "USB_Backup",
+            "backup_targets": [],
             "min_free_space_gb": 5,
             "max_file_size_mb": 100,
             "check_interval": 3,
             "exclude_folders": ["System Volume Information", "$RECYCLE.BIN", "Windows"],
+            "exclude_patterns": ["node_modules/", ".git/", "__pycache__/", "/DCIM/.thumbnails/"],
+            "exclude_hidden": False,
+            "exclude_system": False,
+            "max_scan_depth": 0,
+            "dir_summary_enabled": False,
+            "dir_summary_full_scan_every": 10,
             "cleanup_strategy": "oldest_first",
             "max_backup_age_days": 30,
+            "cold_tier_enabled": True,
+            "cold_tier_path": "",
+            "cold_tier_max_gb": 20,
+            "cold_tier_compression": "lzma",
             "log_level": "INFO",
             "enable_autostart": True,
             "hidden_mode": True,
             "usb_label_as_folder": True,
             "backup_by_date": True,
-            "max_total_size_gb": 50
+            "max_total_size_gb": 50,
+            "copy_workers": 2,
+            "io_read_limit_mbps": 0,
+            "io_write_limit_mbps": 0,
+            "adaptive_throttle": True,
+            "inventory_memory_mb": 64,
+            "scrub_enabled": True,
+            "scrub_interval_hours": 24,
+            "scrub_sample_size": 200,
+            "scrub_rate_mbps": 5,
+            "scrub_quarantine": False,
+            "control_enabled": True,
+            "profile_enabled": False,
+            "profile_sample_rate": 0.1,
+            "profile_top_n": 30,
+            "profile_tracemalloc": True,
+            "watch_enabled": True,
+            "watch_debounce_seconds": 5,
+            "watch_sweep_interval": 120,
+            "offload_workers": 0,
+            "offload_min_size_mb": 32,
+            "scan_threads": 4,
+            "durability": "batched",
+            "durability_batch_files": 64,
+            "durability_batch_ms": 500,
+            "durability_syncfs": True
         }
 
+    def _load_config(self) -> Dict:
+        """加载配置文件"""
+        default_config = self._default_config()
+
         # 如果配置文件不存在，创建默认配置
         if not self.config_file.exists():
             print(f"[INFO] 创建默认配置文件: {self.config_file}")
@@ -77,6 +158,26 @@ class ConfigManager:
             print(f"[ERROR] 加载配置文件失败，使用默认配置: {e}")
             return default_config
 
+    def reload(self) -> List[str]:
+        """重新读取配置文件，返回值有变化的键
+
+        先解析到临时对象：文件无法读取、为空或格式错误时抛出异常（OSError/ValueError），
+        保留当前配置，也不改写文件（只有启动时才用默认配置覆盖）。
+        """
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+        if not content:
+            raise ValueError("配置文件为空")
+        config = json.loads(content)
+        if not isinstance(config, dict):
+            raise ValueError("配置文件内容不是JSON对象")
+
+        for key, value in self._default_config().items():
+            config.setdefault(key, value)
+        changed = sorted(key for key in set(config) | set(self.data) if config.get(key) != self.data.get(key))
+        self.data = config
+        return changed
+
     def _save_config(self, config: Dict) -> bool:
         """保存配置文件"""
         try:
@@ -105,12 +206,15 @@ class Logger:
 
     def __init__(self, config: ConfigManager):
         self.config = config
-        self.logger = self._setup_logger()
         self.log_dir = Path("logs")
         self.log_file = self.log_dir / "usb_backup.log"
+        self.logger = self._setup_logger()
 
     def _setup_logger(self):
         """设置日志系统"""
+        # 滚动日志处理器按需导入
+        import logging.handlers
+
         # 创建日志目录
         self.log_dir.mkdir(exist_ok=True)
 
@@ -172,160 +276,197 @@ class Logger:
 class DiskManager:
     """磁盘管理类"""
 
-    def __init__(self, logger: Logger, config: ConfigManager):
+    def __init__(self, logger: Logger, config: ConfigManager, offload: Optional[OffloadPool] = None):
         self.logger = logger
         self.config = config
+        # 冷存储：过期或超出大小限制的备份先压缩归档，冷存储超出预算时才删除
+        self.cold_tier = (
+            ColdTier.from_config(config, logger, offload) if config.get("cold_tier_enabled", True) else None
+        )
 
-    def get_disk_info(self, path: str) -> Dict:
-        """获取磁盘信息"""
-        try:
-            usage = psutil.disk_usage(path)
-            return {
-                "total_gb": usage.total / (1024**3),
-                "used_gb": usage.used / (1024**3),
-                "free_gb": usage.free / (1024**3),
-                "usage_percent": usage.percent,
-                "path": path
-            }
-        except Exception as e:
-            self.logger.error(f"获取磁盘信息失败 {path}", e)
-            return {"total_gb": 0, "used_gb": 0, "free_gb": 0, "usage_percent": 100, "path": path}
-
-    def check_space(self, path: str) -> Tuple[bool, float, float]:
-        """检查磁盘空间"""
-        disk_info = self.get_disk_info(path)
-        min_space = self.config.get("min_free_space_gb", 5)
-        free_space = disk_info["free_gb"]
+    def build_inventory(self, backup_folder: Path, order: Optional[str] = "oldest_first",
+                        older_than: Optional[float] = None,
+                        cancel_token: Optional[CancelToken] = None) -> FileInventory:
+        """收集备份文件清单（紧凑存储，超出内存预算时溢出到磁盘）
 
-        has_enough = free_space >= min_space
-        return has_enough, free_space, min_space
+        older_than: 只收集修改时间早于该时间戳的文件
+        """
+        budget = int(self.config.get("inventory_memory_mb", 64) * MB)
+        inventory = FileInventory(backup_folder, order, budget, backup_folder / STATE_DIR_NAME / "tmp")
 
-    def get_backup_folder_size(self, backup_folder: Path) -> float:
-        """获取备份文件夹总大小（GB）"""
-        total_size = 0
         try:
-            for file_path in backup_folder.rglob("*"):
-                if file_path.is_file():
-                    try:
-                        total_size += file_path.stat().st_size
-                    except:
-                        continue
-            return total_size / (1024**3)
-        except Exception as e:
-            self.logger.error(f"获取备份文件夹大小失败", e)
-            return 0
+            stack = [""]
+            while stack:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
 
-    def cleanup_by_size(self, backup_folder: Path) -> Dict:
+                rel_dir = stack.pop()
+                try:
+                    with os.scandir(backup_folder / rel_dir) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    if rel_dir or entry.name not in INTERNAL_DIR_NAMES:
+                                        stack.append(os.path.join(rel_dir, entry.name))
+                                    continue
+                                if entry.name.endswith(PART_SUFFIX):
+                                    # 复制中的临时文件，不参与清理和归档
+                                    continue
+                                stat = entry.stat(follow_symlinks=False)
+                            except OSError:
+                                continue
+
+                            if older_than is not None and stat.st_mtime >= older_than:
+                                continue
+                            inventory.add(rel_dir, entry.name, stat.st_size, stat.st_mtime)
+                except OSError:
+                    continue
+        except BaseException:
+            inventory.close()
+            raise
+
+        return inventory
+
+    def _archive_to_cold_tier(self, backup_folder: Path, records, results: Dict, reason: str,
+                              cancel_token: Optional[CancelToken] = None):
+        """将文件归档到冷存储，冷存储超出预算时删除最旧的归档（释放空间按备份文件夹所在的卷计算）"""
+        archived = self.cold_tier.compact(backup_folder, records, cancel_token)
+        results["files_archived"] += archived["files_archived"]
+        results["space_freed_gb"] += archived["bytes_freed"] / (1024**3)
+        results["errors"] += archived["errors"]
+        results["removed"].extend(archived["removed"])
+        if archived["files_archived"]:
+            self.logger.info(
+                f"归档到冷存储（{reason}）: {archived['files_archived']}个文件, "
+                f"{archived['bytes_freed'] / (1024**3):.3f}GB"
+            )
+
+        budget = self.cold_tier.enforce_budget()
+        results["archives_deleted"] += budget["archives_deleted"]
+        if self.cold_tier.same_volume(backup_folder):
+            results["space_freed_gb"] += budget["bytes_freed"] / (1024**3)
+
+    def cleanup_by_size(self, backup_folder: Path, cancel_token: Optional[CancelToken] = None) -> Dict:
         """按大小清理文件"""
-        results = {"files_deleted": 0, "space_freed_gb": 0, "errors": 0}
+        results = {"files_deleted": 0, "files_archived": 0, "archives_deleted": 0, "space_freed_gb": 0, "errors": 0,
+                   "removed": []}
 
         try:
             max_size_gb = self.config.get("max_total_size_gb", 50)
-            current_size = self.get_backup_folder_size(backup_folder)
 
-            if current_size <= max_size_gb:
-                return results
-
-            # 收集文件信息
-            files_info = []
-            for file_path in backup_folder.rglob("*"):
-                if file_path.is_file():
+            # 收集文件信息（按修改时间排序，最旧优先）
+            with self.build_inventory(backup_folder, "oldest_first", cancel_token=cancel_token) as inventory:
+                # 冷存储位于备份文件夹内（默认的 .cold）时也计入总大小
+                cold = self.cold_tier
+                cold_size = cold.total_size() if cold is not None and cold.contains(backup_folder) else 0
+                current_size = (inventory.total_size + cold_size) / (1024**3)
+
+                if current_size <= max_size_gb:
+                    return results
+
+                # 先删除最旧的冷存储归档（归档中的文件比其余备份文件都旧）
+                if cold_size:
+                    trimmed = cold.enforce_budget(max(0, int(max_size_gb * 1024**3) - inventory.total_size))
+                    results["archives_deleted"] += trimmed["archives_deleted"]
+                    results["space_freed_gb"] += trimmed["bytes_freed"] / (1024**3)
+                    current_size -= trimmed["bytes_freed"] / (1024**3)
+                    if current_size <= max_size_gb:
+                        return results
+
+                if not inventory.count:
+                    return results
+
+                if inventory.spilled:
+                    self.logger.info(f"备份文件较多({inventory.count}个)，使用磁盘排序")
+
+                # 冷存储在其他卷上时归档最旧的文件直到满足大小限制；
+                # 同一卷上归档只能节省压缩掉的部分（已压缩的格式几乎为零），直接删除
+                if cold is not None and not cold.same_volume(backup_folder):
+                    selected = []
+                    for record in inventory:
+                        if cancel_token is not None:
+                            cancel_token.raise_if_cancelled()
+                        selected.append(record)
+                        current_size -= record.size / (1024**3)
+                        if current_size <= max_size_gb:
+                            break
+                    self._archive_to_cold_tier(backup_folder, selected, results, "大小限制", cancel_token)
+                    return results
+
+                # 删除文件直到满足大小限制
+                for record in inventory:
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
                     try:
-                        stat = file_path.stat()
-                        files_info.append({
-                            "path": file_path,
-                            "size": stat.st_size,
-                            "mtime": stat.st_mtime
-                        })
-                    except:
-                        continue
-
-            if not files_info:
-                return results
-
-            # 按修改时间排序（最旧优先）
-            files_info.sort(key=lambda x: x["mtime"])
+                        size_gb = record.size / (1024**3)
+                        record.path.unlink()
 
-            # 删除文件直到满足大小限制
-            for file_info in files_info:
-                try:
-                    size_gb = file_info["size"] / (1024**3)
-                    file_info["path"].unlink()
+                        results["files_deleted"] += 1
+                        results["space_freed_gb"] += size_gb
+                        results["removed"].append(record.path.relative_to(backup_folder).as_posix())
 
-                    results["files_deleted"] += 1
-                    results["space_freed_gb"] += size_gb
+                        self.logger.info(f"清理文件（大小限制）: {record.path.name} ({size_gb:.3f}GB)")
 
-                    self.logger.info(f"清理文件（大小限制）: {file_info['path'].name} ({size_gb:.3f}GB)")
+                        # 检查是否满足大小要求
+                        current_size -= size_gb
+                        if current_size <= max_size_gb:
+                            break
 
-                    # 检查是否满足大小要求
-                    current_size = self.get_backup_folder_size(backup_folder)
-                    if current_size <= max_size_gb:
-                        break
-
-                except Exception as e:
-                    results["errors"] += 1
-                    self.logger.error(f"删除文件失败 {file_info['path']}", e)
+                    except Exception as e:
+                        results["errors"] += 1
+                        self.logger.error(f"删除文件失败 {record.path}", e)
 
             return results
 
+        except OperationCancelled:
+            raise
         except Exception as e:
             self.logger.error("按大小清理失败", e)
             return results
 
-    def cleanup_by_age(self, backup_folder: Path) -> Dict:
+    def cleanup_by_age(self, backup_folder: Path, cancel_token: Optional[CancelToken] = None) -> Dict:
         """按年龄清理文件"""
-        results = {"files_deleted": 0, "space_freed_gb": 0, "errors": 0}
+        results = {"files_deleted": 0, "files_archived": 0, "archives_deleted": 0, "space_freed_gb": 0, "errors": 0,
+                   "removed": []}
 
         try:
             max_age_days = self.config.get("max_backup_age_days", 30)
             strategy = self.config.get("cleanup_strategy", "oldest_first")
 
-            # 收集文件信息
-            files_info = []
+            # 只收集超过年龄限制的文件，并按策略排序
             current_time = time.time()
-
-            for file_path in backup_folder.rglob("*"):
-                if file_path.is_file():
-                    try:
-                        stat = file_path.stat()
-                        age_days = (current_time - stat.st_mtime) / (24 * 3600)
-
-                        files_info.append({
-                            "path": file_path,
-                            "size": stat.st_size,
-                            "mtime": stat.st_mtime,
-                            "age_days": age_days
-                        })
-                    except:
-                        continue
-
-            if not files_info:
-                return results
-
-            # 按策略排序
-            if strategy == "oldest_first":
-                files_info.sort(key=lambda x: x["mtime"])  # 最旧优先
-            elif strategy == "largest_first":
-                files_info.sort(key=lambda x: x["size"], reverse=True)  # 最大优先
-
-            # 删除超过年龄限制的文件
-            for file_info in files_info:
-                if file_info["age_days"] > max_age_days:
+            cutoff = current_time - max_age_days * 24 * 3600
+
+            with self.build_inventory(backup_folder, strategy, older_than=cutoff,
+                                      cancel_token=cancel_token) as inventory:
+                # 启用冷存储时归档超过年龄限制的文件
+                if self.cold_tier is not None:
+                    self._archive_to_cold_tier(backup_folder, inventory, results, "年龄限制", cancel_token)
+                    return results
+
+                # 删除超过年龄限制的文件
+                for record in inventory:
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
                     try:
-                        size_gb = file_info["size"] / (1024**3)
-                        file_info["path"].unlink()
+                        size_gb = record.size / (1024**3)
+                        age_days = (current_time - record.mtime) / (24 * 3600)
+                        record.path.unlink()
 
                         results["files_deleted"] += 1
                         results["space_freed_gb"] += size_gb
+                        results["removed"].append(record.path.relative_to(backup_folder).as_posix())
 
-                        self.logger.info(f"清理文件（年龄限制）: {file_info['path'].name} ({file_info['age_days']:.1f}天)")
+                        self.logger.info(f"清理文件（年龄限制）: {record.path.name} ({age_days:.1f}天)")
 
                     except Exception as e:
                         results["errors"] += 1
-                        self.logger.error(f"删除文件失败 {file_info['path']}", e)
+                        self.logger.error(f"删除文件失败 {record.path}", e)
 
             return results
 
+        except OperationCancelled:
+            raise
         except Exception as e:
             self.logger.error("按年龄清理失败", e)
             return results
@@ -336,13 +477,56 @@ class USBMonitor:
     def __init__(self, logger: Logger, config: ConfigManager):
         self.logger = logger
         self.config = config
-        self.disk_manager = DiskManager(logger, config)
+        # 大文件哈希和冷存储压缩的工作进程池（offload_workers为0时不启用）
+        self.offload = OffloadPool.from_config(config)
+        self.disk_manager = DiskManager(logger, config, self.offload)
 
         # 状态变量
         self.running = False
+        # 停止令牌：所有会话令牌的父令牌，stop() 时取消
+        self.stop_token = CancelToken()
         self.backup_folder = Path(config.get("backup_folder", "USB_Backup"))
-        self.processed_drives: Set[str] = set()
+        # 挂载点 -> 已处理设备的指纹ID
+        self.processed_drives: Dict[str, str] = {}
         self.usb_thread: Optional[threading.Thread] = None
+        # 挂载点 -> 正在进行的会话令牌
+        self._session_tokens: Dict[str, CancelToken] = {}
+        self.checkpoints = CheckpointStore(self.backup_folder / STATE_DIR_NAME)
+        self.devices = DeviceRegistry(lambda mount: self.get_usb_label(mount))
+        self.device_states = DeviceStateStore(self.backup_folder / STATE_DIR_NAME)
+        self.catalog = StoreCatalog(self.backup_folder / STATE_DIR_NAME)
+        # 复制预写日志（异常退出后启动时清理未完成的临时文件）
+        self.journal = CopyJournal(self.backup_folder / STATE_DIR_NAME)
+        # 持久化策略（文件落盘后才记录为已备份）
+        self.durability = DurabilityPolicy.from_config(config)
+        self.dir_trees = DirTreeStore(self.backup_folder / STATE_DIR_NAME)
+        # 备份目标卷（backup_folder为第一个目标，状态目录始终位于backup_folder）
+        self.targets = TargetSet.from_config(config, self.backup_folder)
+        self.scrubber: Optional[Scrubber] = None
+        # 挂载点 -> 正在进行的会话信息（供控制端点查询）
+        self._sessions: Dict[str, Dict] = {}
+        self.control: Optional[ControlServer] = None
+        self.started_at = time.time()
+        self._maintenance: Optional[threading.Thread] = None
+        self.profiler = SessionProfiler.from_config(config, logger)
+        # 挂载点 -> 设备保持插入期间的变化监视
+        self._watchers: Dict[str, ChangeWatcher] = {}
+        # 会话正在使用的设备状态（设备ID -> 状态），后台隔离文件时与会话的读写串行
+        self._state_lock = threading.Lock()
+        self._active_states: Dict[str, DeviceState] = {}
+
+        # I/O限速与复制并发
+        copy_workers = max(1, min(int(config.get("copy_workers", 2)), MAX_COPY_WORKERS))
+        read_bps = config.get("io_read_limit_mbps", 0) * MB
+        write_bps = config.get("io_write_limit_mbps", 0) * MB
+        self.io_limiter = IOLimiter(read_bps, write_bps)
+        self.copy_concurrency = ConcurrencyLimiter(copy_workers)
+        self.throttle = AdaptiveThrottle(
+            self.io_limiter, self.copy_concurrency,
+            read_bps=read_bps, write_bps=write_bps, max_workers=copy_workers
+        )
+        self.throttle.enabled = config.get("adaptive_throttle", True)
+        self._copy_executor = ThreadPoolExecutor(max_workers=MAX_COPY_WORKERS, thread_name_prefix="CopyWorker")
 
         # 初始化
         self._setup_backup_folder()
@@ -359,6 +543,10 @@ class USBMonitor:
                 readme_path.write_text(readme_content, encoding='utf-8')
 
             self.logger.info(f"备份文件夹: {self.backup_folder.absolute()}")
+            if len(self.targets.targets) > 1:
+                self.targets.prepare(self.logger)
+                for target in self.targets.targets[1:]:
+                    self.logger.info(f"备份目标: {target.path} (权重 {target.weight})")
 
         except Exception as e:
             self.logger.error("创建备份文件夹失败", e)
@@ -404,10 +592,11 @@ class USBMonitor:
         usb_drives = []
 
         try:
-            # 方法1: 使用psutil
+            # 方法1: 使用psutil（首次扫描时才加载）
+            import psutil
             for partition in psutil.disk_partitions():
                 if 'removable' in partition.opts.lower():
-                    usb_drives.append(partition.device)
+                    usb_drives.append(partition.mountpoint)
 
             # 方法2: Windows API (备用)
             if not usb_drives and sys.platform == "win32":
@@ -458,6 +647,9 @@ class USBMonitor:
             # 检查文件扩展名/关键词
             file_ext = file_path.suffix.lower()
             file_name = file_path.name.lower()
+            if file_name.endswith(PART_SUFFIX):
+                # 与复制中的临时文件同名，备份后会在异常退出后被当作残留文件删除
+                return False, "未完成的临时文件"
             keywords = [k.lower() for k in self.config.get("keywords", [])]
 
             for keyword in keywords:
@@ -471,147 +663,945 @@ class USBMonitor:
         except Exception as e:
             return False, f"检查文件失败: {e}"
 
-    def copy_usb_files(self, usb_path: str):
-        """复制USB文件"""
-        usb_label = self.get_usb_label(usb_path)
+    def copy_usb_files(self, usb_path: str, scan_snapshot: Optional[Dict[str, Tuple[int, int]]] = None):
+        """复制USB文件
+
+        scan_snapshot不为None时收集扫描到的文件的(大小, 修改时间)，作为变化监视的初始快照
+        """
+        fingerprint = self.devices.identify(usb_path)
+        usb_label = fingerprint.label
 
-        self.logger.info(f"开始处理USB设备: {usb_path} (标签: {usb_label})")
+        self.logger.info(f"开始处理USB设备: {usb_path} (标签: {usb_label}, 设备ID: {fingerprint.device_id})")
 
+        # 会话令牌：停止系统或设备移除时取消
+        token = self.stop_token.child()
+        self._session_tokens[usb_path] = token
+        profile = self.profiler.begin(fingerprint.short_id)
+        # 整个会话使用同一持久化策略（会话进行中重新加载配置，从下一个会话开始生效）
+        durability = self.durability
+
+        checkpoint = None
+        device_state = None
+        target = None
+        scanner = None
+        batch = None
         try:
-            # 检查磁盘空间
-            has_space, free_space, min_space = self.disk_manager.check_space(str(self.backup_folder))
+            # 加载未完成的会话，或创建新会话
+            device_state = self._open_device_state(fingerprint)
+            device_key = fingerprint.device_id
+            checkpoint = self.checkpoints.load(device_key)
+            resumed = checkpoint is not None
+            if checkpoint:
+                self.logger.info(
+                    f"继续未完成的会话: {usb_label} "
+                    f"(开始于 {checkpoint.started_time}, 待扫描目录 {len(checkpoint.pending_dirs)}个)"
+                )
+            else:
+                checkpoint = SessionCheckpoint(device_key, datetime.now().strftime("%Y%m%d"))
 
-            if not has_space:
-                self.logger.warning(f"磁盘空间不足，开始清理: 可用{free_space:.1f}GB / 需要{min_space}GB")
+            # 选择备份目标：继续的会话优先使用原目标，否则选择余量最大、负载最低的目标
+            target = self.targets.get(checkpoint.target)
+            if target is None or target.headroom() <= 0:
+                target = self.targets.choose()
 
-                # 先按大小清理
-                size_result = self.disk_manager.cleanup_by_size(self.backup_folder)
-                if size_result["files_deleted"] > 0:
-                    self.logger.info(f"按大小清理完成: 删除{size_result['files_deleted']}个文件")
+            if target is None:
+                self.logger.warning("所有备份目标空间不足，开始清理")
+                cleanup_start = time.perf_counter()
+                for candidate in self.targets.targets:
+                    self._cleanup_target(candidate, token)
 
-                # 再按年龄清理
-                age_result = self.disk_manager.cleanup_by_age(self.backup_folder)
-                if age_result["files_deleted"] > 0:
-                    self.logger.info(f"按年龄清理完成: 删除{age_result['files_deleted']}个文件")
+                self.profiler.add_span("空间清理", time.perf_counter() - cleanup_start)
+                target = self.targets.choose()
 
-            # 再次检查空间
-            has_space, free_space, min_space = self.disk_manager.check_space(str(self.backup_folder))
-            if not has_space:
+            if target is None:
                 self.logger.error("清理后空间仍然不足，跳过此USB设备")
                 return
 
-            # 统计信息
-            files_copied = 0
-            files_skipped = 0
-            total_size = 0
+            checkpoint.target = target.key
+            self.targets.acquire(target)
+            self.logger.info(f"备份目标: {target.path}")
+
+            session = {
+                "label": usb_label, "device_id": device_key, "started": time.time(),
+                "checkpoint": checkpoint, "queued": 0, "target": target.key
+            }
+            self._sessions[usb_path] = session
 
             # 遍历USB文件
             usb_root = Path(usb_path)
-            exclude_folders = self.config.get("exclude_folders", [])
+            exclusions = ExclusionEngine.from_config(self.config)
+            stats = checkpoint.stats
+
+            # 上次会话的目录摘要树（默认关闭）。目录修改时间未变化时跳过其中文件的检查，
+            # 原地修改的文件不会改变目录修改时间，要到下一次完整扫描才会备份；
+            # 只适合文件只增不改的设备（如相机存储卡），由dir_summary_full_scan_every兜底
+            selection_digest = self._selection_digest()
+            previous_tree = DirSummaryTree(selection_digest)
+            full_scan_every = self.config.get("dir_summary_full_scan_every", 10)
+            if self.config.get("dir_summary_enabled", False) and not (
+                    full_scan_every and device_state.stats["sessions"] % full_scan_every == full_scan_every - 1):
+                previous_tree = self.dir_trees.load(device_key, selection_digest)
+            tree = DirSummaryTree(selection_digest)
+            failed_dirs: Set[str] = set()
+            # batched模式下整个会话共用一个同步批次，跨目录累积到文件数或时间上限再落盘。
+            # 目录可能先于其中的文件记为完成，因此保存断点前先同步批次
+            batch = durability.batch(self.journal)
+
+            def save_progress():
+                """写入断点前同步批次，并保存清单和备份目录（断点中已完成目录的文件都已落盘并记录）"""
+                self._sync_batch(batch)
+                self._append_device_state(device_state)
+                self.catalog.flush(device_key)
+
+            # 续传的会话：设备拔出期间，中断前已完成的目录中可能新增或删除了文件，
+            # 只重新检查修改时间有变化的目录（其中未变化的子目录仍然跳过）
+            recheck: Set[str] = set()
+            if resumed:
+                recheck = checkpoint.changed_dirs(usb_root)
+                checkpoint.recheck(recheck)
+                if recheck:
+                    self.logger.info(f"续传会话重新检查中断后有变化的目录: {len(recheck)}个")
+
+            # 扫描线程按会话的处理顺序提前列出目录（使用独立的排除规则实例，不影响统计）
+            scanner = ParallelScanner(
+                usb_root, ExclusionEngine.from_config(self.config), previous_tree,
+                threads=self.config.get("scan_threads", 4), skip=set(checkpoint.completed or ()) - recheck,
+                gate=self.io_limiter.gate, cancel_token=token
+            )
+            scanner.start(checkpoint.pending_dirs)
+
+            while checkpoint.pending_dirs:
+                token.raise_if_cancelled()
+                self.io_limiter.gate.wait(token)
+                rel_dir = checkpoint.pending_dirs[-1]
+                current_dir = usb_root / rel_dir
+                if checkpoint.completed and rel_dir in checkpoint.completed and rel_dir not in recheck:
+                    # 重新检查的目录中已完成且未变化的子目录
+                    checkpoint.complete_dir(rel_dir, [], checkpoint.completed[rel_dir])
+                    continue
+                recheck.discard(rel_dir)
+
+                with self.profiler.span("目录扫描"):
+                    listing = scanner.get(rel_dir, token)
+
+                # 目录修改时间未变化时沿用上次记录的子目录，不再列出目录和检查其中的文件
+                dir_mtime = listing.mtime
+                previous_subdirs = previous_tree.lookup(rel_dir, dir_mtime) if dir_mtime is not None else None
+                if previous_subdirs is not None:
+                    tree.copy_entry(rel_dir, previous_tree)
+                    stats["dirs_unchanged"] += 1
+                    checkpoint.complete_dir(rel_dir, [f"{rel_dir}/{n}" if rel_dir else n for n in previous_subdirs],
+                                            dir_mtime)
+                    continue
+
+                if listing.error is not None:
+                    if not self._device_present(usb_path):
+                        raise DeviceRemovedError(usb_path) from listing.error
+                    self.logger.warning(f"无法读取目录 {current_dir}: {listing.error}")
+                    checkpoint.complete_dir(rel_dir, [])
+                    continue
+                entries = listing.entries
+
+                subdirs = []
+                selected = []
+                jobs = []
+                reserved: Set[Path] = set()
+                depth = rel_dir.count("/") + 1 if rel_dir else 0
+                filter_start = time.perf_counter()
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
 
-            for root, dirs, files in os.walk(usb_path):
-                # 排除特定文件夹
-                dirs[:] = [d for d in dirs if d not in exclude_folders]
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
 
-                for file in files:
-                    src_file = Path(root) / file
+                    if is_dir:
+                        # 排除规则匹配的目录不加入队列，整棵子树不会被列出
+                        if not exclusions.match(rel_path, entry.name, True, depth + 1, entry):
+                            subdirs.append(rel_path)
+                        continue
 
-                    # 检查文件
-                    should_copy, reason = self.should_copy_file(src_file)
+                    if rel_path in checkpoint.done_files:
+                        continue
 
-                    if not should_copy:
-                        files_skipped += 1
-                        self.logger.debug(f"跳过文件: {file} - {reason}")
+                    rule = exclusions.match(rel_path, entry.name, False, depth, entry)
+                    if rule:
+                        stats["files_skipped"] += 1
+                        self.logger.debug(f"跳过文件: {entry.name} - 排除规则 {rule}")
                         continue
 
-                    # 生成目标路径
-                    if self.config.get("backup_by_date", True):
-                        date_folder = datetime.now().strftime("%Y%m%d")
-                        rel_path = src_file.relative_to(usb_root)
-                        dest_file = self.backup_folder / usb_label / date_folder / rel_path
-                    else:
-                        rel_path = src_file.relative_to(usb_root)
-                        dest_file = self.backup_folder / usb_label / rel_path
-
-                    # 处理文件名冲突
-                    counter = 1
-                    original_dest = dest_file
-                    while dest_file.exists():
-                        stem = original_dest.stem
-                        suffix = original_dest.suffix
-                        dest_file = original_dest.parent / f"{stem}_{counter}{suffix}"
-                        counter += 1
-
-                    # 复制文件
+                    src_file = Path(entry.path)
+
+                    # 检查文件（自上次备份后未修改的文件直接跳过）
                     try:
-                        dest_file.parent.mkdir(parents=True, exist_ok=True)
-                        shutil.copy2(src_file, dest_file)
+                        src_stat = entry.stat()
+                    except OSError:
+                        src_stat = None
+                    if scan_snapshot is not None and src_stat is not None:
+                        scan_snapshot[rel_path] = (src_stat.st_size, src_stat.st_mtime_ns)
+
+                    if src_stat is not None and device_state.is_unchanged(rel_path, src_stat):
+                        should_copy, reason = False, "未修改"
+                        stats["files_unchanged"] += 1
+                    else:
+                        should_copy, reason = self.should_copy_file(src_file)
+                        if not should_copy:
+                            stats["files_skipped"] += 1
 
-                        files_copied += 1
-                        file_size = src_file.stat().st_size
-                        total_size += file_size
+                    # 跳过的文件不记为已处理：设备在筛选过程中被拔出时读取失败的文件也会被跳过，
+                    # 续传时重新判断
+                    if not should_copy:
+                        self.logger.debug(f"跳过文件: {entry.name} - {reason}")
+                        continue
 
-                        self.logger.info(f"已备份: {file} -> {dest_file.relative_to(self.backup_folder)}")
+                    adopted = None
+                    if resumed and src_stat is not None:
+                        adopted = self._find_unrecorded_copy(target.path, device_state.folder,
+                                                             checkpoint.date_folder, rel_path, src_file, src_stat)
+                    if adopted is not None:
+                        dest_file, digest = adopted
+                        stats["files_copied"] += 1
+                        stats["total_size"] += src_stat.st_size
+                        device_state.record(rel_path, src_stat, digest)
+                        dest_rel = dest_file.relative_to(target.path).as_posix()
+                        self.catalog.record(device_key, dest_rel, src_stat.st_size, digest, rel_path, target.key)
+                        self.logger.info(f"已备份（中断前已复制）: {entry.name} -> {dest_rel}")
+                        checkpoint.mark_file_done(rel_path)
+                        continue
 
-                    except Exception as e:
-                        files_skipped += 1
-                        self.logger.error(f"复制文件失败 {file}", e)
+                    selected.append((rel_path, src_file, src_stat))
+
+                self.profiler.add_span("文件筛选", time.perf_counter() - filter_start)
+
+                # 当前目标余量不足以容纳本目录的文件时，溢出到其他目标
+                batch_size = sum(src_stat.st_size for _, _, src_stat in selected if src_stat is not None)
+                if selected and target.headroom() <= batch_size:
+                    target = self._switch_target(target, batch_size, checkpoint, session)
+
+                for rel_path, src_file, src_stat in selected:
+                    dest_file = self._get_dest_path(target.path, device_state.folder, checkpoint.date_folder,
+                                                    rel_path, reserved)
+                    reserved.add(dest_file)
+                    jobs.append((rel_path, src_file, src_stat, dest_file))
+
+                # 批次中的文件可能在处理后面的目录时才落盘并回调，绑定所属的目录和目标
+                def on_copied(job, result: Optional[Tuple[int, str]], error: Optional[Exception],
+                              rel_dir: str = rel_dir, target_root: Path = target.path, target_key: str = target.key):
+                    rel_path, src_file, src_stat, dest_file = job
+                    session["queued"] -= 1
+                    if error is None:
+                        record_start = time.perf_counter()
+                        copied, digest = result
+                        stats["files_copied"] += 1
+                        stats["total_size"] += copied
+                        if src_stat is not None:
+                            device_state.record(rel_path, src_stat, digest)
+
+                        dest_rel = dest_file.relative_to(target_root)
+                        self.catalog.record(device_key, dest_rel.as_posix(), copied, digest, rel_path, target_key)
+                        self.logger.info(f"已备份: {src_file.name} -> {dest_rel}")
+                        self.profiler.add_span("结果记录", time.perf_counter() - record_start)
+                    else:
+                        if isinstance(error, OperationCancelled):
+                            raise error
+                        if not self._device_present(usb_path):
+                            raise DeviceRemovedError(usb_path) from error
+                        stats["files_skipped"] += 1
+                        failed_dirs.add(rel_dir)
+                        self.logger.error(f"复制文件失败 {src_file.name}", error)
+
+                    checkpoint.mark_file_done(rel_path)
+
+                # 并发复制当前目录中的文件
+                session["queued"] += len(jobs)
+                self._run_copy_jobs(jobs, on_copied, token, durability, batch,
+                                    progress=lambda: self.checkpoints.maybe_save(checkpoint, save_progress))
+                if batch is not None and batch.due:
+                    self._sync_batch(batch)
+
+                # 设备在筛选过程中被拔出时，读取失败的文件会被当作跳过，目录不能记为完成
+                # （提前列出的目录在拔出后仍可取用，这里是唯一能发现的地方）
+                if not self._device_present(usb_path):
+                    raise DeviceRemovedError(usb_path)
+
+                # 有文件复制失败的目录下次必须重新列出
+                tree.record(
+                    rel_dir, None if rel_dir in failed_dirs else dir_mtime, len(entries),
+                    [sub.rsplit("/", 1)[-1] for sub in subdirs]
+                )
+                checkpoint.complete_dir(rel_dir, subdirs, dir_mtime)
+                self.checkpoints.maybe_save(checkpoint, save_progress)
+
+            # 同步剩余的文件（会话完成前所有复制的文件必须已落盘）
+            self._sync_batch(batch)
+
+            # 记录排除规则统计
+            for rule, dirs_pruned, files_excluded in exclusions.summary():
+                self.logger.info(f"排除规则 {rule}: 剪除目录{dirs_pruned}个, 排除文件{files_excluded}个")
+
+            finish_start = time.perf_counter()
+
+            # 目录记录之后才同步失败的文件所在目录，下次必须重新列出
+            for rel_dir in failed_dirs:
+                tree.invalidate(rel_dir)
+
+            # 保存目录摘要树（续传的会话沿用中断前已完成目录的旧摘要）
+            if resumed:
+                for rel_dir, entry in previous_tree.entries.items():
+                    tree.entries.setdefault(rel_dir, entry)
+            if not resumed and previous_tree.root_hash and tree.compute_hashes() == previous_tree.root_hash:
+                self.logger.info(f"设备目录结构未变化: {usb_label}")
+            elif not tree.root_hash:
+                tree.compute_hashes()
+            self.dir_trees.save(device_key, tree)
+
+            # 会话完成，更新设备状态并删除断点
+            device_state.stats["sessions"] += 1
+            device_state.stats["files_copied"] += stats["files_copied"]
+            device_state.stats["total_size"] += stats["total_size"]
+            device_state.stats["last_seen"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self._save_device_state(device_state)
+            self.catalog.flush(device_key)
+            self.checkpoints.discard(device_key)
+            self.profiler.add_span("会话收尾", time.perf_counter() - finish_start)
 
             # 记录结果
-            if files_copied > 0:
-                size_mb = total_size / (1024 * 1024)
+            if stats["files_copied"] > 0:
+                size_mb = stats["total_size"] / (1024 * 1024)
                 self.logger.info(
                     f"USB处理完成: {usb_path}\n"
-                    f"  复制文件: {files_copied}个\n"
-                    f"  跳过文件: {files_skipped}个\n"
+                    f"  复制文件: {stats['files_copied']}个\n"
+                    f"  跳过文件: {stats['files_skipped']}个\n"
+                    f"  未修改文件: {stats['files_unchanged']}个\n"
+                    f"  未变化目录: {stats['dirs_unchanged']}个\n"
                     f"  总大小: {size_mb:.1f}MB"
                 )
             else:
                 self.logger.info(f"USB处理完成: {usb_path} - 未找到符合条件的文件")
 
+        except DeviceRemovedError:
+            self._save_session(device_state, checkpoint, batch)
+            self.logger.warning(f"USB设备已移除，会话进度已保存: {usb_path}")
+        except TargetFullError:
+            self._save_session(device_state, checkpoint, batch)
+            self.logger.error(f"所有备份目标空间不足，会话进度已保存: {usb_path}")
+        except OperationCancelled:
+            self._save_session(device_state, checkpoint, batch)
+            self.logger.warning(f"USB处理已取消，会话进度已保存: {usb_path}")
         except Exception as e:
+            self._save_session(device_state, checkpoint, batch)
             self.logger.error(f"处理USB设备失败 {usb_path}", e)
+        finally:
+            if batch is not None:
+                # 会话中止时未落盘的文件没有记录为已备份，删除临时文件，续传时重新复制
+                batch.discard()
+            if scanner is not None:
+                scanner.stop()
+            if device_state is not None:
+                self._close_device_state(device_state)
+            self._session_tokens.pop(usb_path, None)
+            self._sessions.pop(usb_path, None)
+            if target is not None:
+                self.targets.release(target)
+            self.profiler.end(profile)
+
+    def _cleanup_target(self, target: BackupTarget, token: CancelToken):
+        """清理一个备份目标（先按大小，再按年龄），并从备份目录中移除已清理或归档的文件"""
+        removed = []
+
+        size_result = self.disk_manager.cleanup_by_size(target.path, token)
+        removed.extend(size_result["removed"])
+        if size_result["files_deleted"] > 0 or size_result["files_archived"] > 0:
+            self.logger.info(
+                f"按大小清理完成: {target.path} 删除{size_result['files_deleted']}个文件, "
+                f"归档{size_result['files_archived']}个文件"
+            )
+
+        age_result = self.disk_manager.cleanup_by_age(target.path, token)
+        removed.extend(age_result["removed"])
+        if age_result["files_deleted"] > 0 or age_result["files_archived"] > 0:
+            self.logger.info(
+                f"按年龄清理完成: {target.path} 删除{age_result['files_deleted']}个文件, "
+                f"归档{age_result['files_archived']}个文件"
+            )
+
+        if removed:
+            self.catalog.flush()
+            dropped = self.catalog.compact(((target.key, path) for path in removed), self.targets.targets[0].key)
+            self.logger.info(f"备份目录已压缩: 移除{dropped}条记录")
+
+    def _selection_digest(self) -> str:
+        """影响文件选择的配置摘要（变化后目录摘要树失效）"""
+        keys = ("keywords", "max_file_size_mb", "exclude_folders", "exclude_patterns",
+                "exclude_hidden", "exclude_system", "max_scan_depth")
+        selection = {key: self.config.get(key) for key in keys}
+        return hashlib.sha1(json.dumps(selection, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _switch_target(self, current: BackupTarget, needed: int, checkpoint: SessionCheckpoint,
+                       session: Dict) -> BackupTarget:
+        """当前目标空间不足时切换到其他目标（同一设备的文件可分布在多个目标上）"""
+        new_target = self.targets.choose(needed, exclude=[current])
+        if new_target is None:
+            if current.headroom() > 0:
+                # 没有更合适的目标，继续使用当前目标
+                return current
+            raise TargetFullError(current.key)
+
+        self.targets.release(current)
+        self.targets.acquire(new_target)
+        checkpoint.target = new_target.key
+        session["target"] = new_target.key
+        self.logger.warning(f"备份目标空间不足，溢出到: {new_target.path}")
+        return new_target
+
+    def _save_session(self, device_state, checkpoint: Optional[SessionCheckpoint],
+                      batch: Optional[SyncBatch] = None):
+        """中断时保存会话进度、设备状态和备份目录
+
+        批次中还有未落盘的文件时，已完成的目录中可能有文件没有记录，保留上次保存的断点
+        （保存前批次已同步，其中已完成目录的文件都已记录），之后处理的目录续传时重新检查，已记录的文件按清单跳过。
+        """
+        if checkpoint is None:
+            return
+        self._save_device_state(device_state)
+        self.catalog.flush(checkpoint.device_key)
+        if not batch:
+            self.checkpoints.save(checkpoint)
+
+    def _run_copy_jobs(self, jobs: List[tuple], on_result, token: CancelToken, durability: DurabilityPolicy,
+                       batch: Optional[SyncBatch] = None, progress=None):
+        """并发执行复制任务，结果在当前线程中按完成顺序回调，每个任务完成后调用progress（保存断点）
+
+        durability为会话开始时的持久化策略，所有任务使用同一策略（重新加载配置从下一个会话开始生效）。
+        batched持久化模式下复制完成的文件加入调用方的同步批次，批次达到上限时整批落盘后才回调；
+        批次可跨越多组任务，剩余的文件由调用方用_sync_batch同步，中止时由调用方丢弃。
+        """
+        if not jobs:
+            return
 
-    def monitor_loop(self):
-        """监控循环"""
-        self.logger.info("开始监控USB设备...")
+        futures = {}
+        if self.journal is not None and durability.mode != "none":
+            # 整组文件的预写日志一次写入并落盘，复制开始时不再逐个同步
+            self.journal.reserve(job[3] for job in jobs)
+
+        def report(future):
+            job = futures.pop(future)
+            error = future.exception()
+            if batch is not None and error is None:
+                batch.add(job[3], (on_result, job, future.result()))
+                if batch.due:
+                    self._sync_batch(batch)
+            else:
+                on_result(job, None if error else future.result(), error)
+            if progress is not None:
+                progress()
 
-        check_interval = self.config.get("check_interval", 3)
-        status_interval = 300  # 每5分钟记录一次状态
+        try:
+            for job in jobs:
+                # 获取并发槽位（由自适应限速动态调整）
+                self.copy_concurrency.acquire(token)
+                try:
+                    futures[self._copy_executor.submit(self._copy_job, job, token, durability.mode)] = job
+                except Exception:
+                    self.copy_concurrency.release()
+                    raise
+
+                for future in [f for f in futures if f.done()]:
+                    report(future)
+
+            for future in as_completed(list(futures)):
+                report(future)
+        except BaseException:
+            # 提前退出时（如设备移除）取消会话，正在复制的文件在下一个数据块处停止并删除
+            token.cancel("会话中止")
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+            wait(list(futures))
+            if batch is not None:
+                # 已复制完但未回调的文件交给批次，由调用方丢弃
+                for future in futures:
+                    if not future.cancelled() and future.exception() is None:
+                        batch.add(futures[future][3], None)
+            if self.journal is not None:
+                # 没有开始复制的文件（被取消或未提交）结束预写日志记录
+                self.journal.release(job[3] for job in jobs)
+
+    def _sync_batch(self, batch: Optional[SyncBatch]):
+        """同步批次中的文件并回调结果"""
+        if not batch:
+            return
+        with self.profiler.span("文件落盘"):
+            synced = batch.sync()
+        # 已提交的文件全部回调记录后再抛出第一个错误（如设备移除），避免正式文件没有记录
+        raised = None
+        for (on_result, job, result), error in synced:
+            try:
+                on_result(job, None if error else result, error)
+            except Exception as e:
+                raised = raised or e
+        if raised is not None:
+            raise raised
 
-        last_status_time = time.time()
+    def _copy_job(self, job: tuple, token: CancelToken, durability: str) -> Tuple[int, str]:
+        """复制单个文件（在复制线程中执行，durability为会话的持久化方式）"""
+        rel_path, src_file, src_stat, dest_file = job
+        try:
+            token.raise_if_cancelled()
+            dest_file.parent.mkdir(parents=True, exist_ok=True)
+            with self.profiler.span("文件复制"):
+                return copy_file(src_file, dest_file, self.io_limiter, token, offload=self.offload,
+                                 journal=self.journal, durability=durability)
+        finally:
+            self.copy_concurrency.release()
+
+    def set_io_limits(self, read_mbps: Optional[float] = None, write_mbps: Optional[float] = None,
+                      copy_workers: Optional[int] = None, adaptive: Optional[bool] = None):
+        """运行时调整I/O限速、复制并发数和自适应模式（无需重启会话）"""
+        if copy_workers is not None:
+            copy_workers = max(1, min(int(copy_workers), MAX_COPY_WORKERS))
+
+        self.throttle.configure(
+            read_bps=read_mbps * MB if read_mbps is not None else None,
+            write_bps=write_mbps * MB if write_mbps is not None else None,
+            max_workers=copy_workers,
+            enabled=adaptive
+        )
 
-        while self.running:
-            try:
-                current_time = time.time()
+        if adaptive is True and self.running:
+            self.throttle.start()
+        elif adaptive is False:
+            self.throttle.stop()
+
+        self.logger.info(
+            f"I/O限速已更新: 读{self.io_limiter.read_bucket.rate / MB:.1f}MB/s, "
+            f"写{self.io_limiter.write_bucket.rate / MB:.1f}MB/s (0为不限), "
+            f"复制并发{self.copy_concurrency.limit}, 自适应={'开' if self.throttle.enabled else '关'}"
+        )
+
+    def get_status(self) -> Dict:
+        """运行状态（活动会话、队列、进度和吞吐量）"""
+        now = time.time()
+        uptime = now - self.started_at
+        sessions = []
+        for mount, session in list(self._sessions.items()):
+            checkpoint = session["checkpoint"]
+            elapsed = max(now - session["started"], 0.001)
+            sessions.append({
+                "mount": mount,
+                "label": session["label"],
+                "device_id": session["device_id"],
+                "elapsed": elapsed,
+                "queued": max(0, session["queued"]),
+                "pending_dirs": len(checkpoint.pending_dirs),
+                "files_copied": checkpoint.stats["files_copied"],
+                "files_skipped": checkpoint.stats["files_skipped"],
+                "total_size": checkpoint.stats["total_size"],
+                "throughput_mbps": checkpoint.stats["total_size"] / elapsed / MB,
+                "target": session["target"],
+            })
+
+        return {
+            "uptime": uptime,
+            "paused": self.io_limiter.gate.paused,
+            "copy_workers": self.copy_concurrency.limit,
+            "active_copies": self.copy_concurrency.active,
+            "adaptive": self.throttle.enabled,
+            "read_limit_mbps": self.io_limiter.read_bucket.rate / MB,
+            "write_limit_mbps": self.io_limiter.write_bucket.rate / MB,
+            "bytes_written": self.io_limiter.bytes_written,
+            "throughput_mbps": self.io_limiter.bytes_written / max(uptime, 0.001) / MB,
+            "maintenance": self._maintenance.name if self._maintenance and self._maintenance.is_alive() else "",
+            "sessions": sessions,
+            "targets": self.targets.summary(),
+            "watching": [
+                {"mount": mount, "mode": watcher.mode, "pending": watcher.pending}
+                for mount, watcher in list(self._watchers.items())
+            ],
+        }
 
-                # 获取当前USB设备
-                current_drives = set(self.get_usb_drives())
+    def handle_control(self, command: str, args: Dict) -> Dict:
+        """处理控制端点命令"""
+        if command == "status":
+            return {"ok": True, "status": self.get_status()}
 
-                # 检查新插入的设备
-                new_drives = current_drives - self.processed_drives
+        if command == "pause":
+            self.io_limiter.gate.pause()
+            self.logger.info("备份会话已暂停（控制命令）")
+            return {"ok": True, "message": "已暂停"}
 
-                for drive in new_drives:
-                    self.copy_usb_files(drive)
-                    self.processed_drives.add(drive)
+        if command == "resume":
+            self.io_limiter.gate.resume()
+            self.logger.info("备份会话已恢复（控制命令）")
+            return {"ok": True, "message": "已恢复"}
 
-                # 更新已处理列表（移除已拔出的设备）
-                self.processed_drives = self.processed_drives.intersection(current_drives)
+        if command == "workers":
+            self.set_io_limits(copy_workers=args.get("count"))
+            return {"ok": True, "message": f"复制并发: {self.copy_concurrency.limit}"}
+
+        if command == "limits":
+            self.set_io_limits(args.get("read_mbps"), args.get("write_mbps"), adaptive=args.get("adaptive"))
+            return {
+                "ok": True,
+                "message": f"读{self.io_limiter.read_bucket.rate / MB:.1f}MB/s, "
+                           f"写{self.io_limiter.write_bucket.rate / MB:.1f}MB/s"
+            }
 
-                # 定期记录状态
-                if current_time - last_status_time >= status_interval:
-                    self.logger.info(f"监控状态: 已处理设备={len(self.processed_drives)}")
-                    last_status_time = current_time
+        if command == "maintenance":
+            return self.run_maintenance(args.get("task", ""))
 
-                # 等待
-                time.sleep(check_interval)
+        if command == "reload":
+            # 关键词、排除规则等在使用时读取配置，下一个会话生效；限速和并发数立即生效
+            try:
+                changed = self.config.reload()
+            except (OSError, ValueError) as e:
+                self.logger.error("重新加载配置失败，继续使用当前配置", e)
+                return {"ok": False, "error": f"配置文件无效，继续使用当前配置: {e}"}
+            self.set_io_limits(
+                self.config.get("io_read_limit_mbps", 0), self.config.get("io_write_limit_mbps", 0),
+                copy_workers=self.config.get("copy_workers", 2),
+                adaptive=self.config.get("adaptive_throttle", True)
+            )
+            # 进行中的会话继续使用开始时的持久化策略
+            self.durability = DurabilityPolicy.from_config(self.config)
+            message = "配置已重新加载"
+            restart = [key for key in RESTART_REQUIRED_KEYS if key in changed]
+            if restart:
+                message += f"；{', '.join(restart)} 的修改需要重启后生效"
+            self.logger.info(f"{message}（控制命令）")
+            return {"ok": True, "message": message, "changed": changed}
+
+        if command == "stop":
+            # 主线程等待到停止令牌后执行stop()，本次回复仍会发出
+            self.logger.info("收到停止命令（控制命令）")
+            self.stop_token.cancel("控制命令停止")
+            return {"ok": True, "message": "备份程序正在停止"}
+
+        if command == "profile":
+            self.profiler.configure(args.get("enabled"), args.get("sample_rate"))
+            self.logger.info(
+                f"会话性能分析: {'开' if self.profiler.enabled else '关'}, 采样率{self.profiler.sample_rate}"
+            )
+            return {
+                "ok": True,
+                "message": f"性能分析{'已开启' if self.profiler.enabled else '已关闭'}"
+                           f"（采样率{self.profiler.sample_rate}，下一个会话生效）"
+            }
 
-            except KeyboardInterrupt:
-                self.logger.info("收到停止信号")
-                break
+        return {"ok": False, "error": f"未知命令: {command}"}
+
+    def run_maintenance(self, task: str) -> Dict:
+        """在后台线程中执行维护任务（同一时间只运行一个）"""
+        if self._maintenance and self._maintenance.is_alive():
+            return {"ok": False, "error": f"维护任务正在运行: {self._maintenance.name}"}
+
+        if task == "cleanup":
+            def target():
+                token = self.stop_token.child()
+                for target in self.targets.targets:
+                    self._cleanup_target(target, token)
+        elif task == "scrub":
+            if self.scrubber is None:
+                return {"ok": False, "error": "完整性校验未启用"}
+            target = self.scrubber.scrub_once
+        elif task == "rescan":
+            # 忘记已处理的设备，下一轮检查时重新备份（未修改的文件仍会跳过）
+            def target():
+                self.processed_drives = {}
+        else:
+            return {"ok": False, "error": f"未知维护任务: {task}"}
+
+        def run():
+            self.logger.info(f"开始维护任务: {task}")
+            try:
+                target()
+                self.logger.info(f"维护任务完成: {task}")
+            except OperationCancelled:
+                self.logger.warning(f"维护任务已取消: {task}")
             except Exception as e:
-                self.logger.error("监控循环发生错误", e)
-                time.sleep(10)  # 错误时等待更长时间
+                self.logger.error(f"维护任务失败 {task}", e)
+
+        self._maintenance = threading.Thread(target=run, name=task, daemon=True)
+        self._maintenance.start()
+        return {"ok": True, "message": f"已开始维护任务: {task}"}
+
+    def _start_watch(self, usb_path: str, snapshot: Optional[Dict[str, Tuple[int, int]]] = None):
+        """开始监视设备上的文件变化（设备保持插入期间增量备份）
+
+        snapshot为会话扫描到的文件，会话期间变化的文件由监视线程的初始遍历与其比较发现
+        """
+        self._stop_watch(usb_path)
+        if not self.config.get("watch_enabled", True):
+            return
+
+        watcher = ChangeWatcher(
+            usb_path, ExclusionEngine.from_config(self.config),
+            debounce=self.config.get("watch_debounce_seconds", 5),
+            sweep_interval=self.config.get("watch_sweep_interval", 120)
+        )
+        try:
+            watcher.start(snapshot)
+        except Exception as e:
+            self.logger.error(f"启动变化监视失败 {usb_path}", e)
+            return
+        self._watchers[usb_path] = watcher
+        self.logger.info(f"开始监视设备变化: {usb_path} (方式: {watcher.mode})")
+
+    def _stop_watch(self, usb_path: str):
+        """停止监视设备"""
+        watcher = self._watchers.pop(usb_path, None)
+        if watcher is not None:
+            watcher.stop()
+
+    def _process_watches(self):
+        """备份监视到的变化文件；已拔出设备的监视在这里停止"""
+        for drive, watcher in list(self._watchers.items()):
+            device_id = self.processed_drives.get(drive)
+            if device_id is None or not self._device_present(drive):
+                self._stop_watch(drive)
+                continue
+
+            changed = watcher.settled()
+            # 会话未完成时由下次插入的会话继续，不做增量备份
+            if changed and self.checkpoints.load(device_id) is None:
+                self.backup_changed(drive, changed)
+
+    def backup_changed(self, usb_path: str, rel_paths: List[str]):
+        """增量备份设备上变化的文件（不扫描整个设备）"""
+        fingerprint = self.devices.identify(usb_path)
+        device_key = fingerprint.device_id
+        token = self.stop_token.child()
+        self._session_tokens[usb_path] = token
+        durability = self.durability
+
+        device_state = None
+        target = None
+        batch = None
+        try:
+            device_state = self._open_device_state(fingerprint)
+            exclusions = ExclusionEngine.from_config(self.config)
+            date_folder = datetime.now().strftime("%Y%m%d")
+            usb_root = Path(usb_path)
+
+            selected = []
+            for rel_path in rel_paths:
+                name = rel_path.rsplit("/", 1)[-1]
+                src_file = usb_root / rel_path
+                try:
+                    src_stat = src_file.stat()
+                except OSError:
+                    continue
+                if exclusions.match(rel_path, name, False, rel_path.count("/")):
+                    continue
+                if device_state.is_unchanged(rel_path, src_stat):
+                    continue
+                should_copy, reason = self.should_copy_file(src_file)
+                if not should_copy:
+                    self.logger.debug(f"跳过文件: {name} - {reason}")
+                    continue
+                selected.append((rel_path, src_file, src_stat))
+
+            if not selected:
+                return
+
+            target = self.targets.choose(sum(src_stat.st_size for _, _, src_stat in selected))
+            if target is None:
+                self.logger.warning(f"备份目标空间不足，暂不备份变化的文件: {usb_path}")
+                return
+            self.targets.acquire(target)
+
+            jobs = []
+            reserved: Set[Path] = set()
+            for rel_path, src_file, src_stat in selected:
+                dest_file = self._get_dest_path(target.path, device_state.folder, date_folder, rel_path, reserved)
+                reserved.add(dest_file)
+                jobs.append((rel_path, src_file, src_stat, dest_file))
+
+            copied_count = 0
+
+            def on_copied(job, result: Optional[Tuple[int, str]], error: Optional[Exception]):
+                nonlocal copied_count
+                rel_path, src_file, src_stat, dest_file = job
+                if error is None:
+                    copied, digest = result
+                    copied_count += 1
+                    device_state.stats["files_copied"] += 1
+                    device_state.stats["total_size"] += copied
+                    device_state.record(rel_path, src_stat, digest)
+                    dest_rel = dest_file.relative_to(target.path)
+                    self.catalog.record(device_key, dest_rel.as_posix(), copied, digest, rel_path, target.key)
+                    self.logger.info(f"已备份(变化): {src_file.name} -> {dest_rel}")
+                else:
+                    if isinstance(error, OperationCancelled):
+                        raise error
+                    if not self._device_present(usb_path):
+                        raise DeviceRemovedError(usb_path) from error
+                    self.logger.error(f"复制文件失败 {src_file.name}", error)
+
+            batch = durability.batch(self.journal)
+            self._run_copy_jobs(jobs, on_copied, token, durability, batch)
+            self._sync_batch(batch)
+            if copied_count:
+                self.logger.info(f"变化文件备份完成: {usb_path} 复制{copied_count}个文件")
+
+        except DeviceRemovedError:
+            self.logger.warning(f"USB设备已移除: {usb_path}")
+        except OperationCancelled:
+            self.logger.warning(f"变化文件备份已取消: {usb_path}")
+        except Exception as e:
+            self.logger.error(f"备份变化文件失败 {usb_path}", e)
+        finally:
+            if batch is not None:
+                batch.discard()
+            if device_state is not None:
+                self._save_device_state(device_state)
+                self._close_device_state(device_state)
+                self.catalog.flush(device_key)
+            self._session_tokens.pop(usb_path, None)
+            if target is not None:
+                self.targets.release(target)
+
+    def _open_device_state(self, fingerprint) -> DeviceState:
+        """加载设备状态并登记为会话使用中"""
+        with self._state_lock:
+            state = self.device_states.load(fingerprint, self.config.get("usb_label_as_folder", True))
+            self._active_states[fingerprint.device_id] = state
+        return state
+
+    def _save_device_state(self, state: DeviceState):
+        """保存设备状态（与后台隔离串行）"""
+        with self._state_lock:
+            self.device_states.save(state)
+
+    def _append_device_state(self, state: DeviceState):
+        """追加保存会话中新记录的文件（与后台隔离串行）"""
+        with self._state_lock:
+            self.device_states.append(state)
+
+    def _close_device_state(self, state: DeviceState):
+        """会话结束，取消登记"""
+        with self._state_lock:
+            if self._active_states.get(state.fingerprint.device_id) is state:
+                del self._active_states[state.fingerprint.device_id]
+
+    def _on_quarantine(self, entry: Dict):
+        """损坏文件隔离后从设备清单中移除（下次插入时重新备份），并从备份目录中移除
+
+        设备会话进行中时修改会话内存中的清单，由会话保存，避免被会话的保存覆盖。
+        """
+        source = entry.get("source", "")
+        with self._state_lock:
+            state = self._active_states.get(entry["device_id"])
+            if state is not None:
+                state.forget(source)
+            else:
+                self.device_states.forget(entry["device_id"], source)
+        self.catalog.compact([(entry.get("target", ""), entry["path"])], self.targets.targets[0].key)
+
+    def _dest_base(self, target_root: Path, device_folder: str, date_folder: str, rel_path: str) -> Path:
+        """文件的目标路径（不处理文件名冲突）"""
+        if self.config.get("backup_by_date", True):
+            return target_root / device_folder / date_folder / rel_path
+        return target_root / device_folder / rel_path
+
+    def _find_unrecorded_copy(self, target_root: Path, device_folder: str, date_folder: str, rel_path: str,
+                              src_file: Path, src_stat: os.stat_result) -> Optional[Tuple[Path, str]]:
+        """续传会话中查找中断前已复制完成、但没有记录的文件（强制结束时最后一次保存进度之后复制的文件）
+
+        复制会保留修改时间，大小、修改时间和内容都一致时直接记录，不再复制为带序号的副本。
+        返回(目标文件, 内容哈希)。
+        """
+        dest_file = self._dest_base(target_root, device_folder, date_folder, rel_path)
+        try:
+            dest_stat = dest_file.stat()
+            if dest_stat.st_size != src_stat.st_size or dest_stat.st_mtime_ns != src_stat.st_mtime_ns:
+                return None
+            digest = hash_file_mmap(src_file)
+            if hash_file_mmap(dest_file) != digest:
+                return None
+        except (OSError, ValueError):
+            return None
+        return dest_file, digest
+
+    def _get_dest_path(self, target_root: Path, device_folder: str, date_folder: str, rel_path: str,
+                       reserved: Optional[Set[Path]] = None) -> Path:
+        """生成目标路径，并处理文件名冲突"""
+        dest_file = self._dest_base(target_root, device_folder, date_folder, rel_path)
+        counter = 1
+        original_dest = dest_file
+        while dest_file.exists() or (reserved and dest_file in reserved):
+            stem = original_dest.stem
+            suffix = original_dest.suffix
+            dest_file = original_dest.parent / f"{stem}_{counter}{suffix}"
+            counter += 1
+
+        return dest_file
+
+    def _device_present(self, usb_path: str) -> bool:
+        """检查设备是否仍然存在"""
+        return os.path.exists(usb_path)
+
+    def monitor_loop(self):
+        """监控循环"""
+        self.logger.info("开始监控USB设备...")
+
+        check_interval = self.config.get("check_interval", 3)
+        status_interval = 300  # 每5分钟记录一次状态
+
+        last_status_time = time.time()
+
+        try:
+            while self.running and not self.stop_token.cancelled:
+                try:
+                    current_time = time.time()
+
+                    # 获取当前USB设备
+                    current_drives = set(self.get_usb_drives())
+                    self.devices.prune(current_drives)
+
+                    # 检查新插入的设备（同一挂载点换了设备也视为新设备）
+                    for drive in sorted(current_drives):
+                        device_id = self.devices.identify(drive).device_id
+                        if self.processed_drives.get(drive) == device_id:
+                            continue
+
+                        # 会话结束后开始监视，以会话的扫描结果为初始快照（扫描期间发生的变化也不会遗漏）
+                        self._stop_watch(drive)
+                        snapshot = {} if self.config.get("watch_enabled", True) else None
+                        self.copy_usb_files(drive, snapshot)
+                        self.processed_drives[drive] = device_id
+                        self._start_watch(drive, snapshot)
+
+                    # 更新已处理列表（移除已拔出的设备）
+                    self.processed_drives = {
+                        drive: device_id for drive, device_id in self.processed_drives.items()
+                        if drive in current_drives
+                    }
+
+                    # 增量备份仍插入的设备上已停止变化的文件
+                    self._process_watches()
+
+                    # 定期记录状态
+                    if current_time - last_status_time >= status_interval:
+                        self.logger.info(f"监控状态: 已处理设备={len(self.processed_drives)}")
+                        last_status_time = current_time
+
+                    # 等待（停止时立即唤醒）
+                    if self.stop_token.wait(check_interval):
+                        break
+
+                except KeyboardInterrupt:
+                    self.logger.info("收到停止信号")
+                    break
+                except Exception as e:
+                    self.logger.error("监控循环发生错误", e)
+                    if self.stop_token.wait(10):  # 错误时等待更长时间
+                        break
+        finally:
+            # 监控线程退出时通知主线程
+            self.stop_token.cancel("监控线程退出")
 
     def start(self):
         """启动监控"""
@@ -620,6 +1610,8 @@ class USBMonitor:
             return
 
         self.running = True
+        self.stop_token = CancelToken()
+        self.started_at = time.time()
 
         # 启动日志
         self.logger.info("=" * 60)
@@ -632,18 +1624,59 @@ class USBMonitor:
         self.logger.info(f"最小空间: {self.config.get('min_free_space_gb')}GB")
         self.logger.info(f"总大小限制: {self.config.get('max_total_size_gb')}GB")
         self.logger.info(f"检查间隔: {self.config.get('check_interval')}秒")
+        self.logger.info(
+            f"I/O限速: 读{self.config.get('io_read_limit_mbps', 0)}MB/s, "
+            f"写{self.config.get('io_write_limit_mbps', 0)}MB/s (0为不限), "
+            f"复制并发{self.copy_concurrency.limit}, "
+            f"自适应={'开' if self.throttle.enabled else '关'}"
+        )
         self.logger.info("=" * 60)
 
+        # 回放复制日志，清理上次异常退出时未完成的文件
+        recovered = self.journal.recover(self.logger, [target.path for target in self.targets.targets])
+        if recovered["removed"] or recovered["finished"]:
+            self.logger.info(
+                f"复制日志恢复完成: 删除未完成文件{recovered['removed']}个, "
+                f"确认已完成文件{recovered['finished']}个"
+            )
+
+        # 启动自适应限速
+        if self.throttle.enabled:
+            self.throttle.start()
+
+        # 启动后台完整性校验
+        if self.config.get("scrub_enabled", True):
+            self.scrubber = Scrubber(
+                self.backup_folder, self.catalog, self.logger,
+                sample_size=self.config.get("scrub_sample_size", 200),
+                rate_bps=self.config.get("scrub_rate_mbps", 5) * MB,
+                interval=self.config.get("scrub_interval_hours", 24) * 3600,
+                quarantine=self.config.get("scrub_quarantine", False),
+                cancel_token=self.stop_token.child(),
+                # 文件可能位于任一备份目标上
+                locate=lambda entry: self.targets.locate(entry["path"], entry.get("target", "")),
+                # 隔离后从设备清单中移除，下次插入时重新备份
+                on_quarantine=self._on_quarantine
+            )
+            self.scrubber.start()
+
+        # 启动本地控制端点
+        if self.config.get("control_enabled", True):
+            self.control = ControlServer(self.backup_folder / STATE_DIR_NAME, self.handle_control, self.logger)
+            if not self.control.start():
+                self.control = None
+
         # 启动监控线程
         self.usb_thread = threading.Thread(target=self.monitor_loop, daemon=True)
         self.usb_thread.start()
 
         self.logger.info("系统启动完成，开始监控USB设备...")
 
-        # 保持主线程运行
+        # 保持主线程运行，直到收到停止信号或监控线程退出
+        # （带超时等待，以便Windows上能响应Ctrl+C）
         try:
-            while self.running and self.usb_thread.is_alive():
-                time.sleep(1)
+            while not self.stop_token.wait(1):
+                pass
         except KeyboardInterrupt:
             self.logger.info("收到停止信号")
         finally:
@@ -651,12 +1684,29 @@ class USBMonitor:
 
     def stop(self):
         """停止监控"""
+        if not self.running:
+            return
         self.running = False
         self.logger.info("系统正在停止...")
 
+        # 取消所有会话：扫描、复制和清理在下一个文件或数据块处退出
+        self.stop_token.cancel("系统停止")
+
         if self.usb_thread and self.usb_thread.is_alive():
             self.usb_thread.join(timeout=5)
 
+        if self.control is not None:
+            self.control.stop()
+            self.control = None
+
+        for drive in list(self._watchers):
+            self._stop_watch(drive)
+
+        self.throttle.stop()
+        self._copy_executor.shutdown(wait=False)
+        self.offload.close()
+        self.journal.close()
+
         self.logger.info("=" * 60)
         self.logger.info("系统已停止")
         self.logger.info(f"累计处理USB设备: {len(self.processed_drives)}")
@@ -677,13 +1727,13 @@ def setup_autostart():
             exe_path = os.path.abspath(sys.argv[0])
 
         # 设置自启动
-        manager = autostart.AutoStartManager("USBBackup")
-        success = manager.set_autostart(exe_path)
+        manager = autostart.EnhancedAutoStartManager("USBBackup")
+        success, message = manager.setup_autostart(exe_path)
 
         if success:
-            print("[INFO] 已设置开机自启动")
+            print(f"[INFO] {message}")
         else:
-            print("[WARN] 设置开机自启动失败")
+            print(f"[WARN] 设置开机自启动失败: {message}")
 
         return success
 
@@ -706,38 +1756,145 @@ def hide_console():
         except:
             pass
 
-def main():
+class StartupProfiler:
+    """启动阶段计时"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        # 模块导入耗时（从 main.py 开始加载到创建计时器）
+        self.phases.append(("模块导入", time.perf_counter() - _IMPORT_START))
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个启动阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    @property
+    def total(self) -> float:
+        """总耗时（秒）"""
+        return sum(duration for _, duration in self.phases)
+
+    def summary(self) -> str:
+        """单行摘要"""
+        parts = ", ".join(f"{name} {duration * 1000:.0f}ms" for name, duration in self.phases)
+        return f"启动耗时 {self.total * 1000:.0f}ms ({parts})"
+
+    def report(self) -> str:
+        """详细报告"""
+        lines = ["启动耗时分析:", "-" * 40]
+        for name, duration in self.phases:
+            share = duration / self.total * 100 if self.total else 0
+            lines.append(f"  {name:<12} {duration * 1000:8.1f}ms  {share:5.1f}%")
+        lines.append("-" * 40)
+        lines.append(f"  {'合计':<12} {self.total * 1000:8.1f}ms")
+        return "\n".join(lines)
+
+# 第二次启动时可转交给运行中实例的命令
+HANDOFF_COMMANDS = ("status", "reload", "pause", "resume", "stop")
+
+def parse_args(argv: List[str]):
+    """解析命令行参数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="USB文件监控备份系统")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="分析各启动阶段耗时（配置、日志、备份目录、自启动、首次设备扫描）后退出")
+    parser.add_argument("command", nargs="?", choices=HANDOFF_COMMANDS,
+                        help="转交给已运行实例的命令（没有运行的实例时不执行）")
+    return parser.parse_args(argv)
+
+def hand_off(lock: InstanceLock, command: Optional[str]) -> int:
+    """已有实例在运行：通过控制端点把命令行请求转交给它，不再启动第二个监控"""
+    pid = lock.owner_pid()
+    print(f"[INFO] 备份程序已在运行（进程ID: {pid or '未知'}），不再启动新的监控")
+
+    command = command or "status"
+    reply = send_command(lock.path.parent, command)
+    if not reply.get("ok"):
+        print(f"[WARN] {reply.get('error', '未知错误')}")
+        return 1
+
+    if command == "status":
+        print(format_status(reply["status"]))
+    else:
+        print(f"[INFO] {reply.get('message', '')}")
+    return 0
+
+def main(argv: Optional[List[str]] = None):
     """主函数"""
+    argv = sys.argv[1:] if argv is None else argv
+    # 无参数时（开机自启动）不加载argparse
+    args = parse_args(argv) if argv else None
+    profile_startup = bool(args and args.profile_startup)
+    profiler = StartupProfiler()
+
     print("=" * 60)
     print("USB文件监控备份系统")
     print("=" * 60)
 
     # 初始化配置
     print("[INFO] 初始化配置...")
-    config = ConfigManager()
+    with profiler.phase("配置"):
+        config = ConfigManager()
+
+    # 同一备份目录只运行一个监控实例
+    command = args.command if args else None
+    instance_lock = InstanceLock(Path(config.get("backup_folder", "USB_Backup")) / STATE_DIR_NAME)
+    if not profile_startup:
+        if not instance_lock.acquire():
+            return hand_off(instance_lock, command)
+        if command:
+            instance_lock.release()
+            print(f"[WARN] 备份程序未运行，无法执行命令: {command}")
+            return 1
 
     # 如果启用隐藏模式，隐藏控制台窗口
-    if config.get("hidden_mode", True):
+    if config.get("hidden_mode", True) and not profile_startup:
         hide_console()
 
-    # 设置开机自启动
-    if config.get("enable_autostart", True):
-        print("[INFO] 设置开机自启动...")
-        setup_autostart()
-
     # 初始化日志
     print("[INFO] 初始化日志系统...")
-    logger = Logger(config)
+    with profiler.phase("日志"):
+        logger = Logger(config)
 
     try:
-        # 初始化并启动监控
+        # 初始化监控（创建备份目录）
         print("[INFO] 初始化USB监控...")
-        monitor = USBMonitor(logger, config)
+        with profiler.phase("备份目录"):
+            monitor = USBMonitor(logger, config)
+
+        # 设置开机自启动：分析模式下同步执行以便计时，正常启动时放到后台线程，不阻塞首次扫描
+        if config.get("enable_autostart", True):
+            print("[INFO] 设置开机自启动...")
+            if profile_startup:
+                with profiler.phase("自启动"):
+                    setup_autostart()
+            else:
+                threading.Thread(target=setup_autostart, name="AutoStartSetup", daemon=True).start()
+
+        if profile_startup:
+            with profiler.phase("首次设备扫描"):
+                drives = monitor.get_usb_drives()
+                for drive in drives:
+                    monitor.devices.identify(drive)
+
+            print(profiler.report())
+            print(f"发现USB设备: {len(drives)}个")
+            logger.info(profiler.summary())
+            return
+
+        logger.info(profiler.summary())
 
         print("[INFO] 启动监控系统...")
         monitor.start()
 
     except Exception as e:
+        import traceback
+
         print(f"[ERROR] 程序运行失败: {e}")
         traceback.print_exc()
 
@@ -748,6 +1905,12 @@ def main():
             pass
 
         input("\n按回车键退出...")
+    finally:
+        instance_lock.release()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # 打包为exe后工作进程以spawn方式启动，需要在入口处处理（未打包时无需导入multiprocessing）
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    sys.exit(main())
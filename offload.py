@@ -0,0 +1,282 @@
+"""
+多进程卸载模块
+大文件的哈希计算和冷存储压缩交给工作进程并行执行，
+复制时的数据块通过共享内存传递给工作进程（不经过pickle），小文件仍在当前进程处理
+"""
+
+import os
+import hashlib
+import threading
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+from cancel import CancelToken
+from copier import CHUNK_SIZE, HASH_ALGORITHM
+
+MB = 1024 * 1024
+
+# 每个工作进程的共享内存块数（读取下一块的同时工作进程计算上一块的哈希）
+_SLOTS = 4
+
+# 等待工作进程返回结果时检查取消的间隔（秒）
+_POLL_INTERVAL = 0.2
+
+
+def _worker_main(conn, shm_name: str, chunk_size: int):
+    """工作进程主循环"""
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    hasher = None
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            op = message[0]
+            if op == "begin":
+                hasher = hashlib.new(HASH_ALGORITHM)
+            elif op == "update":
+                _, slot, length = message
+                start = slot * chunk_size
+                with shm.buf[start:start + length] as view:
+                    hasher.update(view)
+                conn.send(slot)
+            elif op == "digest":
+                conn.send(hasher.hexdigest())
+                hasher = None
+            elif op == "call":
+                _, func, args = message
+                try:
+                    conn.send((True, func(*args)))
+                except Exception as e:
+                    conn.send((False, f"{type(e).__name__}: {e}"))
+            elif op == "stop":
+                break
+    finally:
+        shm.close()
+
+
+class OffloadWorker:
+    """工作进程（同一时间只由一个复制或归档任务使用）"""
+
+    def __init__(self, context, chunk_size: int, slots: int = _SLOTS):
+        from multiprocessing import shared_memory
+
+        self.chunk_size = chunk_size
+        self.shm = shared_memory.SharedMemory(create=True, size=chunk_size * slots)
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, self.shm.name, chunk_size),
+            name="OffloadWorker", daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.slots = slots
+        self._free = list(range(slots))
+        # 已发送、等待工作进程处理完的块（按发送顺序）
+        self._pending = deque()
+        # 工作进程已终止或管道已断开，不能再使用
+        self._broken = False
+
+    def begin(self):
+        """开始计算一个文件的哈希"""
+        self.conn.send(("begin",))
+
+    def next_slot(self) -> int:
+        """取得一个空闲的共享内存块（都在使用时等待最早的一块处理完）"""
+        if self._free:
+            return self._free.pop()
+        self._wait_oldest()
+        return self._free.pop()
+
+    def buffer(self, slot: int) -> memoryview:
+        """共享内存块的视图（用完后需要release）"""
+        start = slot * self.chunk_size
+        return self.shm.buf[start:start + self.chunk_size]
+
+    def update(self, slot: int, length: int):
+        """把共享内存块中的数据交给工作进程计算哈希"""
+        self._pending.append(slot)
+        self.conn.send(("update", slot, length))
+
+    def release_slot(self, slot: int):
+        """归还未使用的块"""
+        self._free.append(slot)
+
+    def digest(self) -> str:
+        """等待所有块处理完并返回哈希"""
+        while self._pending:
+            self._wait_oldest()
+        self.conn.send(("digest",))
+        return self.conn.recv()
+
+    def _wait_oldest(self):
+        """等待最早发送的块处理完"""
+        slot = self.conn.recv()
+        self._pending.popleft()
+        self._free.append(slot)
+
+    def call(self, func, *args, cancel_token: Optional[CancelToken] = None):
+        """在工作进程中执行函数（函数和参数需可pickle）
+
+        等待结果时定期检查取消令牌；取消后终止工作进程（函数执行到一半的结果不再需要），
+        由进程池在需要时重新启动
+        """
+        try:
+            self.conn.send(("call", func, args))
+            while not self.conn.poll(_POLL_INTERVAL):
+                if cancel_token is not None and cancel_token.cancelled:
+                    self.terminate()
+                    cancel_token.raise_if_cancelled()
+            ok, result = self.conn.recv()
+        except (EOFError, BrokenPipeError, ValueError) as e:
+            # 工作进程退出后管道关闭：EOFError（读取）、BrokenPipeError（写入）、ValueError（连接已关闭）
+            self._broken = True
+            raise OSError(f"工作进程异常退出: {e}" if str(e) else "工作进程异常退出") from e
+        if not ok:
+            raise OSError(result)
+        return result
+
+    def terminate(self):
+        """立即终止工作进程（正在执行的调用被放弃）"""
+        self._broken = True
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def reset(self) -> bool:
+        """任务中断后丢弃未处理完的块，恢复到可用状态（工作进程异常时返回False）"""
+        if self._broken:
+            return False
+        try:
+            while self._pending:
+                if not self.conn.poll(5):
+                    return False
+                self._wait_oldest()
+            # 中断时可能有已取出但未发送的块
+            self._free = list(range(self.slots))
+            return self.process.is_alive()
+        except (EOFError, OSError):
+            return False
+
+    def close(self):
+        """停止工作进程并释放共享内存"""
+        try:
+            self.conn.send(("stop",))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=2)
+        self.conn.close()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class OffloadPool:
+    """工作进程池（按需启动，workers为0时不启用）"""
+
+    def __init__(self, workers: int = 0, min_size: int = 32 * MB, chunk_size: int = CHUNK_SIZE):
+        self.workers = max(0, workers)
+        self.min_size = min_size
+        self.chunk_size = chunk_size
+        # 启动第一个工作进程时才导入multiprocessing并创建（未启用时不增加启动时间）
+        self._context = None
+        self._idle: List[OffloadWorker] = []
+        self._all: List[OffloadWorker] = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @classmethod
+    def from_config(cls, config) -> "OffloadPool":
+        """根据配置创建（offload_workers为-1时按CPU核数）"""
+        workers = int(config.get("offload_workers", 0))
+        if workers < 0:
+            workers = max(1, (os.cpu_count() or 2) - 1)
+        return cls(workers, min_size=int(config.get("offload_min_size_mb", 32) * MB))
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0 and not self._closed
+
+    def acquire(self, block: bool = True, cancel_token: Optional[CancelToken] = None) -> Optional[OffloadWorker]:
+        """取得空闲工作进程（不足时按需启动；block为False且没有空闲进程时返回None）"""
+        with self._cond:
+            while True:
+                if not self.enabled:
+                    return None
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._all) < self.workers:
+                    break
+                if not block:
+                    return None
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                self._cond.wait(0.5)
+
+            worker = None
+            try:
+                if self._context is None:
+                    import multiprocessing
+                    # 统一使用spawn：在多线程进程中fork不安全，Windows上也只有spawn
+                    self._context = multiprocessing.get_context("spawn")
+                worker = OffloadWorker(self._context, self.chunk_size)
+            except Exception:
+                # 无法启动工作进程（如共享内存不可用），此后在当前进程处理
+                self.workers = 0
+                return None
+            self._all.append(worker)
+            return worker
+
+    def lease(self, path: Path) -> Optional[OffloadWorker]:
+        """大文件取得工作进程计算哈希；小文件或没有空闲进程时返回None（在当前进程计算）"""
+        if not self.enabled:
+            return None
+        try:
+            if os.path.getsize(path) < self.min_size:
+                return None
+        except OSError:
+            return None
+        return self.acquire(block=False)
+
+    def release(self, worker: OffloadWorker):
+        """归还工作进程（状态异常的进程直接关闭，需要时重新启动）"""
+        healthy = worker.reset()
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle.append(worker)
+            else:
+                self._all.remove(worker)
+            self._cond.notify()
+        if not healthy or self._closed:
+            worker.close()
+
+    def call(self, func, *args, cancel_token: Optional[CancelToken] = None):
+        """在工作进程中执行函数；未启用时在当前线程执行"""
+        worker = self.acquire(cancel_token=cancel_token)
+        if worker is None:
+            return func(*args)
+        try:
+            return worker.call(func, *args, cancel_token=cancel_token)
+        finally:
+            # 取消时工作进程已终止，release会关闭它
+            self.release(worker)
+
+    def close(self):
+        """关闭所有工作进程"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            for worker in idle:
+                self._all.remove(worker)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.close()
@@ -0,0 +1,170 @@
+"""
+性能分析模块
+可选的会话性能分析：各阶段计时（目录扫描、文件筛选、复制、清理等），
+按采样率对部分会话启用 cProfile 和 tracemalloc，结果写入日志目录
+"""
+
+import time
+import random
+import threading
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class SessionProfile:
+    """单个会话的分析数据"""
+
+    def __init__(self, name: str, sampled: bool):
+        self.name = name
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.started_time = datetime.now()
+        # 阶段名 -> [次数, 累计秒数]
+        self.spans: Dict[str, List[float]] = {}
+        self.cprofile = None
+        self.snapshot = None
+
+
+class SessionProfiler:
+    """会话性能分析器（未启用时各计时点几乎没有开销）"""
+
+    def __init__(self, output_dir: Path, logger, enabled: bool = False, sample_rate: float = 1.0,
+                 top_n: int = 30, trace_memory: bool = True):
+        self.output_dir = Path(output_dir)
+        self.logger = logger
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+        self._current: Optional[SessionProfile] = None
+
+    @classmethod
+    def from_config(cls, config, logger) -> "SessionProfiler":
+        """根据配置创建（结果保存在日志目录的profiles子目录）"""
+        log_dir = getattr(logger, "log_dir", Path("logs"))
+        return cls(
+            Path(log_dir) / "profiles", logger,
+            enabled=config.get("profile_enabled", False),
+            sample_rate=config.get("profile_sample_rate", 0.1),
+            top_n=config.get("profile_top_n", 30),
+            trace_memory=config.get("profile_tracemalloc", True)
+        )
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None):
+        """运行时开关（下一个会话生效）"""
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+
+    def begin(self, name: str) -> Optional[SessionProfile]:
+        """会话开始（按采样率决定是否启用cProfile和tracemalloc）"""
+        if not self.enabled or self._current is not None:
+            return None
+
+        profile = SessionProfile(name, random.random() < self.sample_rate)
+        if profile.sampled:
+            import cProfile
+            profile.cprofile = cProfile.Profile()
+            if self.trace_memory:
+                import tracemalloc
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(10)
+                profile.snapshot = tracemalloc.take_snapshot()
+            # cProfile只分析会话所在的线程，复制线程的耗时由阶段计时统计
+            profile.cprofile.enable()
+            # 不计入快照本身的耗时
+            profile.started = time.perf_counter()
+
+        self._current = profile
+        return profile
+
+    @contextmanager
+    def span(self, name: str):
+        """阶段计时（可在复制线程中使用）"""
+        profile = self._current
+        if profile is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - start)
+
+    def add_span(self, name: str, seconds: float):
+        """累加阶段耗时（用于不便包在with语句中的代码段）"""
+        profile = self._current
+        if profile is None:
+            return
+        with self._lock:
+            span = profile.spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+
+    def end(self, profile: Optional[SessionProfile]):
+        """会话结束，写入分析结果"""
+        if profile is None:
+            return
+        self._current = None
+        total = time.perf_counter() - profile.started
+
+        stats = None
+        memory_lines: List[str] = []
+        if profile.cprofile is not None:
+            profile.cprofile.disable()
+            import pstats
+            stats = pstats.Stats(profile.cprofile)
+
+        if profile.snapshot is not None:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            diff = tracemalloc.take_snapshot().compare_to(profile.snapshot, "lineno")
+            tracemalloc.stop()
+            memory_lines.append(f"内存: 当前{current / 1024 / 1024:.1f}MB, 峰值{peak / 1024 / 1024:.1f}MB")
+            memory_lines.extend(str(stat) for stat in diff[:self.top_n])
+
+        try:
+            self._write(profile, total, stats, memory_lines)
+        except Exception as e:
+            self.logger.error("写入性能分析结果失败", e)
+
+        spans = ", ".join(
+            f"{name} {seconds:.2f}s" for name, (_, seconds) in
+            sorted(profile.spans.items(), key=lambda item: item[1][1], reverse=True)
+        )
+        self.logger.info(f"会话性能: {profile.name} 总计{total:.2f}s ({spans or '无'})")
+
+    def _write(self, profile: SessionProfile, total: float, stats, memory_lines: List[str]):
+        """写入 .prof 文件和文本摘要"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        base = self.output_dir / f"{profile.started_time.strftime('%Y%m%d_%H%M%S')}_{profile.name}"
+
+        lines = [
+            f"会话: {profile.name}",
+            f"开始: {profile.started_time.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"总耗时: {total:.3f}s",
+            "",
+            "阶段计时（复制线程的耗时会累加，可能超过总耗时）:",
+        ]
+        for name, (count, seconds) in sorted(profile.spans.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f"  {name:<12} {seconds:9.3f}s  {int(count):8d}次  平均{seconds / count * 1000:8.3f}ms")
+
+        if stats is not None:
+            stats.dump_stats(str(base) + ".prof")
+
+            import io
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats("cumulative").print_stats(self.top_n)
+            lines += ["", f"cProfile（按累计耗时前{self.top_n}项）:", buffer.getvalue()]
+
+        if memory_lines:
+            lines += ["", f"tracemalloc（会话期间内存增长前{self.top_n}项）:"] + memory_lines
+
+        with open(str(base) + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
@@ -0,0 +1,249 @@
+"""
+并行目录扫描模块
+多个扫描线程提前列出设备目录（工作窃取队列），会话按原来的深度优先顺序取用结果，
+在慢速闪存和深层目录树上把逐个等待目录读取的时间重叠起来
+"""
+
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from cancel import CancelToken
+
+# 已列出但尚未取用的目录数上限（控制内存占用）
+_MAX_AHEAD = 256
+
+# 扫描线程优先列出会话待扫描目录栈顶的这些目录（不受上限限制）
+_LOOKAHEAD = 16
+
+
+class DirListing:
+    """一个目录的列出结果"""
+
+    def __init__(self, rel_dir: str, mtime: Optional[int], entries: Optional[List[os.DirEntry]] = None,
+                 error: Optional[OSError] = None, subdirs: Optional[List[str]] = None):
+        self.rel_dir = rel_dir
+        self.mtime = mtime
+        # 按名称排序的条目（目录摘要未变化时为None）
+        self.entries = entries
+        self.error = error
+        # 需要继续扫描的子目录（已应用排除规则）
+        self.subdirs = subdirs or []
+
+
+class ParallelScanner:
+    """并行目录扫描
+
+    扫描线程优先列出会话待扫描目录栈顶、即会话接下来要处理的目录；其余时间每个扫描线程
+    使用自己的双端队列：新发现的子目录压入自己队列的尾部并优先处理（深度优先，
+    与会话的处理顺序一致），自己的队列为空时从其他线程队列的头部窃取。
+    结果数达到上限后只列出栈顶的目录，窃取来的靠后目录不会占满上限、让会话自己逐个列出。
+    threads为0时不启动线程，get()在调用线程中直接列出目录。
+    领取目录和取用结果不持有共享锁（dict的setdefault/pop是原子操作），
+    只有等待扫描线程的结果、或有扫描线程在等待时才加锁，会话线程自己列出目录时不与扫描线程争锁。
+    """
+
+    def __init__(self, root: Path, exclusions, previous_tree=None, threads: int = 4,
+                 skip: Optional[Set[str]] = None, gate=None, cancel_token: Optional[CancelToken] = None,
+                 max_ahead: int = _MAX_AHEAD):
+        self.root = Path(root)
+        # 独立的排除规则实例，不影响会话的排除统计
+        self.exclusions = exclusions
+        self.previous_tree = previous_tree
+        self.threads = max(0, threads)
+        # 不需要提前列出的目录，如续传会话中断前已完成且之后没有变化的目录
+        self.skip = skip or set()
+        self.gate = gate
+        self.cancel_token = cancel_token or CancelToken()
+        self.max_ahead = max_ahead
+
+        self._queues = [deque() for _ in range(self.threads)]
+        # 会话的待扫描目录栈（会话线程修改，扫描线程只读取栈顶）
+        self._order: List[str] = []
+        self._cond = threading.Condition()
+        # 已被线程或调用方领取的目录 -> 领取标记
+        self._claimed: Dict[str, object] = {}
+        self._results: Dict[str, DirListing] = {}
+        # 正在等待的扫描线程数（为0时取用结果和压入子目录无需唤醒）
+        self._waiting = 0
+        self._stopping = False
+        self._workers: List[threading.Thread] = []
+
+    def start(self, pending_dirs: List[str]):
+        """按待扫描目录栈启动扫描线程（栈顶最先处理）"""
+        if not self.threads:
+            return
+        self._order = pending_dirs
+        for i, rel_dir in enumerate(d for d in reversed(pending_dirs) if d not in self.skip):
+            # 栈顶的目录分给不同线程，最先需要的目录最先列出
+            self._queues[i % self.threads].appendleft(rel_dir)
+        for i in range(self.threads):
+            worker = threading.Thread(target=self._run, args=(i,), name=f"DirScanner-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        """停止扫描线程"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=2)
+        self._workers = []
+        self._results.clear()
+
+    def _claim(self, rel_dir: str) -> bool:
+        """领取目录，已被其他线程领取时返回False（不需要持有锁）"""
+        marker = object()
+        return self._claimed.setdefault(rel_dir, marker) is marker
+
+    def _wake(self):
+        """有扫描线程在等待时唤醒（计数在锁内增加后才检查队列和结果数，不会错过唤醒）"""
+        if self._waiting:
+            with self._cond:
+                self._cond.notify_all()
+
+    def get(self, rel_dir: str, cancel_token: Optional[CancelToken] = None) -> DirListing:
+        """取得目录的列出结果（尚未被扫描线程领取时在当前线程列出）"""
+        token = cancel_token or self.cancel_token
+        # 会话的栈顶已经更新，等待中的扫描线程可以领取接下来的目录
+        self._wake()
+        listing = self._results.pop(rel_dir, None)
+        if listing is None and not self._claim(rel_dir):
+            # 扫描线程正在列出该目录
+            with self._cond:
+                while True:
+                    listing = self._results.pop(rel_dir, None)
+                    if listing is not None or self._claim(rel_dir):
+                        break
+                    token.raise_if_cancelled()
+                    self._cond.wait(0.5)
+
+        if listing is not None:
+            return listing
+
+        listing = self._list(rel_dir)
+        if self.threads:
+            # 子目录交给扫描线程继续提前列出
+            self._push(0, listing.subdirs)
+        return listing
+
+    def _push(self, index: int, subdirs: List[str]):
+        """子目录逆序压入队列尾部，出队时按名称顺序"""
+        self._queues[index].extend(sub for sub in reversed(subdirs) if sub not in self.skip)
+        self._wake()
+
+    def _next_in_order(self) -> Optional[str]:
+        """会话接下来要处理、尚未被领取的目录（栈可能正被会话线程修改，读到过时的条目也无妨）"""
+        order = self._order
+        for i in range(1, _LOOKAHEAD + 1):
+            try:
+                rel_dir = order[-i]
+            except IndexError:
+                return None
+            if rel_dir not in self._claimed and rel_dir not in self.skip:
+                return rel_dir
+        return None
+
+    def _next(self, index: int) -> Optional[str]:
+        """从自己的队列尾部取目录，为空时从其他队列头部窃取"""
+        try:
+            return self._queues[index].pop()
+        except IndexError:
+            pass
+        for offset in range(1, self.threads):
+            try:
+                return self._queues[(index + offset) % self.threads].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _run(self, index: int):
+        """扫描线程"""
+        while True:
+            if self._stopping or self.cancel_token.cancelled:
+                return
+
+            rel_dir = self._next_in_order()
+            if rel_dir is None and len(self._results) >= self.max_ahead:
+                with self._cond:
+                    # 结果未被取用的太多时等待（会话取用结果或栈顶变化时唤醒），避免占用过多内存
+                    self._waiting += 1
+                    if not self._stopping and len(self._results) >= self.max_ahead:
+                        self._cond.wait(0.5)
+                    self._waiting -= 1
+                continue
+
+            if rel_dir is None:
+                rel_dir = self._next(index)
+            if rel_dir is None:
+                with self._cond:
+                    if self._stopping:
+                        return
+                    self._waiting += 1
+                    if not any(self._queues):
+                        self._cond.wait(0.5)
+                    self._waiting -= 1
+                continue
+
+            if not self._claim(rel_dir):
+                continue
+
+            try:
+                if self.gate is not None:
+                    self.gate.wait(self.cancel_token)
+                listing = self._list(rel_dir)
+            except Exception:
+                # 取消等情况：让调用方自己列出
+                with self._cond:
+                    self._claimed.pop(rel_dir, None)
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._results[rel_dir] = listing
+                self._cond.notify_all()
+            self._push(index, listing.subdirs)
+
+    def _list(self, rel_dir: str) -> DirListing:
+        """列出目录（目录修改时间未变化时沿用上次记录的子目录）"""
+        path = self.root / rel_dir
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime is not None and self.previous_tree is not None:
+            previous_subdirs = self.previous_tree.lookup(rel_dir, mtime)
+            if previous_subdirs is not None:
+                return DirListing(rel_dir, mtime, subdirs=[
+                    f"{rel_dir}/{name}" if rel_dir else name for name in previous_subdirs
+                ])
+
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            return DirListing(rel_dir, mtime, error=e)
+
+        subdirs = []
+        depth = rel_dir.count("/") + 1 if rel_dir else 0
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if not self.exclusions.match(rel_path, entry.name, True, depth + 1, entry):
+                    subdirs.append(rel_path)
+            elif not self.exclusions.match(rel_path, entry.name, False, depth, entry):
+                # 提前读取文件属性（DirEntry会缓存），会话筛选文件时不再等待
+                try:
+                    entry.stat()
+                except OSError:
+                    pass
+
+        return DirListing(rel_dir, mtime, entries, subdirs=subdirs)
@@ -0,0 +1,660 @@
+"""
+压力测试模块
+用模拟设备替换 get_usb_drives / get_usb_label，按录制的或合成的插拔记录挂载生成的目录树，
+注入设备移除和I/O错误，长时间运行 USBMonitor.monitor_loop 并检查内存增长、线程泄漏、
+延迟分位数和备份正确性
+
+用法:
+    python soak.py run --duration 3600 --devices 8 --report soak_report.json
+    python soak.py run --trace trace.jsonl --speed 10
+    python soak.py synth --duration 3600 -o trace.jsonl
+    python soak.py convert-log logs/usb_backup.log -o trace.jsonl
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import errno
+import random
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+# 模拟文件的扩展名（前几项在默认关键词中，其余应被跳过）
+_EXTENSIONS = [".docx", ".pdf", ".xlsx", ".jpg", ".png", ".tmp", ".bin", ".log"]
+
+# 统计检查的预热样本数
+_WARMUP_SAMPLES = 3
+
+
+class SimulatedDevice:
+    """模拟的USB设备：挂载时目录位于 mounts/，拔出时移到 parked/"""
+
+    def __init__(self, name: str, sandbox: Path, seed: int, dirs: int = 20, files: int = 200,
+                 max_size: int = 256 * 1024):
+        self.name = name
+        self.label = f"SIM_{name}"
+        self.mount_path = sandbox / "mounts" / name
+        self.parked_path = sandbox / "parked" / name
+        self.rng = random.Random(seed)
+        self.dirs = dirs
+        self.files = files
+        self.max_size = max_size
+        self.mounted = False
+        self.mounted_at = 0.0
+        # 插入次数（会话期间重新插拔或修改过的设备不做正确性校验）
+        self.generation = 0
+
+    @property
+    def root(self) -> Path:
+        """当前所在目录"""
+        return self.mount_path if self.mounted else self.parked_path
+
+    def generate(self):
+        """生成目录树（拔出状态）"""
+        root = self.parked_path
+        shutil.rmtree(root, ignore_errors=True)
+        root.mkdir(parents=True)
+
+        folders = [root]
+        for i in range(self.dirs):
+            parent = self.rng.choice(folders)
+            folder = parent / f"dir{i:03d}"
+            folder.mkdir()
+            folders.append(folder)
+
+        for i in range(self.files):
+            folder = self.rng.choice(folders)
+            self._write(folder / f"file{i:05d}{self.rng.choice(_EXTENSIONS)}")
+
+    def _write(self, path: Path):
+        """写入随机内容"""
+        path.write_bytes(os.urandom(self.rng.randint(0, self.max_size)))
+
+    def mutate(self, count: int):
+        """修改或新增若干文件"""
+        existing = [p for p in self.root.rglob("*") if p.is_file()]
+        for _ in range(count):
+            if existing and self.rng.random() < 0.7:
+                self._write(self.rng.choice(existing))
+            else:
+                folder = self.rng.choice([self.root] + [p for p in self.root.rglob("*") if p.is_dir()])
+                self._write(folder / f"new{self.rng.randrange(10 ** 6):06d}{self.rng.choice(_EXTENSIONS)}")
+
+    def mount(self):
+        """插入"""
+        self.mount_path.parent.mkdir(parents=True, exist_ok=True)
+        os.rename(self.parked_path, self.mount_path)
+        self.mounted = True
+        self.mounted_at = time.perf_counter()
+        self.generation += 1
+
+    def unmount(self):
+        """拔出（复制过程中拔出时，会话会在下一个目录或文件处发现设备已移除）"""
+        self.parked_path.parent.mkdir(parents=True, exist_ok=True)
+        os.rename(self.mount_path, self.parked_path)
+        self.mounted = False
+
+
+class SimulatedProvider:
+    """模拟设备提供者，替换 USBMonitor.get_usb_drives / get_usb_label"""
+
+    def __init__(self):
+        self.devices: Dict[str, SimulatedDevice] = {}
+        # 插拔、修改设备内容和正确性校验互斥
+        self.lock = threading.Lock()
+
+    def get_usb_drives(self) -> List[str]:
+        """当前插入的设备"""
+        with self.lock:
+            return [str(device.mount_path) for device in self.devices.values() if device.mounted]
+
+    def get_usb_label(self, drive_path: str) -> str:
+        """设备卷标（模拟设备的卷标唯一，因此设备指纹稳定）"""
+        device = self.devices.get(Path(drive_path).name)
+        return device.label if device else "UNLABELED"
+
+    def insert(self, device: SimulatedDevice, mutate: int = 0):
+        """插入（已插入时模拟快速重新插拔），插入前可修改部分文件"""
+        with self.lock:
+            if device.mounted:
+                device.unmount()
+            if mutate:
+                device.mutate(mutate)
+            device.mount()
+
+    def remove(self, device: SimulatedDevice):
+        """拔出"""
+        with self.lock:
+            if device.mounted:
+                device.unmount()
+
+
+class FaultInjector:
+    """替换 main.copy_file，按比例抛出I/O错误"""
+
+    def __init__(self, copy_func, mounts_dir: Path, rate: float = 0.0, seed: int = 0):
+        self.copy_func = copy_func
+        self.mounts_dir = mounts_dir
+        self.rate = rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.injected = 0
+        # 设备名 -> 注入错误的相对路径（验证通过后清空）
+        self.failed: Dict[str, Set[str]] = {}
+
+    def __call__(self, src, dest, *args, **kwargs):
+        with self._lock:
+            fail = self.rate > 0 and self.rng.random() < self.rate
+            if fail:
+                self.injected += 1
+                try:
+                    rel = Path(src).relative_to(self.mounts_dir)
+                    self.failed.setdefault(rel.parts[0], set()).add("/".join(rel.parts[1:]))
+                except ValueError:
+                    pass
+        if fail:
+            raise OSError(errno.EIO, "模拟I/O错误", str(src))
+        return self.copy_func(src, dest, *args, **kwargs)
+
+
+def synthetic_trace(duration: float, devices: int, seed: int = 0) -> List[Dict]:
+    """生成合成插拔记录：正常插拔、多设备同时到达、快速插拔、复制中拔出、I/O错误时段"""
+    rng = random.Random(seed)
+    names = [f"dev{i:02d}" for i in range(devices)]
+    events: List[Dict] = []
+    t = 0.0
+
+    while t < duration:
+        scenario = rng.choices(["normal", "burst", "flap", "pull", "errors"], [4, 2, 2, 2, 1])[0]
+        if scenario == "normal":
+            name = rng.choice(names)
+            hold = rng.uniform(5, 30)
+            events.append({"t": t, "event": "insert", "device": name, "mutate": rng.randint(0, 20)})
+            events.append({"t": t + hold, "event": "remove", "device": name})
+            t += hold * rng.uniform(0.3, 1.0)
+        elif scenario == "burst":
+            hold = rng.uniform(10, 40)
+            for name in rng.sample(names, k=min(len(names), rng.randint(2, 6))):
+                offset = rng.uniform(0, 1)
+                events.append({"t": t + offset, "event": "insert", "device": name, "mutate": rng.randint(0, 10)})
+                events.append({"t": t + offset + hold, "event": "remove", "device": name})
+            t += hold + 1
+        elif scenario == "flap":
+            name = rng.choice(names)
+            for _ in range(rng.randint(2, 5)):
+                events.append({"t": t, "event": "insert", "device": name})
+                t += rng.uniform(0.1, 2)
+                events.append({"t": t, "event": "remove", "device": name})
+                t += rng.uniform(0.1, 1)
+        elif scenario == "pull":
+            # 插入后很快拔出（通常在复制过程中），稍后重新插入继续会话
+            name = rng.choice(names)
+            events.append({"t": t, "event": "insert", "device": name, "mutate": rng.randint(0, 5)})
+            events.append({"t": t + rng.uniform(0.2, 2), "event": "remove", "device": name})
+            t += rng.uniform(3, 10)
+            events.append({"t": t, "event": "insert", "device": name})
+            events.append({"t": t + rng.uniform(10, 30), "event": "remove", "device": name})
+            t += 5
+        else:
+            period = rng.uniform(5, 20)
+            events.append({"t": t, "event": "io_errors", "rate": rng.uniform(0.05, 0.3), "duration": period})
+            t += 1
+
+    return sorted((e for e in events if e["t"] < duration), key=lambda e: e["t"])
+
+
+def trace_from_log(log_path: Path) -> List[Dict]:
+    """从生产日志还原插拔记录（设备处理开始视为插入，处理中移除的日志视为拔出）"""
+    pattern = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \[\w+\] (.*)$")
+    inserted = re.compile(r"开始处理USB设备: (.+?) \(标签: (.*?), 设备ID: (\w+)\)")
+    removed = re.compile(r"USB设备已移除，会话进度已保存: (.+)$")
+
+    events: List[Dict] = []
+    devices: Dict[str, str] = {}
+    start = None
+    with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = pattern.match(line.rstrip("\n"))
+            if not match:
+                continue
+            stamp = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S").timestamp()
+            start = stamp if start is None else start
+            message = match.group(2)
+
+            found = inserted.search(message)
+            if found:
+                # 用设备ID区分设备，不记录真实卷标和路径
+                name = devices.setdefault(found.group(1), f"dev_{found.group(3)[:8]}")
+                events.append({"t": stamp - start, "event": "insert", "device": name})
+                continue
+
+            found = removed.search(message)
+            if found and found.group(1) in devices:
+                events.append({"t": stamp - start, "event": "remove", "device": devices[found.group(1)]})
+
+    return events
+
+
+def load_trace(path: Path) -> List[Dict]:
+    """读取插拔记录（JSON Lines）"""
+    with open(path, "r", encoding="utf-8") as f:
+        return sorted((json.loads(line) for line in f if line.strip()), key=lambda e: e["t"])
+
+
+def save_trace(events: List[Dict], path: Path):
+    """保存插拔记录（JSON Lines）"""
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _rss_bytes() -> int:
+    """进程常驻内存（未安装psutil时返回0）"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+def _file_digest(path: Path) -> str:
+    """计算文件内容哈希"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class _SoakLogger:
+    """写入沙盒目录的日志（与 main.Logger 接口一致）"""
+
+    def __init__(self, log_dir: Path, verbose: bool = False):
+        self.log_dir = log_dir
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.errors = 0
+        self.logger = logging.getLogger("USBBackupSoak")
+        self.logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+        self.logger.handlers.clear()
+        handler = logging.FileHandler(self.log_dir / "soak.log", encoding="utf-8")
+        handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s',
+                                               datefmt='%Y-%m-%d %H:%M:%S'))
+        self.logger.addHandler(handler)
+
+    def info(self, message: str):
+        self.logger.info(message)
+
+    def warning(self, message: str):
+        self.logger.warning(message)
+
+    def error(self, message: str, exc: Exception = None):
+        self.errors += 1
+        self.logger.error(f"{message}: {exc}" if exc else message)
+
+    def debug(self, message: str):
+        self.logger.debug(message)
+
+
+class SoakRunner:
+    """压力测试运行器"""
+
+    def __init__(self, sandbox: Path, events: List[Dict], duration: float, speed: float = 1.0,
+                 io_error_rate: float = 0.0, check_interval: float = 30, verify_sample: int = 20,
+                 max_growth_mb: float = 50, seed: int = 0, device_files: int = 200,
+                 config_overrides: Optional[Dict] = None):
+        self.sandbox = sandbox
+        self.events = events
+        self.duration = duration
+        self.speed = speed
+        self.base_error_rate = io_error_rate
+        self.check_interval = check_interval
+        self.verify_sample = verify_sample
+        self.max_growth_mb = max_growth_mb
+        self.seed = seed
+        self.device_files = device_files
+        self.config_overrides = config_overrides or {}
+
+        self.provider = SimulatedProvider()
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.session_times: List[float] = []
+        self.samples: List[Dict] = []
+        self.failures: List[str] = []
+        self.counters = {"sessions": 0, "completed": 0, "interrupted": 0, "verified": 0,
+                         "inserts": 0, "removals": 0}
+
+    def _build_monitor(self):
+        """创建使用模拟设备的监控实例"""
+        import main
+
+        self.sandbox.mkdir(parents=True, exist_ok=True)
+        config_path = self.sandbox / "config.json"
+        config = {
+            "backup_folder": str(self.sandbox / "backup"),
+            "check_interval": 0.2,
+            "min_free_space_gb": 0,
+            "hidden_mode": True,
+            "enable_autostart": False,
+            "control_enabled": False,
+            "scrub_enabled": False,
+            "exclude_patterns": [],
+        }
+        config.update(self.config_overrides)
+        config_path.write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        self.logger = _SoakLogger(self.sandbox / "logs")
+        monitor = main.USBMonitor(self.logger, main.ConfigManager(str(config_path)))
+        monitor.get_usb_drives = self.provider.get_usb_drives
+        monitor.get_usb_label = self.provider.get_usb_label
+
+        # 注入I/O错误
+        self._original_copy = main.copy_file
+        self.injector = FaultInjector(main.copy_file, self.sandbox / "mounts", self.base_error_rate, self.seed)
+        main.copy_file = self.injector
+
+        # 记录每个会话的延迟和结果
+        original = monitor.copy_usb_files
+
+        def instrumented(usb_path: str, *args, **kwargs):
+            device = self.provider.devices.get(Path(usb_path).name)
+            generation = device.generation if device else 0
+            device_id = monitor.devices.identify(usb_path).device_id
+            resumed = monitor.checkpoints.load(device_id) is not None
+            started = time.perf_counter()
+            original(usb_path, *args, **kwargs)
+            finished = time.perf_counter()
+            with self._lock:
+                self.counters["sessions"] += 1
+                self.session_times.append(finished - started)
+            if device is not None:
+                self._after_session(monitor, device, device_id, generation, finished, resumed)
+
+        monitor.copy_usb_files = instrumented
+        return monitor
+
+    def _device(self, event: Dict) -> SimulatedDevice:
+        """获取或创建模拟设备"""
+        name = event["device"]
+        device = self.provider.devices.get(name)
+        if device is None:
+            device = SimulatedDevice(name, self.sandbox, self.rng.randrange(2 ** 32),
+                                     files=event.get("files", self.device_files))
+            device.generate()
+            self.provider.devices[name] = device
+        return device
+
+    def _apply(self, event: Dict):
+        """执行一个插拔事件"""
+        kind = event["event"]
+        if kind == "io_errors":
+            self.injector.rate = event.get("rate", 0.1)
+            restore = threading.Timer(event.get("duration", 10) / self.speed,
+                                      lambda: setattr(self.injector, "rate", self.base_error_rate))
+            restore.daemon = True
+            restore.start()
+            return
+
+        device = self._device(event)
+        if kind == "insert":
+            self.provider.insert(device, event.get("mutate", 0))
+            self.counters["inserts"] += 1
+        elif kind == "remove":
+            self.provider.remove(device)
+            self.counters["removals"] += 1
+
+    def _after_session(self, monitor, device: SimulatedDevice, device_id: str, generation: int,
+                       finished: float, resumed: bool = False):
+        """会话结束后记录延迟并检查备份正确性"""
+        if monitor.checkpoints.load(device_id) is not None:
+            # 会话中断（断点仍在），下次插入时继续
+            self.counters["interrupted"] += 1
+            return
+
+        self.counters["completed"] += 1
+        self.latencies.append(finished - device.mounted_at)
+
+        with self.provider.lock:
+            # 会话期间设备被重新插拔（可能同时修改了文件），本次不校验
+            if device.generation != generation:
+                return
+            # 续传的会话只重新检查中断后修改时间有变化的目录，已完成目录中原地修改的文件
+            # 要到下一个会话才会备份，不比较哈希
+            self._verify(monitor, device, device_id, check_hashes=not resumed)
+
+    def _verify(self, monitor, device: SimulatedDevice, device_id: str, check_hashes: bool = True):
+        """比较设备上应备份的文件与目录记录和备份内容"""
+        latest: Dict[str, Dict] = {}
+        for entry in monitor.catalog.iter_device(device_id):
+            latest[entry["source"]] = entry
+
+        failed = self.injector.failed.pop(device.name, set())
+        expected = []
+        root = device.root
+        for path in root.rglob("*"):
+            if not path.is_file():
+                continue
+            rel = path.relative_to(root).as_posix()
+            should_copy, _ = monitor.should_copy_file(path)
+            if should_copy and rel not in failed:
+                expected.append((rel, path))
+
+        try:
+            for rel, path in expected:
+                entry = latest.get(rel)
+                if entry is None:
+                    self.failures.append(f"{device.name}: 缺少备份记录 {rel}")
+                elif check_hashes and entry["sha256"] != _file_digest(path):
+                    self.failures.append(f"{device.name}: 备份记录的哈希与源文件不一致 {rel}")
+
+            # 抽样检查备份文件内容
+            for rel, _ in self.rng.sample(expected, min(self.verify_sample, len(expected))):
+                entry = latest.get(rel)
+                if entry is None:
+                    continue
+                stored = monitor.targets.locate(entry["path"], entry.get("target", ""))
+                if stored is None:
+                    self.failures.append(f"{device.name}: 备份文件不存在 {entry['path']}")
+                elif _file_digest(stored) != entry["sha256"]:
+                    self.failures.append(f"{device.name}: 备份文件内容损坏 {entry['path']}")
+        except OSError:
+            # 校验过程中设备被拔出，跳过本次校验
+            return
+
+        self.counters["verified"] += 1
+
+    def _sample(self, started: float):
+        """记录内存和线程数"""
+        self.samples.append({
+            "t": time.perf_counter() - started,
+            "rss_mb": _rss_bytes() / 1024 / 1024,
+            "threads": threading.active_count(),
+        })
+
+    def run(self) -> Dict:
+        """运行压力测试，返回报告"""
+        monitor = self._build_monitor()
+        monitor.running = True
+        thread = threading.Thread(target=monitor.monitor_loop, name="SoakMonitor", daemon=True)
+        thread.start()
+
+        started = time.perf_counter()
+        next_check = 0.0
+        pending = list(self.events)
+        trace_length = max((e["t"] for e in self.events), default=0) + 1
+        offset = 0.0
+
+        try:
+            while True:
+                elapsed = (time.perf_counter() - started) * self.speed
+                if elapsed >= self.duration:
+                    break
+
+                # 插拔记录播放完后循环重放
+                if not pending and self.events:
+                    offset += trace_length
+                    pending = [dict(e, t=e["t"] + offset) for e in self.events]
+
+                while pending and pending[0]["t"] <= elapsed:
+                    self._apply(pending.pop(0))
+
+                if elapsed >= next_check:
+                    self._sample(started)
+                    next_check = elapsed + self.check_interval * self.speed
+
+                time.sleep(0.05)
+        except KeyboardInterrupt:
+            print("[信息] 提前结束压力测试")
+        finally:
+            monitor.stop_token.cancel("压力测试结束")
+            thread.join(timeout=30)
+            monitor.stop()
+
+            import main
+            main.copy_file = self._original_copy
+
+        self._sample(started)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, wall_time: float) -> Dict:
+        """汇总结果并判断是否通过"""
+        problems = list(self.failures[:50])
+
+        rss = [s["rss_mb"] for s in self.samples if s["rss_mb"]]
+        growth = 0.0
+        if len(rss) > _WARMUP_SAMPLES * 2:
+            window = max(1, len(rss) // 5)
+            baseline = sorted(rss[_WARMUP_SAMPLES:_WARMUP_SAMPLES + window])[window // 2]
+            final = sorted(rss[-window:])[window // 2]
+            growth = final - baseline
+            if growth > self.max_growth_mb:
+                problems.append(f"内存增长{growth:.1f}MB，超过上限{self.max_growth_mb}MB")
+
+        threads = [s["threads"] for s in self.samples]
+        if len(threads) > _WARMUP_SAMPLES * 2:
+            import main
+            # 复制线程池、控制和限速线程之外不应持续增加
+            baseline = max(threads[:_WARMUP_SAMPLES])
+            if min(threads[-_WARMUP_SAMPLES:]) > baseline + main.MAX_COPY_WORKERS:
+                problems.append(f"线程数持续增长: {baseline} -> {threads[-1]}")
+
+        return {
+            "passed": not problems,
+            "problems": problems,
+            "wall_time": wall_time,
+            "counters": self.counters,
+            "io_errors_injected": self.injector.injected,
+            "logged_errors": self.logger.errors,
+            "latency": {p: percentile(self.latencies, p) for p in (50, 90, 99)},
+            "session_time": {p: percentile(self.session_times, p) for p in (50, 90, 99)},
+            "memory_growth_mb": growth,
+            "max_threads": max(threads, default=0),
+            "samples": self.samples,
+        }
+
+
+def format_report(report: Dict) -> str:
+    """格式化报告"""
+    counters = report["counters"]
+    lines = [
+        "压力测试结果: " + ("通过" if report["passed"] else "失败"),
+        f"  运行时间: {report['wall_time']:.0f}秒",
+        f"  插入{counters['inserts']}次, 拔出{counters['removals']}次, 会话{counters['sessions']}个 "
+        f"(完成{counters['completed']}, 中断{counters['interrupted']}, 已校验{counters['verified']})",
+        f"  注入I/O错误: {report['io_errors_injected']}次, 错误日志: {report['logged_errors']}条",
+        "  插入到完成延迟: " + ", ".join(f"p{p} {v:.2f}s" for p, v in report["latency"].items()),
+        "  会话耗时: " + ", ".join(f"p{p} {v:.2f}s" for p, v in report["session_time"].items()),
+        f"  内存增长: {report['memory_growth_mb']:.1f}MB, 最大线程数: {report['max_threads']}",
+    ]
+    for problem in report["problems"]:
+        lines.append(f"  [问题] {problem}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="USB备份系统压力测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="运行压力测试")
+    run.add_argument("--trace", help="插拔记录文件（JSON Lines），不指定时生成合成记录")
+    run.add_argument("--duration", type=float, default=600, help="运行时长（记录时间，秒）")
+    run.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    run.add_argument("--devices", type=int, default=8, help="合成记录的设备数")
+    run.add_argument("--files", type=int, default=200, help="每个模拟设备的文件数")
+    run.add_argument("--io-error-rate", type=float, default=0.0, help="基础I/O错误比例")
+    run.add_argument("--check-interval", type=float, default=30, help="采样间隔（秒）")
+    run.add_argument("--verify-sample", type=int, default=20, help="每次会话抽样校验的备份文件数")
+    run.add_argument("--max-growth-mb", type=float, default=50, help="允许的内存增长（MB）")
+    run.add_argument("--workdir", help="沙盒目录（默认使用临时目录）")
+    run.add_argument("--keep", action="store_true", help="保留沙盒目录")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--report", help="报告输出文件（JSON）")
+
+    synth = sub.add_parser("synth", help="生成合成插拔记录")
+    synth.add_argument("--duration", type=float, default=3600)
+    synth.add_argument("--devices", type=int, default=8)
+    synth.add_argument("--seed", type=int, default=0)
+    synth.add_argument("-o", "--output", required=True)
+
+    convert = sub.add_parser("convert-log", help="从生产日志还原插拔记录")
+    convert.add_argument("log")
+    convert.add_argument("-o", "--output", required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "synth":
+        events = synthetic_trace(args.duration, args.devices, args.seed)
+        save_trace(events, Path(args.output))
+        print(f"[成功] 已生成{len(events)}个事件: {args.output}")
+        return 0
+
+    if args.command == "convert-log":
+        events = trace_from_log(Path(args.log))
+        save_trace(events, Path(args.output))
+        print(f"[成功] 已还原{len(events)}个事件: {args.output}")
+        return 0
+
+    events = load_trace(Path(args.trace)) if args.trace else synthetic_trace(args.duration, args.devices, args.seed)
+    sandbox = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="usb_soak_"))
+    print(f"[信息] 沙盒目录: {sandbox}")
+
+    runner = SoakRunner(
+        sandbox, events, args.duration, speed=args.speed, io_error_rate=args.io_error_rate,
+        check_interval=args.check_interval, verify_sample=args.verify_sample,
+        max_growth_mb=args.max_growth_mb, seed=args.seed, device_files=args.files
+    )
+    try:
+        report = runner.run()
+    finally:
+        if not args.keep:
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+    print(format_report(report))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+备份目标模块
+管理多个备份目标卷（权重、各自的最小剩余空间），为新会话选择余量最大、负载最低的目标，
+目标空间不足时溢出到其他目标，并在所有目标中查找已备份的文件
+"""
+
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+GB = 1024 ** 3
+
+
+class BackupTarget:
+    """单个备份目标"""
+
+    def __init__(self, path: Path, weight: float = 1.0, min_free_space_gb: float = 5):
+        self.path = Path(path)
+        self.weight = max(0.0, float(weight))
+        self.min_free_bytes = int(min_free_space_gb * GB)
+        # 正在写入该目标的会话数
+        self.active_sessions = 0
+
+    @property
+    def key(self) -> str:
+        """目录中记录的目标标识"""
+        return str(self.path)
+
+    def free_bytes(self) -> int:
+        """剩余空间（目标不可用时返回-1）"""
+        try:
+            return shutil.disk_usage(self.path).free
+        except OSError:
+            return -1
+
+    def headroom(self) -> int:
+        """高于最小剩余空间的余量（字节，不可用时为负数）"""
+        free = self.free_bytes()
+        return free - self.min_free_bytes if free >= 0 else -1
+
+
+class TargetSet:
+    """备份目标集合"""
+
+    def __init__(self, targets: List[BackupTarget]):
+        self.targets = targets
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, primary: Path) -> "TargetSet":
+        """根据配置创建（backup_folder始终是第一个目标）"""
+        default_min_free = config.get("min_free_space_gb", 5)
+        primary_target = BackupTarget(primary, 1.0, default_min_free)
+        targets = [primary_target]
+
+        for item in config.get("backup_targets", []):
+            if isinstance(item, str):
+                item = {"path": item}
+            if not item.get("path"):
+                continue
+
+            target = BackupTarget(item["path"], item.get("weight", 1.0),
+                                  item.get("min_free_space_gb", default_min_free))
+            # 列表中包含backup_folder时只更新它的权重和剩余空间
+            if _same_path(target.path, primary):
+                primary_target.weight = target.weight
+                primary_target.min_free_bytes = target.min_free_bytes
+            elif not any(_same_path(target.path, t.path) for t in targets):
+                targets.append(target)
+
+        return cls(targets)
+
+    def prepare(self, logger):
+        """创建目标目录"""
+        for target in self.targets:
+            try:
+                target.path.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"备份目标不可用 {target.path}: {e}")
+
+    def choose(self, needed: int = 0, exclude: Iterable[BackupTarget] = ()) -> Optional[BackupTarget]:
+        """选择余量足够的目标：按 余量 × 权重 / (1 + 正在写入的会话数) 取最大"""
+        excluded = {id(t) for t in exclude}
+        best, best_score = None, -1.0
+        with self._lock:
+            for target in self.targets:
+                if id(target) in excluded:
+                    continue
+                headroom = target.headroom()
+                if headroom <= needed:
+                    continue
+                score = headroom * target.weight / (1 + target.active_sessions)
+                if score > best_score:
+                    best, best_score = target, score
+        return best
+
+    def get(self, key: str) -> Optional[BackupTarget]:
+        """根据标识查找目标"""
+        for target in self.targets:
+            if target.key == key:
+                return target
+        return None
+
+    def acquire(self, target: BackupTarget):
+        """登记会话开始写入目标"""
+        with self._lock:
+            target.active_sessions += 1
+
+    def release(self, target: BackupTarget):
+        """登记会话结束写入目标"""
+        with self._lock:
+            target.active_sessions = max(0, target.active_sessions - 1)
+
+    def locate(self, rel_path: str, hint: str = "") -> Optional[Path]:
+        """查找已备份文件所在的位置（优先检查目录中记录的目标）"""
+        hinted = self.get(hint) if hint else None
+        ordered = ([hinted] if hinted else []) + [t for t in self.targets if t is not hinted]
+        for target in ordered:
+            path = target.path / rel_path
+            if path.exists():
+                return path
+        return None
+
+    def summary(self) -> List[Dict]:
+        """各目标状态"""
+        return [
+            {
+                "path": target.key,
+                "weight": target.weight,
+                "free_gb": target.free_bytes() / GB,
+                "min_free_space_gb": target.min_free_bytes / GB,
+                "active_sessions": target.active_sessions,
+            }
+            for target in self.targets
+        ]
+
+
+def _same_path(a: Path, b: Path) -> bool:
+    """是否为同一路径"""
+    try:
+        return Path(a).resolve() == Path(b).resolve()
+    except OSError:
+        return Path(a) == Path(b)
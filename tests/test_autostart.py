@@ -0,0 +1,75 @@
+"""
+自启动测试
+按内容摘要检查启动脚本与预期是否一致，设置未变化时不重写文件
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from autostart import EnhancedAutoStartManager
+
+
+class AutoStartDriftTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.cwd = os.getcwd()
+        # 自启动配置文件位于当前目录
+        os.chdir(self.tmp)
+        self.startup = self.tmp / "Startup"
+        self.startup.mkdir()
+        Path("autostart_config.json").write_text(json.dumps({"startup_folder": str(self.startup)}),
+                                                 encoding="utf-8")
+        self.exe = self.tmp / "USBBackup.exe"
+        self.exe.write_bytes(b"")
+        self.manager = EnhancedAutoStartManager()
+        self.bat = self.startup / "USBBackup.bat"
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_setup_is_idempotent(self):
+        ok, message = self.manager.setup_autostart(str(self.exe), "--quiet")
+        self.assertTrue(ok, message)
+        self.assertEqual(self.manager.verify_autostart(), (True, []))
+
+        os.utime(self.bat, (1, 1))
+        ok, message = self.manager.setup_autostart(str(self.exe), "--quiet")
+        self.assertIn("已是最新", message)
+        # 未重写启动脚本
+        self.assertEqual(self.bat.stat().st_mtime, 1)
+
+    def test_edited_launcher_is_reported_and_repaired(self):
+        self.manager.setup_autostart(str(self.exe))
+        self.bat.write_bytes(self.bat.read_bytes() + b"REM edited\r\n")
+
+        ok, drift = self.manager.verify_autostart()
+        self.assertFalse(ok)
+        self.assertTrue(any("内容与预期不一致" in d for d in drift))
+
+        ok, message = self.manager.setup_autostart(str(self.exe))
+        self.assertIn("设置成功", message)
+        self.assertEqual(self.manager.verify_autostart(), (True, []))
+
+    def test_changed_args_and_missing_program_are_drift(self):
+        self.manager.setup_autostart(str(self.exe))
+        ok, drift = self.manager.verify_autostart(args="--other")
+        self.assertFalse(ok)
+        self.assertTrue(any("args" in d for d in drift))
+
+        self.exe.unlink()
+        ok, drift = self.manager.verify_autostart()
+        self.assertTrue(any("程序文件不存在" in d for d in drift))
+
+    def test_verify_without_setup(self):
+        self.assertEqual(self.manager.verify_autostart(), (False, ["尚未设置自启动"]))
+        self.assertFalse(self.bat.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+"""
+断点续传测试
+会话中途被强制结束后继续，已完成目录中的文件不应重复复制
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import main
+from checkpoint import CheckpointStore, SessionCheckpoint
+
+
+class _Logger:
+    """丢弃日志"""
+
+    def debug(self, message):
+        pass
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message, error=None):
+        pass
+
+
+class _Killed(BaseException):
+    """模拟进程被强制结束（不经过会话的异常处理，只保留已定期保存的进度）"""
+
+
+class CheckpointStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.store = CheckpointStore(self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_resume_keeps_pending_stack_and_completed_dirs(self):
+        (self.tmp / "usb" / "a").mkdir(parents=True)
+        (self.tmp / "usb" / "b").mkdir()
+        checkpoint = SessionCheckpoint("dev", "20260101")
+        checkpoint.complete_dir("", ["a", "b"], os.stat(self.tmp / "usb").st_mtime_ns)
+        checkpoint.complete_dir("a", [], os.stat(self.tmp / "usb" / "a").st_mtime_ns)
+        checkpoint.mark_file_done("b/1.txt")
+        self.assertTrue(self.store.save(checkpoint))
+
+        loaded = self.store.load("dev")
+        self.assertEqual(loaded.pending_dirs, ["b"])
+        self.assertEqual(loaded.done_files, {"b/1.txt"})
+        self.assertEqual(loaded.dirs_completed, 2)
+        self.assertEqual(set(loaded.completed), {"", "a"})
+        self.assertEqual(loaded.changed_dirs(self.tmp / "usb"), set())
+
+        # 中断后在已完成的目录中新增文件
+        (self.tmp / "usb" / "a" / "new.txt").write_text("x")
+        changed = loaded.changed_dirs(self.tmp / "usb")
+        self.assertEqual(changed, {"a"})
+        loaded.recheck(changed)
+        self.assertEqual(loaded.pending_dirs, ["a", "b"])
+
+    def test_new_session_truncates_previous_log(self):
+        first = SessionCheckpoint("dev", "20260101")
+        first.complete_dir("", ["old"], 1)
+        self.store.save(first)
+
+        second = SessionCheckpoint("dev", "20260102")
+        self.store.save(second)
+        self.assertEqual(self.store.load("dev").completed, {})
+
+    def test_before_save_runs_before_checkpoint_is_written(self):
+        path = self.store._path_for("dev")
+        seen = []
+        checkpoint = SessionCheckpoint("dev", "20260101")
+        self.assertTrue(self.store.maybe_save(checkpoint, lambda: seen.append(path.exists())))
+        self.assertEqual(seen, [False])
+
+    def test_discard_removes_checkpoint_and_log(self):
+        checkpoint = SessionCheckpoint("dev", "20260101")
+        checkpoint.complete_dir("", [], 1)
+        self.store.save(checkpoint)
+        self.store.discard("dev")
+        self.assertIsNone(self.store.load("dev"))
+        self.assertEqual(list(self.store.sessions_dir.iterdir()), [])
+
+
+class KilledSessionResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.usb = self.tmp / "usb"
+        for d in range(6):
+            folder = self.usb / f"dir{d}"
+            folder.mkdir(parents=True)
+            for f in range(8):
+                (folder / f"file{f}.txt").write_text(f"{d}-{f}")
+        self.backup = self.tmp / "backup"
+        self.monitors = []
+
+    def tearDown(self):
+        for monitor in self.monitors:
+            monitor.running = True
+            monitor.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def make_monitor(self, durability: str):
+        config_path = self.tmp / "config.json"
+        config_path.write_text(json.dumps({
+            "backup_folder": str(self.backup), "keywords": [".txt"], "min_free_space_gb": 0,
+            "enable_autostart": False, "control_enabled": False, "scrub_enabled": False,
+            "cold_tier_enabled": False, "durability": durability, "exclude_patterns": []
+        }), encoding="utf-8")
+        monitor = main.USBMonitor(_Logger(), main.ConfigManager(str(config_path)))
+        monitor.get_usb_label = lambda path: "TESTUSB"
+        monitor.checkpoints.save_every_files = 5
+        self.monitors.append(monitor)
+        return monitor
+
+    def kill_after(self, monitor, count: int):
+        """记录count个文件后强制结束会话"""
+        original = monitor.catalog.record
+        calls = []
+
+        def record(*args, **kwargs):
+            calls.append(args)
+            if len(calls) > count:
+                raise _Killed()
+            return original(*args, **kwargs)
+
+        monitor.catalog.record = record
+
+    def backed_up(self):
+        return sorted(p.name for p in self.backup.glob("TESTUSB_*/*/*/*.txt"))
+
+    def run_killed_then_resumed(self, durability: str):
+        first = self.make_monitor(durability)
+        self.kill_after(first, 20)
+        with self.assertRaises(_Killed):
+            first.copy_usb_files(str(self.usb))
+        fingerprint = first.devices.identify(str(self.usb))
+        device_id = fingerprint.device_id
+        checkpoint = first.checkpoints.load(device_id)
+        self.assertIsNotNone(checkpoint)
+
+        # 断点中已完成的目录，其文件都已保存在清单中
+        manifest = first.device_states.load(fingerprint).manifest
+        completed = [d for d in checkpoint.completed if d]
+        self.assertTrue(completed)
+        for rel_dir in completed:
+            for f in range(8):
+                self.assertIn(f"{rel_dir}/file{f}.txt", manifest)
+
+        # 重新启动后继续
+        second = self.make_monitor(durability)
+        second.copy_usb_files(str(self.usb))
+        self.assertIsNone(second.checkpoints.load(device_id))
+
+        names = self.backed_up()
+        self.assertFalse([n for n in names if "_1" in n])
+        self.assertEqual(len(names), 48)
+        sources = {entry["source"] for entry in second.catalog.iter_device(device_id)}
+        self.assertEqual(len(sources), 48)
+
+    def test_resume_after_kill_does_not_duplicate_batched(self):
+        self.run_killed_then_resumed("batched")
+
+    def test_resume_after_kill_does_not_duplicate_per_file(self):
+        self.run_killed_then_resumed("none")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+冷存储测试
+归档后删除原文件并记录索引，可单独提取文件；超出预算时删除最旧的归档并更新索引
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from coldtier import ColdTier
+from inventory import InventoryRecord
+
+
+class _Logger:
+    """丢弃日志"""
+
+    def info(self, message):
+        pass
+
+    def error(self, message, error=None):
+        pass
+
+
+class ColdTierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.cold = ColdTier(self.tmp / "cold", self.tmp / "state", _Logger(), compression="deflate")
+        self.mtime = 1577836800.0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def make_files(self, root: Path, date: str, count: int):
+        records = []
+        for i in range(count):
+            path = root / "dev" / date / f"file{i}.txt"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f"{root.name}-{date}-{i}" * 100)
+            os.utime(path, (self.mtime, self.mtime))
+            records.append(InventoryRecord(path, path.stat().st_size, self.mtime))
+        return records
+
+    def test_compact_removes_originals_and_extracts(self):
+        root = self.tmp / "backup"
+        records = self.make_files(root, "20200101", 3)
+        result = self.cold.compact(root, records)
+
+        self.assertEqual(result["files_archived"], 3)
+        self.assertEqual(result["errors"], 0)
+        self.assertFalse(any(r.path.exists() for r in records))
+        self.assertTrue((self.tmp / "cold" / "dev" / "20200101.zip").exists())
+
+        entries = self.cold.find("20200101/file1.txt")
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["target"], str(root))
+        dest = self.cold.extract(entries[0], self.tmp / "out")
+        self.assertEqual(dest.read_text(), "backup-20200101-1" * 100)
+        self.assertEqual(dest.stat().st_mtime, self.mtime)
+
+    def test_find_by_target(self):
+        first, second = self.tmp / "a", self.tmp / "b"
+        self.cold.compact(first, self.make_files(first, "20200101", 1))
+        self.cold.compact(second, self.make_files(second, "20200101", 1))
+
+        entries = self.cold.find("file0.txt")
+        self.assertEqual({e["target"] for e in entries}, {str(first), str(second)})
+        # 两个备份目标写入不同的归档
+        self.assertEqual(len({e["archive"] for e in entries}), 2)
+        only_second = self.cold.find("file0.txt", str(second))
+        self.assertEqual(len(only_second), 1)
+        self.assertEqual(self.cold.extract(only_second[0], self.tmp / "out").read_text(), "b-20200101-0" * 100)
+
+    def test_enforce_budget_deletes_oldest_and_rewrites_index(self):
+        root = self.tmp / "backup"
+        self.cold.compact(root, self.make_files(root, "20200101", 2))
+        old_archive = self.tmp / "cold" / "dev" / "20200101.zip"
+        os.utime(old_archive, (self.mtime, self.mtime))
+        self.cold.compact(root, self.make_files(root, "20200102", 2))
+        new_size = (self.tmp / "cold" / "dev" / "20200102.zip").stat().st_size
+
+        result = self.cold.enforce_budget(new_size)
+        self.assertEqual(result["archives_deleted"], 1)
+        self.assertFalse(old_archive.exists())
+        self.assertEqual({e["archive"] for e in self.cold.iter_index()}, {"dev/20200102.zip"})
+        self.assertFalse(self.cold.index_path.with_suffix(".tmp").exists())
+        self.assertEqual(self.cold.find("20200101/file0.txt"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
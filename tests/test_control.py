@@ -0,0 +1,65 @@
+"""
+控制端点测试
+不发送数据的客户端不阻塞其他连接和停止，密钥错误的客户端被拒绝
+"""
+
+import shutil
+import tempfile
+import time
+import unittest
+from multiprocessing.connection import AuthenticationError, Client
+from pathlib import Path
+
+from control import ControlServer, control_address, send_command
+
+
+class _Logger:
+    """丢弃日志"""
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message, error=None):
+        pass
+
+
+class ControlServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = Path(tempfile.mkdtemp())
+        self.received = []
+        self.server = ControlServer(self.state_dir, self.handler, _Logger())
+        self.assertTrue(self.server.start())
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    def handler(self, command, args):
+        self.received.append(command)
+        return {"ok": True, "message": command}
+
+    def test_silent_client_does_not_block(self):
+        silent = Client(control_address(self.state_dir))
+        try:
+            self.assertEqual(send_command(self.state_dir, "pause"), {"ok": True, "message": "pause"})
+            started = time.monotonic()
+            self.server.stop()
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertFalse(self.server._thread.is_alive())
+        finally:
+            silent.close()
+        self.assertEqual(self.received, ["pause"])
+
+    def test_wrong_key_is_rejected(self):
+        with self.assertRaises(AuthenticationError):
+            Client(control_address(self.state_dir), authkey=b"wrong").close()
+        self.assertEqual(send_command(self.state_dir, "status")["message"], "status")
+        self.assertEqual(self.received, ["status"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+目录摘要树测试
+修改时间未变化的目录沿用上次的子目录，刚修改的目录和配置变化后的摘要不可信
+"""
+
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from dirtree import DirSummaryTree, DirTreeStore
+
+# 足够早、不在稳定窗口内的修改时间
+_OLD_NS = 1_600_000_000 * 1_000_000_000
+
+
+class DirSummaryTreeTest(unittest.TestCase):
+
+    def make_tree(self, digest="sel"):
+        tree = DirSummaryTree(digest)
+        tree.record("", _OLD_NS, 2, ["a"])
+        tree.record("a", _OLD_NS + 1, 1, [])
+        tree.compute_hashes()
+        return tree
+
+    def test_lookup_requires_same_mtime(self):
+        tree = self.make_tree()
+        self.assertEqual(tree.lookup("", _OLD_NS), ["a"])
+        self.assertIsNone(tree.lookup("", _OLD_NS + 5))
+        self.assertIsNone(tree.lookup("missing", _OLD_NS))
+
+    def test_recently_modified_dir_is_not_trusted(self):
+        tree = DirSummaryTree()
+        now = time.time_ns()
+        tree.record("fresh", now, 0, [])
+        self.assertIsNone(tree.lookup("fresh", now))
+
+    def test_invalidate_forces_relisting(self):
+        tree = self.make_tree()
+        tree.invalidate("a")
+        self.assertIsNone(tree.lookup("a", _OLD_NS + 1))
+
+    def test_child_change_changes_root_hash(self):
+        first = self.make_tree().root_hash
+        self.assertEqual(self.make_tree().root_hash, first)
+
+        tree = self.make_tree()
+        tree.record("a", _OLD_NS + 2, 1, [])
+        self.assertNotEqual(tree.compute_hashes(), first)
+
+
+class DirTreeStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.store = DirTreeStore(self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_round_trip_and_selection_digest(self):
+        tree = DirSummaryTree("sel")
+        tree.record("", _OLD_NS, 1, ["a"])
+        tree.compute_hashes()
+        self.assertTrue(self.store.save("dev", tree))
+
+        loaded = self.store.load("dev", "sel")
+        self.assertEqual(loaded.lookup("", _OLD_NS), ["a"])
+        self.assertEqual(loaded.root_hash, tree.root_hash)
+        # 影响文件选择的配置变化后不沿用旧摘要
+        self.assertEqual(self.store.load("dev", "other").entries, {})
+
+    def test_corrupt_file_gives_empty_tree(self):
+        self.store.trees_dir.mkdir(parents=True)
+        self.store._path_for("dev").write_text("{", encoding="utf-8")
+        self.assertEqual(self.store.load("dev", "sel").entries, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
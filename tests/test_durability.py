@@ -0,0 +1,99 @@
+"""
+持久化批次测试
+成批同步后临时文件重命名为正式文件并结束日志记录，放弃的批次删除临时文件
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from durability import DurabilityPolicy, SyncBatch, syncfs_available
+from journal import part_path
+
+
+class _Journal:
+    """记录结束的日志记录"""
+
+    def __init__(self):
+        self.finished = []
+
+    def finish(self, dest, completed):
+        self.finished.append((Path(dest).name, completed))
+
+
+class SyncBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.journal = _Journal()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def make_batch(self, syncfs=True, batch_files=64):
+        return SyncBatch(DurabilityPolicy("batched", batch_files=batch_files, syncfs=syncfs), self.journal)
+
+    def add_files(self, batch, count):
+        dests = []
+        for i in range(count):
+            dest = self.tmp / f"dir{i % 2}" / f"file{i}.txt"
+            dest.parent.mkdir(exist_ok=True)
+            part_path(dest).write_text(f"data{i}")
+            batch.add(dest, i)
+            dests.append(dest)
+        return dests
+
+    def check_sync_renames(self, syncfs):
+        batch = self.make_batch(syncfs)
+        dests = self.add_files(batch, 5)
+        results = batch.sync()
+
+        self.assertEqual(sorted(results), [(i, None) for i in range(5)])
+        for i, dest in enumerate(dests):
+            self.assertEqual(dest.read_text(), f"data{i}")
+            self.assertFalse(part_path(dest).exists())
+        self.assertEqual(sorted(self.journal.finished), sorted((d.name, True) for d in dests))
+        self.assertEqual(len(batch), 0)
+
+    def test_sync_renames_with_file_fsync(self):
+        self.check_sync_renames(False)
+
+    @unittest.skipUnless(syncfs_available(), "当前平台不支持syncfs")
+    def test_sync_renames_with_syncfs(self):
+        self.check_sync_renames(True)
+
+    def test_missing_part_is_reported_and_aborted(self):
+        batch = self.make_batch(syncfs=False)
+        dests = self.add_files(batch, 3)
+        part_path(dests[1]).unlink()
+        results = dict(batch.sync())
+
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], OSError)
+        self.assertFalse(dests[1].exists())
+        self.assertIn((dests[1].name, False), self.journal.finished)
+
+    def test_discard_removes_parts(self):
+        batch = self.make_batch()
+        dests = self.add_files(batch, 4)
+        batch.discard()
+
+        for dest in dests:
+            self.assertFalse(dest.exists())
+            self.assertFalse(part_path(dest).exists())
+        self.assertEqual(sorted(self.journal.finished), sorted((d.name, False) for d in dests))
+        self.assertEqual(batch.sync(), [])
+
+    def test_due_after_batch_files(self):
+        batch = self.make_batch(batch_files=3)
+        self.assertFalse(batch.due)
+        self.add_files(batch, 2)
+        batch.policy.batch_ms = 60 * 1000
+        self.assertFalse(batch.due)
+        self.add_files(batch, 1)
+        self.assertTrue(batch.due)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+排除规则测试
+名称、通配符、锚定路径、只匹配目录的规则和最大深度，以及每条规则的统计
+"""
+
+import unittest
+
+from exclusion import ExclusionEngine
+
+
+class ExclusionEngineTest(unittest.TestCase):
+
+    def test_plain_names_match_at_any_depth(self):
+        engine = ExclusionEngine(folders=["System Volume Information"], patterns=["Thumbs.db", "cache/"])
+        self.assertEqual(engine.match("System Volume Information", "System Volume Information", True, 1),
+                         "name:System Volume Information")
+        self.assertIsNotNone(engine.match("a/b/Thumbs.db", "Thumbs.db", False, 2))
+        self.assertIsNotNone(engine.match("a/cache", "cache", True, 2))
+        # 只匹配目录的名称不排除同名文件
+        self.assertIsNone(engine.match("a/cache", "cache", False, 1))
+        # 排除文件夹列表中的名称不排除同名文件
+        self.assertIsNone(engine.match("System Volume Information", "System Volume Information", False, 0))
+
+    def test_anchored_rules_match_full_path(self):
+        engine = ExclusionEngine(patterns=["/DCIM/tmp", "photos/*.raw"])
+        self.assertEqual(engine.match("DCIM/tmp", "tmp", True, 2), "/DCIM/tmp")
+        self.assertIsNone(engine.match("other/DCIM/tmp", "tmp", True, 3))
+        self.assertIsNone(engine.match("tmp", "tmp", True, 1))
+        self.assertEqual(engine.match("photos/a.raw", "a.raw", False, 1), "photos/*.raw")
+        self.assertIsNone(engine.match("x/photos/a.raw", "a.raw", False, 2))
+
+    def test_wildcard_and_dir_only_rules(self):
+        engine = ExclusionEngine(patterns=["*.tmp", "build*/", "~$*"])
+        self.assertEqual(engine.match("a/x.tmp", "x.tmp", False, 1), "*.tmp")
+        self.assertEqual(engine.match("a/x.tmp", "x.tmp", True, 2), "*.tmp")
+        self.assertEqual(engine.match("build-1", "build-1", True, 1), "build*/")
+        self.assertIsNone(engine.match("build.txt", "build.txt", False, 0))
+        self.assertEqual(engine.match("~$doc.docx", "~$doc.docx", False, 0), "~$*")
+
+    def test_max_depth_prunes_directories_only(self):
+        engine = ExclusionEngine(max_depth=2)
+        self.assertIsNone(engine.match("a/b", "b", True, 2))
+        self.assertEqual(engine.match("a/b/c", "c", True, 3), "max_depth")
+        # 深度限制只剪除目录，已列出目录中的文件不受影响
+        self.assertIsNone(engine.match("a/b/f.txt", "f.txt", False, 3))
+
+    def test_hidden_names(self):
+        engine = ExclusionEngine(exclude_hidden=True)
+        self.assertEqual(engine.match(".git", ".git", True, 1, entry=object()), "hidden")
+        self.assertIsNone(engine.match("git", "git", True, 1, entry=object()))
+
+    def test_summary_counts_dirs_and_files(self):
+        engine = ExclusionEngine(patterns=["*.tmp", "cache/"])
+        engine.match("a.tmp", "a.tmp", False, 0)
+        engine.match("b.tmp", "b.tmp", False, 0)
+        engine.match("cache", "cache", True, 1)
+        engine.match("d/cache", "cache", True, 2)
+        engine.match("d/cache", "cache", True, 2)
+        self.assertEqual(engine.summary(), [("name:cache", 3, 0), ("*.tmp", 0, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
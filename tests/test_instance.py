@@ -0,0 +1,113 @@
+"""
+单实例测试
+第二个实例不再启动监控，把命令行请求转交给持有锁的实例；重新加载配置时格式错误的文件不覆盖当前配置
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import main
+from control import ControlServer
+from instance import InstanceLock
+
+
+class _Logger:
+    """丢弃日志"""
+
+    def debug(self, message):
+        pass
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message, error=None):
+        pass
+
+
+class InstanceLockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = Path(tempfile.mkdtemp())
+        self.first = InstanceLock(self.state_dir)
+        self.second = InstanceLock(self.state_dir)
+
+    def tearDown(self):
+        self.first.release()
+        self.second.release()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    def test_second_instance_cannot_acquire(self):
+        self.assertTrue(self.first.acquire())
+        self.assertFalse(self.second.acquire())
+        self.assertFalse(self.second.held)
+        self.assertEqual(self.second.owner_pid(), os.getpid())
+
+    def test_lock_is_free_after_release(self):
+        self.assertTrue(self.first.acquire())
+        self.first.release()
+        self.assertTrue(self.second.acquire())
+
+    def test_hand_off_forwards_command_to_running_instance(self):
+        received = []
+
+        def handler(command, args):
+            received.append(command)
+            if command == "reload":
+                return {"ok": False, "error": "配置文件无效"}
+            return {"ok": True, "message": "已暂停"}
+
+        self.assertTrue(self.first.acquire())
+        server = ControlServer(self.state_dir, handler, _Logger())
+        self.assertTrue(server.start())
+        try:
+            self.assertFalse(self.second.acquire())
+            with redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(main.hand_off(self.second, "pause"), 0)
+                self.assertEqual(main.hand_off(self.second, "reload"), 1)
+        finally:
+            server.stop()
+
+        self.assertEqual(received, ["pause", "reload"])
+        self.assertIn("已暂停", out.getvalue())
+        self.assertIn("配置文件无效", out.getvalue())
+
+
+class ConfigReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.path = self.tmp / "config.json"
+        self.path.write_text(json.dumps({"copy_workers": 2, "backup_folder": "A"}), encoding="utf-8")
+        with redirect_stdout(io.StringIO()):
+            self.config = main.ConfigManager(str(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_malformed_file_keeps_current_config(self):
+        self.path.write_text('{"copy_workers": 4,', encoding="utf-8")
+        with self.assertRaises(ValueError):
+            self.config.reload()
+        self.assertEqual(self.config.get("copy_workers"), 2)
+        # 用户的文件没有被默认配置覆盖
+        self.assertEqual(self.path.read_text(encoding="utf-8"), '{"copy_workers": 4,')
+
+    def test_reload_reports_changed_keys(self):
+        self.path.write_text(json.dumps({"copy_workers": 4, "backup_folder": "B"}), encoding="utf-8")
+        self.assertEqual(self.config.reload(), ["backup_folder", "copy_workers"])
+        self.assertEqual(self.config.get("copy_workers"), 4)
+        # 未写出的键仍使用默认值
+        self.assertEqual(self.config.get("durability"), "batched")
+
+
+if __name__ == "__main__":
+    unittest.main()
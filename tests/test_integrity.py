@@ -0,0 +1,63 @@
+"""
+完整性校验测试
+不同备份目标上的同名文件分别校验，损坏的文件被发现
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from catalog import StoreCatalog
+from integrity import Scrubber, hash_file_mmap
+
+
+class _Logger:
+    """丢弃日志"""
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message, error=None):
+        pass
+
+
+class ScrubberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.catalog = StoreCatalog(self.tmp / "state")
+        self.targets = [self.tmp / "a", self.tmp / "b"]
+        for target in self.targets:
+            path = target / "dev" / "file.txt"
+            path.parent.mkdir(parents=True)
+            path.write_text(f"{target.name}-data")
+            self.catalog.record("dev", "dev/file.txt", path.stat().st_size, hash_file_mmap(path),
+                                target=str(target))
+        self.catalog.flush()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def scrub(self):
+        scrubber = Scrubber(self.targets[0], self.catalog, _Logger(), rate_bps=0,
+                            locate=lambda entry: Path(entry["target"]) / entry["path"])
+        return scrubber.scrub_once()
+
+    def test_same_path_on_each_target_is_checked(self):
+        result = self.scrub()
+        self.assertEqual(result["checked"], 2)
+        self.assertEqual(result["ok"], 2)
+
+    def test_corruption_on_second_target_is_found(self):
+        (self.targets[1] / "dev" / "file.txt").write_text("b-datX")
+        result = self.scrub()
+        self.assertEqual(result["corrupted"], 1)
+        self.assertEqual(result["ok"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
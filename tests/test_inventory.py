@@ -0,0 +1,79 @@
+"""
+备份文件清单测试
+超出内存预算时溢出到磁盘，多路归并后仍按清理策略顺序迭代
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from inventory import _SORT_OVERHEAD, FileInventory
+
+
+class FileInventoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.spill_dir = self.tmp / "spill"
+        rng = random.Random(7)
+        self.files = [(f"dir{i % 13}", f"file{i:05d}.jpg", rng.randrange(1, 10 ** 6), rng.uniform(0, 10 ** 9))
+                      for i in range(3000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def build(self, order, budget):
+        inventory = FileInventory(self.tmp / "root", order, budget, self.spill_dir)
+        for directory, name, size, mtime in self.files:
+            inventory.add(directory, name, size, mtime)
+        return inventory
+
+    def expected(self, key):
+        return [(self.tmp / "root" / d / n, size, mtime)
+                for d, n, size, mtime in sorted(self.files, key=key)]
+
+    def test_spilled_oldest_first_is_merged_in_order(self):
+        with self.build("oldest_first", 16 * 1024) as inventory:
+            self.assertTrue(inventory.spilled)
+            self.assertGreater(len(inventory._runs), 5)
+            records = [(r.path, r.size, r.mtime) for r in inventory]
+        self.assertEqual(records, self.expected(lambda f: f[3]))
+
+    def test_spilled_largest_first_is_merged_in_order(self):
+        with self.build("largest_first", 16 * 1024) as inventory:
+            self.assertTrue(inventory.spilled)
+            sizes = [r.size for r in inventory]
+        self.assertEqual(sizes, sorted((f[2] for f in self.files), reverse=True))
+
+    def test_unordered_keeps_every_record(self):
+        with self.build(None, 16 * 1024) as inventory:
+            self.assertTrue(inventory.spilled)
+            self.assertEqual(inventory.count, len(self.files))
+            paths = sorted(str(r.path) for r in inventory)
+        self.assertEqual(paths, sorted(str(p) for p, _, _ in self.expected(None)))
+
+    def test_small_inventory_stays_in_memory(self):
+        with self.build("oldest_first", 64 * 1024 * 1024) as inventory:
+            self.assertFalse(inventory.spilled)
+            records = [(r.path, r.size, r.mtime) for r in inventory]
+        self.assertEqual(records, self.expected(lambda f: f[3]))
+
+    def test_budget_includes_sort_index(self):
+        budget = 16 * 1024
+        with self.build("oldest_first", budget) as inventory:
+            # 内存中的数据块加上排序时的临时索引不超出预算
+            self.assertLessEqual(len(inventory._names) * _SORT_OVERHEAD, budget)
+            self.assertLess(inventory._memory, budget)
+
+    def test_close_removes_runs(self):
+        inventory = self.build("oldest_first", 16 * 1024)
+        list(inventory)
+        inventory.close()
+        self.assertEqual(os.listdir(self.spill_dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
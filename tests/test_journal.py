@@ -0,0 +1,95 @@
+"""
+复制日志测试
+启动时回放日志删除未完成的临时文件，日志记录没有落盘的临时文件由清扫备份目录删除
+"""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from journal import CopyJournal, part_path
+
+
+class CopyJournalRecoverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.state_dir = self.tmp / ".state"
+        self.backup = self.tmp / "backup"
+        (self.backup / "dev" / "sub").mkdir(parents=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_open_begin_removes_part_and_counts_finished(self):
+        journal = CopyJournal(self.state_dir)
+        unfinished = self.backup / "dev" / "a.txt"
+        renamed = self.backup / "dev" / "b.txt"
+        part_path(unfinished).write_text("half")
+        renamed.write_text("whole")
+        journal.begin(part_path(unfinished), unfinished)
+        journal.begin(part_path(renamed), renamed)
+        # 模拟进程在结束记录之前退出：不调用close
+        journal._file.close()
+
+        result = CopyJournal(self.state_dir).recover(roots=[self.backup])
+        self.assertEqual(result, {"removed": 1, "finished": 1})
+        self.assertFalse(part_path(unfinished).exists())
+        self.assertTrue(renamed.exists())
+        self.assertFalse(journal.path.exists())
+
+    def test_sweeps_part_without_journal_record(self):
+        journal = CopyJournal(self.state_dir)
+        dest = self.backup / "dev" / "a.txt"
+        journal.begin(part_path(dest), dest)
+        journal._file.close()
+        # 断电后只剩空的日志文件，开始记录没有落盘
+        journal.path.write_text("")
+        orphan = part_path(self.backup / "dev" / "sub" / "c.txt")
+        orphan.write_text("half")
+        kept = self.backup / "dev" / "sub" / "d.txt"
+        kept.write_text("whole")
+
+        result = CopyJournal(self.state_dir).recover(roots=[self.backup])
+        self.assertEqual(result["removed"], 1)
+        self.assertFalse(orphan.exists())
+        self.assertTrue(kept.exists())
+
+    def test_torn_last_line_is_ignored(self):
+        journal = CopyJournal(self.state_dir)
+        dest = self.backup / "dev" / "a.txt"
+        part_path(dest).write_text("half")
+        journal.begin(part_path(dest), dest)
+        journal._file.write(json.dumps({"op": "done", "id": 1})[:8])
+        journal._file.close()
+
+        result = CopyJournal(self.state_dir).recover()
+        self.assertEqual(result["removed"], 1)
+
+    def test_clean_close_skips_sweep(self):
+        journal = CopyJournal(self.state_dir)
+        dest = self.backup / "dev" / "a.txt"
+        entry_id = journal.begin(part_path(dest), dest)
+        dest.write_text("whole")
+        journal.end(entry_id, True)
+        journal.close()
+        self.assertFalse(journal.path.exists())
+
+        # 正常退出后不清扫备份目录
+        other = part_path(self.backup / "dev" / "b.txt")
+        other.write_text("x")
+        self.assertEqual(CopyJournal(self.state_dir).recover(roots=[self.backup]), {"removed": 0, "finished": 0})
+        self.assertTrue(other.exists())
+
+    def test_close_keeps_journal_with_open_records(self):
+        journal = CopyJournal(self.state_dir)
+        dest = self.backup / "dev" / "a.txt"
+        journal.begin(part_path(dest), dest)
+        journal.close()
+        self.assertTrue(journal.path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+多进程卸载测试
+等待工作进程结果时可以取消，工作进程异常退出时抛出OSError
+"""
+
+import os
+import threading
+import time
+import unittest
+
+from cancel import CancelToken, OperationCancelled
+from offload import OffloadPool
+
+
+class OffloadCallTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = OffloadPool(1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_call_returns_result(self):
+        self.assertEqual(self.pool.call(divmod, 7, 2), (3, 1))
+
+    def test_cancel_terminates_worker(self):
+        token = CancelToken()
+        timer = threading.Timer(0.3, token.cancel)
+        timer.start()
+        started = time.monotonic()
+        try:
+            with self.assertRaises(OperationCancelled):
+                self.pool.call(time.sleep, 30, cancel_token=token)
+        finally:
+            timer.cancel()
+        self.assertLess(time.monotonic() - started, 10)
+        # 被终止的工作进程不再放回池中，下次调用重新启动
+        self.assertEqual(self.pool._all, [])
+        self.assertEqual(self.pool.call(divmod, 9, 4), (2, 1))
+
+    def test_worker_exit_raises_oserror(self):
+        with self.assertRaises(OSError):
+            self.pool.call(os._exit, 3)
+        self.assertEqual(self.pool._all, [])
+
+    def test_function_error_raises_oserror(self):
+        with self.assertRaises(OSError):
+            self.pool.call(divmod, 1, 0)
+        self.assertEqual(len(self.pool._all), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
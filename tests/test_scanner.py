@@ -0,0 +1,57 @@
+"""
+并行目录扫描测试
+扫描线程提前列出的结果与在会话线程中逐个列出的结果一致，结果数达到上限时不会卡住
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from exclusion import ExclusionEngine
+from scanner import ParallelScanner
+
+
+class ParallelScannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        for a in range(5):
+            for b in range(4):
+                folder = self.root / f"d{a}" / f"s{b}"
+                folder.mkdir(parents=True)
+                (folder / "file.txt").write_text("x")
+        (self.root / "d0" / "skip").mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def walk(self, threads: int, max_ahead: int = 256):
+        """按会话的深度优先顺序取用结果"""
+        scanner = ParallelScanner(self.root, ExclusionEngine(patterns=["skip/"]), threads=threads,
+                                  max_ahead=max_ahead)
+        stack = [""]
+        scanner.start(stack)
+        seen = []
+        try:
+            while stack:
+                listing = scanner.get(stack.pop())
+                names = [e.name for e in listing.entries] if listing.entries is not None else None
+                seen.append((listing.rel_dir, names, listing.subdirs))
+                stack.extend(reversed(listing.subdirs))
+        finally:
+            scanner.stop()
+        return seen
+
+    def test_parallel_matches_inline(self):
+        inline = self.walk(0)
+        self.assertEqual(len(inline), 1 + 5 + 20)
+        self.assertNotIn("d0/skip", [rel_dir for rel_dir, _, _ in inline])
+        self.assertEqual(self.walk(4), inline)
+
+    def test_small_read_ahead_limit(self):
+        self.assertEqual(self.walk(4, max_ahead=2), self.walk(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
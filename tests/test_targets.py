@@ -0,0 +1,87 @@
+"""
+备份目标测试
+按余量、权重和正在写入的会话数选择目标，空间不足时溢出到其他目标，在所有目标中查找已备份文件
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from targets import GB, BackupTarget, TargetSet
+
+
+class _Target(BackupTarget):
+    """剩余空间固定的目标"""
+
+    def __init__(self, path: Path, free_gb: float, weight: float = 1.0, min_free_space_gb: float = 5):
+        super().__init__(path, weight, min_free_space_gb)
+        self.free = int(free_gb * GB)
+
+    def free_bytes(self) -> int:
+        return self.free
+
+
+class TargetSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_from_config_keeps_primary_first_and_dedupes(self):
+        primary = self.tmp / "a"
+        config = {
+            "min_free_space_gb": 2,
+            "backup_targets": [str(self.tmp / "b"), {"path": str(primary), "weight": 3},
+                               {"path": str(self.tmp / "b" / ".")}, {"path": ""}],
+        }
+        targets = TargetSet.from_config(config, primary)
+        self.assertEqual([t.path for t in targets.targets], [primary, self.tmp / "b"])
+        self.assertEqual(targets.targets[0].weight, 3)
+        self.assertEqual(targets.targets[1].min_free_bytes, 2 * GB)
+
+    def test_choose_by_headroom_weight_and_load(self):
+        a = _Target(self.tmp / "a", 50)
+        b = _Target(self.tmp / "b", 30)
+        targets = TargetSet([a, b])
+        self.assertIs(targets.choose(), a)
+
+        # a正在写入两个会话: 45/3 < 25
+        targets.acquire(a)
+        targets.acquire(a)
+        self.assertIs(targets.choose(), b)
+        targets.release(a)
+        targets.release(a)
+
+        b.weight = 2.0
+        self.assertIs(targets.choose(), b)
+
+    def test_spill_over_when_target_is_full(self):
+        a = _Target(self.tmp / "a", 5.5)
+        b = _Target(self.tmp / "b", 8)
+        targets = TargetSet([a, b])
+        self.assertIs(targets.choose(needed=GB), b)
+        self.assertIs(targets.choose(exclude=[b]), a)
+        self.assertIsNone(targets.choose(needed=GB, exclude=[b]))
+        # 不可用的目标不会被选择
+        b.free = -1
+        self.assertIsNone(targets.choose(needed=GB))
+
+    def test_locate_prefers_hinted_target(self):
+        a, b = BackupTarget(self.tmp / "a"), BackupTarget(self.tmp / "b")
+        targets = TargetSet([a, b])
+        for target in (a, b):
+            (target.path / "dev").mkdir(parents=True)
+            (target.path / "dev" / "same.txt").write_text(target.path.name)
+        (b.path / "dev" / "only_b.txt").write_text("b")
+
+        self.assertEqual(targets.locate("dev/same.txt"), a.path / "dev" / "same.txt")
+        self.assertEqual(targets.locate("dev/same.txt", b.key), b.path / "dev" / "same.txt")
+        self.assertEqual(targets.locate("dev/only_b.txt", a.key), b.path / "dev" / "only_b.txt")
+        self.assertIsNone(targets.locate("dev/missing.txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
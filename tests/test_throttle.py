@@ -0,0 +1,56 @@
+"""
+自适应限速测试
+备份自身的I/O和CPU不应被当作主机负载
+"""
+
+import unittest
+from collections import namedtuple
+
+from throttle import MB, AdaptiveThrottle, ConcurrencyLimiter, IOLimiter
+
+DiskCounters = namedtuple("DiskCounters", "read_bytes write_bytes busy_time")
+
+
+class AdaptiveThrottleLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.concurrency = ConcurrencyLimiter(4)
+        self.throttle = AdaptiveThrottle(IOLimiter(), self.concurrency, max_workers=4)
+        self.throttle.cpu_count = 4
+
+    def sample(self, system_cpu, own_cpu_seconds, system_bytes, own_bytes, busy_ms, elapsed=2.0):
+        before = DiskCounters(0, 0, 0)
+        after = DiskCounters(system_bytes // 2, system_bytes - system_bytes // 2, busy_ms)
+        self.throttle.update_load(system_cpu, own_cpu_seconds, before, after, own_bytes, elapsed)
+        self.throttle._adjust()
+        self.throttle._apply()
+
+    def test_no_foreground_load_keeps_full_speed(self):
+        # 主机上只有备份在运行：磁盘满载、哈希占用一个核，全部来自本进程
+        for _ in range(10):
+            self.sample(system_cpu=30, own_cpu_seconds=2.0, system_bytes=200 * MB, own_bytes=200 * MB,
+                        busy_ms=2000)
+        self.assertEqual(self.throttle.factor, 1.0)
+        self.assertEqual(self.concurrency.limit, 4)
+        self.assertLess(self.throttle.disk_util, 0.2)
+        self.assertLess(self.throttle.cpu_percent, 30)
+
+    def test_foreground_disk_load_backs_off(self):
+        # 其他进程占用了大部分磁盘读写
+        self.sample(system_cpu=10, own_cpu_seconds=0.1, system_bytes=200 * MB, own_bytes=20 * MB, busy_ms=2000)
+        self.assertLess(self.throttle.factor, 1.0)
+
+    def test_foreground_cpu_load_backs_off(self):
+        self.sample(system_cpu=90, own_cpu_seconds=0.5, system_bytes=0, own_bytes=0, busy_ms=0)
+        self.assertLess(self.throttle.factor, 1.0)
+
+    def test_recovers_after_foreground_load_ends(self):
+        self.sample(system_cpu=90, own_cpu_seconds=0.0, system_bytes=0, own_bytes=0, busy_ms=0)
+        for _ in range(10):
+            self.sample(system_cpu=30, own_cpu_seconds=2.0, system_bytes=100 * MB, own_bytes=100 * MB,
+                        busy_ms=2000)
+        self.assertEqual(self.throttle.factor, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
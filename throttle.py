@@ -0,0 +1,347 @@
+"""
+I/O限速模块
+令牌桶限制读写带宽，并根据主机负载自适应调整复制速率和并发数
+"""
+
+import os
+import time
+import threading
+from typing import Optional
+
+from cancel import CancelToken
+
+MB = 1024 * 1024
+
+
+class TokenBucket:
+    """令牌桶限速器（rate为0表示不限速）"""
+
+    def __init__(self, rate: float = 0, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self._rate = 0.0
+        self._burst = 0.0
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self.set_rate(rate, burst)
+
+    @property
+    def rate(self) -> float:
+        """当前速率（字节/秒）"""
+        return self._rate
+
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        """运行时修改速率"""
+        with self._lock:
+            self._refill()
+            self._rate = max(0.0, float(rate))
+            # 默认允许0.5秒的突发量，至少一个块
+            self._burst = float(burst) if burst else max(self._rate * 0.5, MB)
+            self._tokens = min(self._tokens, self._burst)
+
+    def _refill(self):
+        """补充令牌"""
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def consume(self, amount: int, cancel_token: Optional[CancelToken] = None):
+        """消耗令牌，不足时阻塞等待（可被取消令牌打断）"""
+        while True:
+            with self._lock:
+                if self._rate <= 0:
+                    return
+                self._refill()
+                # 单次请求超过桶容量时允许透支，避免大块永远等不到
+                if self._tokens >= min(amount, self._burst):
+                    self._tokens -= amount
+                    return
+                wait = (min(amount, self._burst) - self._tokens) / self._rate
+            if cancel_token is not None:
+                cancel_token.wait(min(wait, 0.25))
+                cancel_token.raise_if_cancelled()
+            else:
+                time.sleep(min(wait, 0.25))
+
+
+class PauseGate:
+    """暂停开关：暂停时复制和扫描在下一个数据块或目录处等待"""
+
+    def __init__(self):
+        self._open = threading.Event()
+        self._open.set()
+
+    @property
+    def paused(self) -> bool:
+        """是否已暂停"""
+        return not self._open.is_set()
+
+    def pause(self):
+        """暂停"""
+        self._open.clear()
+
+    def resume(self):
+        """恢复"""
+        self._open.set()
+
+    def wait(self, cancel_token: Optional[CancelToken] = None):
+        """暂停期间阻塞（可被取消令牌打断）"""
+        while not self._open.is_set():
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            self._open.wait(0.25)
+
+
+class IOLimiter:
+    """读写带宽限制"""
+
+    def __init__(self, read_bps: float = 0, write_bps: float = 0):
+        self.read_bucket = TokenBucket(read_bps)
+        self.write_bucket = TokenBucket(write_bps)
+        self.gate = PauseGate()
+        self._bytes_lock = threading.Lock()
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def set_limits(self, read_bps: Optional[float] = None, write_bps: Optional[float] = None):
+        """运行时修改读写限速（None表示不变）"""
+        if read_bps is not None:
+            self.read_bucket.set_rate(read_bps)
+        if write_bps is not None:
+            self.write_bucket.set_rate(write_bps)
+
+    def on_read(self, amount: int, cancel_token: Optional[CancelToken] = None):
+        """读取数据后调用"""
+        self.gate.wait(cancel_token)
+        self.read_bucket.consume(amount, cancel_token)
+        with self._bytes_lock:
+            self.bytes_read += amount
+
+    def on_write(self, amount: int, cancel_token: Optional[CancelToken] = None):
+        """写入数据前调用"""
+        self.write_bucket.consume(amount, cancel_token)
+        with self._bytes_lock:
+            self.bytes_written += amount
+
+
+class ConcurrencyLimiter:
+    """可在运行时调整上限的信号量"""
+
+    def __init__(self, limit: int):
+        self._cond = threading.Condition()
+        self._limit = max(1, int(limit))
+        self._active = 0
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return self._limit
+
+    @property
+    def active(self) -> int:
+        """当前活动数"""
+        return self._active
+
+    def set_limit(self, limit: int):
+        """修改并发上限"""
+        with self._cond:
+            self._limit = max(1, int(limit))
+            self._cond.notify_all()
+
+    def acquire(self, cancel_token: Optional[CancelToken] = None):
+        """获取一个并发槽位（可被取消令牌打断）"""
+        with self._cond:
+            while self._active >= self._limit:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                    self._cond.wait(0.1)
+                else:
+                    self._cond.wait()
+            self._active += 1
+
+    def release(self):
+        """释放并发槽位"""
+        with self._cond:
+            self._active = max(0, self._active - 1)
+            self._cond.notify()
+
+
+class AdaptiveThrottle:
+    """根据其他进程的CPU和磁盘负载自适应调整复制速率和并发数
+
+    系统计数包含备份自身的设备读取、目标写入和哈希计算，采样时扣除本进程（含工作进程）
+    的部分，否则复制一开始负载就超过阈值，限速会一路减到下限。
+    """
+
+    def __init__(self, io_limiter: IOLimiter, concurrency: ConcurrencyLimiter,
+                 read_bps: float = 0, write_bps: float = 0, max_workers: int = 4,
+                 busy_cpu: float = 70.0, idle_cpu: float = 30.0,
+                 busy_disk: float = 0.6, idle_disk: float = 0.2,
+                 interval: float = 2.0, min_factor: float = 0.1):
+        self.io_limiter = io_limiter
+        self.concurrency = concurrency
+        self.busy_cpu = busy_cpu
+        self.idle_cpu = idle_cpu
+        self.busy_disk = busy_disk
+        self.idle_disk = idle_disk
+        self.interval = interval
+        self.min_factor = min_factor
+
+        self.enabled = True
+        self.factor = 1.0
+        # 其他进程的CPU占用（%）和磁盘繁忙度（0~1）
+        self.cpu_percent = 0.0
+        self.disk_util = 0.0
+        self.cpu_count = os.cpu_count() or 1
+
+        self._lock = threading.Lock()
+        self._read_bps = read_bps
+        self._write_bps = write_bps
+        self._max_workers = max(1, int(max_workers))
+        # 未设置限速时，以观测到的自身峰值吞吐作为缩放基准
+        self._peak_read = 0.0
+        self._peak_write = 0.0
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def configure(self, read_bps: Optional[float] = None, write_bps: Optional[float] = None,
+                  max_workers: Optional[int] = None, enabled: Optional[bool] = None):
+        """运行时修改基准限速、最大并发和开关"""
+        with self._lock:
+            if read_bps is not None:
+                self._read_bps = read_bps
+            if write_bps is not None:
+                self._write_bps = write_bps
+            if max_workers is not None:
+                self._max_workers = max(1, int(max_workers))
+            if enabled is not None:
+                self.enabled = enabled
+        self._apply()
+
+    def start(self):
+        """启动负载采样线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="AdaptiveThrottle", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止负载采样线程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        """采样循环"""
+        # 仅在启用自适应模式时加载psutil
+        import psutil
+
+        process = psutil.Process()
+        psutil.cpu_percent(interval=None)
+        last_io = self._disk_counters()
+        last_cpu = self._own_cpu_seconds(process)
+        last_read = self.io_limiter.bytes_read
+        last_written = self.io_limiter.bytes_written
+        last_time = time.monotonic()
+
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            elapsed = max(now - last_time, 1e-3)
+
+            system_cpu = psutil.cpu_percent(interval=None)
+            io = self._disk_counters()
+            own_cpu = self._own_cpu_seconds(process)
+            read_bytes = self.io_limiter.bytes_read - last_read
+            write_bytes = self.io_limiter.bytes_written - last_written
+            self.update_load(system_cpu, own_cpu - last_cpu, last_io, io, read_bytes + write_bytes, elapsed)
+
+            # 记录自身吞吐峰值（缓慢衰减）
+            self._peak_read = max(read_bytes / elapsed, self._peak_read * 0.95)
+            self._peak_write = max(write_bytes / elapsed, self._peak_write * 0.95)
+
+            last_io = io
+            last_cpu = own_cpu
+            last_read = self.io_limiter.bytes_read
+            last_written = self.io_limiter.bytes_written
+            last_time = now
+
+            if self.enabled:
+                self._adjust()
+            self._apply()
+
+    def _disk_counters(self):
+        """读取磁盘I/O计数"""
+        try:
+            import psutil
+            return psutil.disk_io_counters()
+        except Exception:
+            return None
+
+    def _own_cpu_seconds(self, process) -> float:
+        """本进程及其子进程（卸载工作进程）累计占用的CPU时间（秒）"""
+        total = 0.0
+        try:
+            processes = [process] + process.children(recursive=True)
+        except Exception:
+            processes = [process]
+        for proc in processes:
+            try:
+                times = proc.cpu_times()
+                total += times.user + times.system
+            except Exception:
+                continue
+        return total
+
+    def update_load(self, system_cpu: float, own_cpu_seconds: float, disk_before, disk_after,
+                    own_bytes: int, elapsed: float):
+        """根据一次采样计算其他进程的负载
+
+        CPU：系统占用减去本进程在采样间隔内的CPU时间（按核数折算）。
+        磁盘：繁忙度按其他进程在系统读写字节中的占比折算（系统字节全部来自本进程时为0）。
+        """
+        own_percent = max(0.0, own_cpu_seconds) / (elapsed * self.cpu_count) * 100
+        self.cpu_percent = max(0.0, system_cpu - own_percent)
+
+        util = self._disk_utilization(disk_before, disk_after, elapsed)
+        if util and disk_before is not None and disk_after is not None:
+            total_bytes = ((disk_after.read_bytes - disk_before.read_bytes)
+                           + (disk_after.write_bytes - disk_before.write_bytes))
+            if total_bytes > 0:
+                util *= max(0.0, total_bytes - own_bytes) / total_bytes
+        self.disk_util = util
+
+    def _disk_utilization(self, before, after, elapsed: float) -> float:
+        """估算磁盘繁忙度（0~1）"""
+        if before is None or after is None:
+            return 0.0
+        if hasattr(after, "busy_time"):
+            busy_ms = after.busy_time - before.busy_time
+        else:
+            busy_ms = (after.read_time - before.read_time) + (after.write_time - before.write_time)
+        return max(0.0, min(1.0, busy_ms / (elapsed * 1000)))
+
+    def _adjust(self):
+        """主机繁忙时减半，空闲时逐步恢复"""
+        if self.cpu_percent >= self.busy_cpu or self.disk_util >= self.busy_disk:
+            self.factor = max(self.min_factor, self.factor * 0.5)
+        elif self.cpu_percent <= self.idle_cpu and self.disk_util <= self.idle_disk:
+            self.factor = min(1.0, self.factor * 1.5)
+
+    def _apply(self):
+        """将当前系数应用到限速器和并发数"""
+        with self._lock:
+            factor = self.factor if self.enabled else 1.0
+            self.io_limiter.set_limits(
+                self._scaled(self._read_bps, self._peak_read, factor),
+                self._scaled(self._write_bps, self._peak_write, factor)
+            )
+            self.concurrency.set_limit(max(1, round(self._max_workers * factor)))
+
+    def _scaled(self, base: float, peak: float, factor: float) -> float:
+        """计算缩放后的速率"""
+        if base > 0:
+            return base * factor
+        if factor >= 1.0 or peak <= 0:
+            return 0
+        return max(peak * factor, MB)
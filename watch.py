@@ -0,0 +1,329 @@
+"""
+变化监视模块
+设备保持插入时监视文件变化（Linux上使用inotify，其他平台或inotify不可用时定期比较修改时间），
+变化的文件在停止写入一段时间后才交给增量备份
+"""
+
+import os
+import sys
+import time
+import errno
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# inotify 事件
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """inotify 的最小封装（通过ctypes调用libc，无需额外依赖）"""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """添加监视（目录数超过系统上限时抛出OSError）"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = self._ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        """读取事件（wd, mask, name）"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        """关闭"""
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class ChangeWatcher:
+    """单个设备的变化监视"""
+
+    def __init__(self, root: str, exclusions=None, debounce: float = 5.0, sweep_interval: float = 120.0,
+                 use_inotify: bool = True):
+        self.root = Path(root)
+        self.exclusions = exclusions
+        self.debounce = debounce
+        self.sweep_interval = sweep_interval
+        self.mode = "sweep"
+
+        self._use_inotify = use_inotify and sys.platform.startswith("linux")
+        self._inotify: Optional[_Inotify] = None
+        # wd -> 相对目录
+        self._watch_dirs: Dict[int, str] = {}
+        # 定期比较模式的快照：相对路径 -> (大小, 修改时间)
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._seeded = False
+        self._rescan = False
+
+        # 相对路径 -> [最后变化时间, 当时的(大小, 修改时间)]
+        self._pending: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def pending(self) -> int:
+        """等待稳定的文件数"""
+        return len(self._pending)
+
+    def start(self, snapshot: Optional[Dict[str, Tuple[int, int]]] = None):
+        """开始监视（遍历目录树在监视线程中进行，不阻塞调用方）
+
+        snapshot为会话扫描到的文件的(大小, 修改时间)：初始遍历与其比较，
+        会话扫描之后才变化的文件也会被增量备份。不提供时初始遍历只建立基准。
+        """
+        self._seeded = snapshot is not None
+        self._snapshot = dict(snapshot or {})
+        if self._use_inotify:
+            try:
+                self._inotify = _Inotify()
+                self.mode = "inotify"
+            except OSError:
+                self.mode = "sweep"
+
+        self._thread = threading.Thread(target=self._run, name=f"Watch-{self.root.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监视"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._close_inotify()
+
+    def _close_inotify(self):
+        """释放inotify"""
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._watch_dirs.clear()
+
+    def _excluded(self, rel_path: str, name: str, is_dir: bool, entry=None) -> bool:
+        """是否被排除规则排除"""
+        if self.exclusions is None:
+            return False
+        # 与扫描时一致：目录的深度为其路径层数，文件的深度为所在目录的层数
+        depth = rel_path.count("/") + (1 if is_dir else 0)
+        return bool(self.exclusions.match(rel_path, name, is_dir, depth, entry))
+
+    def _iter_tree(self, rel_dir: str):
+        """遍历目录树（跳过排除的目录），返回(相对路径, 条目, 是否目录)"""
+        stack = [rel_dir]
+        while stack and not self._stop.is_set():
+            current = stack.pop()
+            try:
+                with os.scandir(self.root / current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                rel_path = f"{current}/{entry.name}" if current else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if self._excluded(rel_path, entry.name, is_dir, entry):
+                    continue
+                if is_dir:
+                    stack.append(rel_path)
+                yield rel_path, entry, is_dir
+
+    def _watch_tree(self, rel_dir: str, mark_files: bool = False) -> Dict[str, Tuple[int, int]]:
+        """为目录及其子目录添加inotify监视，返回其中文件的大小和修改时间"""
+        self._watch_dirs[self._inotify.add_watch(str(self.root / rel_dir), _WATCH_MASK)] = rel_dir
+        files = {}
+        for rel_path, entry, is_dir in self._iter_tree(rel_dir):
+            if is_dir:
+                self._watch_dirs[self._inotify.add_watch(str(self.root / rel_path), _WATCH_MASK)] = rel_path
+                continue
+            if mark_files:
+                # 新建目录中在添加监视之前写入的文件
+                self._mark(rel_path)
+            signature = self._signature(entry)
+            if signature is not None:
+                files[rel_path] = signature
+        return files
+
+    @staticmethod
+    def _signature(entry) -> Optional[Tuple[int, int]]:
+        """目录条目的大小和修改时间"""
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """扫描所有文件的大小和修改时间"""
+        snapshot = {}
+        for rel_path, entry, is_dir in self._iter_tree(""):
+            if is_dir:
+                continue
+            signature = self._signature(entry)
+            if signature is not None:
+                snapshot[rel_path] = signature
+        return snapshot
+
+    def _sweep(self, snapshot: Optional[Dict[str, Tuple[int, int]]] = None):
+        """与上次的快照比较：找出新增或修改的文件"""
+        if snapshot is None:
+            snapshot = self._scan()
+        if self._stop.is_set():
+            return
+        with self._lock:
+            previous, self._snapshot = self._snapshot, snapshot
+        for rel_path, signature in snapshot.items():
+            if previous.get(rel_path) != signature:
+                self._mark(rel_path)
+
+    def _initial_scan(self):
+        """初始遍历：添加inotify监视（超过监视数量上限时改为定期比较）并建立快照"""
+        snapshot = None
+        if self.mode == "inotify":
+            try:
+                snapshot = self._watch_tree("")
+            except OSError:
+                self._close_inotify()
+                self.mode = "sweep"
+        if snapshot is None:
+            snapshot = self._scan()
+
+        if self._seeded:
+            self._sweep(snapshot)
+        else:
+            with self._lock:
+                self._snapshot = snapshot
+
+    def _stat(self, rel_path: str) -> Optional[Tuple[int, int]]:
+        """文件当前的大小和修改时间（不存在或不是文件时返回None）"""
+        try:
+            stat = os.stat(self.root / rel_path)
+        except OSError:
+            return None
+        if not os.path.isfile(self.root / rel_path):
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _mark(self, rel_path: str):
+        """记录文件变化"""
+        with self._lock:
+            self._pending[rel_path] = [time.monotonic(), self._stat(rel_path)]
+
+    def _run(self):
+        """监视线程"""
+        import select
+
+        self._initial_scan()
+        last_sweep = time.monotonic()
+        while not self._stop.is_set():
+            if self.mode == "inotify" and self._inotify is not None:
+                try:
+                    ready, _, _ = select.select([self._inotify.fd], [], [], 1.0)
+                except (OSError, ValueError):
+                    return
+                if ready:
+                    self._handle_events(self._inotify.read_events())
+                if self._rescan:
+                    # 事件队列溢出，与上次的快照做一次完整比较
+                    self._rescan = False
+                    self._sweep()
+            else:
+                if self._stop.wait(1.0):
+                    return
+                if time.monotonic() - last_sweep >= self.sweep_interval:
+                    self._sweep()
+                    last_sweep = time.monotonic()
+
+    def _handle_events(self, events: List[Tuple[int, int, str]]):
+        """处理inotify事件"""
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self._rescan = True
+                continue
+            if mask & (IN_IGNORED | IN_UNMOUNT | IN_DELETE_SELF):
+                self._watch_dirs.pop(wd, None)
+                continue
+
+            rel_dir = self._watch_dirs.get(wd)
+            if rel_dir is None or not name:
+                continue
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self._excluded(rel_path, name, True):
+                    try:
+                        self._watch_tree(rel_path, mark_files=True)
+                    except OSError as e:
+                        if e.errno == errno.ENOSPC:
+                            # 超过监视数量上限，改为定期比较
+                            self._close_inotify()
+                            self.mode = "sweep"
+                            self._sweep()
+                            return
+                continue
+
+            if not self._excluded(rel_path, name, False):
+                self._mark(rel_path)
+
+    def settled(self) -> List[str]:
+        """返回已停止变化的文件（最后一次变化后经过防抖时间，且大小和修改时间未再改变）"""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for rel_path, (changed_at, signature) in list(self._pending.items()):
+                if now - changed_at < self.debounce:
+                    continue
+                current = self._stat(rel_path)
+                if current is None:
+                    # 已删除或被替换为目录
+                    del self._pending[rel_path]
+                elif current == signature:
+                    del self._pending[rel_path]
+                    # 更新快照，溢出后重新比较时不再报告已处理的文件
+                    self._snapshot[rel_path] = current
+                    ready.append(rel_path)
+                else:
+                    # 仍在写入，重新计时
+                    self._pending[rel_path] = [now, current]
+        return sorted(ready)